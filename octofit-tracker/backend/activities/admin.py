@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Activity
+from .models import Activity, ActivityRollup
 
 
 @admin.register(Activity)
@@ -26,3 +26,11 @@ class ActivityAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(ActivityRollup)
+class ActivityRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'period', 'period_start', 'activity_type', 'activities_count', 'total_duration_minutes')
+    list_filter = ('period', 'activity_type')
+    search_fields = ('user__username',)
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,138 @@
+"""
+Activity totals grouped by type, intensity, location, hour of day and week.
+
+On MongoDB every requested grouping is computed by one native aggregation
+pipeline ($match, then a $facet per grouping), so a dashboard gets all of
+its breakdowns in a single round trip without going through djongo's SQL
+translation. Other backends (SQLite in tests) run one grouped ORM query
+per grouping with the same results.
+"""
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractHour, TruncWeek
+from django.utils import timezone
+
+from .models import Activity
+
+DIMENSIONS = ('activity_type', 'intensity', 'location', 'hour', 'week')
+
+
+def _mongo_key(dimension):
+    if dimension == 'hour':
+        return {'$hour': {'date': '$activity_date', 'timezone': settings.TIME_ZONE}}
+    if dimension == 'week':
+        # Monday of the ISO week, at local midnight
+        return {'$dateFromParts': {
+            'isoWeekYear': {'$isoWeekYear': {'date': '$activity_date', 'timezone': settings.TIME_ZONE}},
+            'isoWeek': {'$isoWeek': {'date': '$activity_date', 'timezone': settings.TIME_ZONE}},
+            'isoDayOfWeek': 1,
+            'timezone': settings.TIME_ZONE,
+        }}
+    return f'${dimension}'
+
+
+def _orm_key(dimension):
+    if dimension == 'hour':
+        return ExtractHour('activity_date')
+    if dimension == 'week':
+        return TruncWeek('activity_date')
+    return F(dimension)
+
+
+def _week(value):
+    """Monday of a week bucket as a date"""
+    if value is None:
+        return None
+    if timezone.is_naive(value):
+        # pymongo returns naive UTC datetimes
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return timezone.localtime(value).date()
+
+
+def pipeline(dimensions, user_id=None, start=None, end=None):
+    """Aggregation pipeline over the activity collection, one facet per dimension"""
+    match = {}
+    if user_id is not None:
+        match['user_id'] = user_id
+    if start is not None or end is not None:
+        match['activity_date'] = {}
+        if start is not None:
+            match['activity_date']['$gte'] = start
+        if end is not None:
+            match['activity_date']['$lt'] = end
+    group_totals = {
+        'count': {'$sum': 1},
+        'total_duration_minutes': {'$sum': '$duration_minutes'},
+        'total_calories_burned': {'$sum': '$calories_burned'},
+        'total_distance_km': {'$sum': '$distance_km'},
+    }
+    return [
+        {'$match': match},
+        {'$facet': {
+            dimension: [
+                {'$group': {'_id': _mongo_key(dimension), **group_totals}},
+                {'$sort': {'_id': 1}},
+            ]
+            for dimension in dimensions
+        }},
+    ]
+
+
+def _row(key, row):
+    return {
+        'key': key,
+        'count': row['count'],
+        'total_duration_minutes': row['total_duration_minutes'] or 0,
+        'total_calories_burned': row['total_calories_burned'] or 0,
+        'total_distance_km': row['total_distance_km'] or 0,
+    }
+
+
+def _aggregate_mongo(dimensions, user_id, start, end):
+    connection.ensure_connection()
+    collection = connection.connection[Activity._meta.db_table]
+    result = next(collection.aggregate(pipeline(dimensions, user_id, start, end)), {})
+    return {
+        dimension: [
+            _row(_week(row['_id']) if dimension == 'week' else row['_id'], row)
+            for row in result.get(dimension, [])
+        ]
+        for dimension in dimensions
+    }
+
+
+def _aggregate_orm(dimensions, user_id, start, end):
+    activities = Activity.objects.all()
+    if user_id is not None:
+        activities = activities.filter(user_id=user_id)
+    if start is not None:
+        activities = activities.filter(activity_date__gte=start)
+    if end is not None:
+        activities = activities.filter(activity_date__lt=end)
+
+    results = {}
+    for dimension in dimensions:
+        rows = activities.values(group=_orm_key(dimension)).annotate(
+            count=Count('id'),
+            total_duration_minutes=Sum('duration_minutes'),
+            total_calories_burned=Sum('calories_burned'),
+            total_distance_km=Sum('distance_km'),
+        ).order_by('group')
+        results[dimension] = [
+            _row(_week(row['group']) if dimension == 'week' else row['group'], row)
+            for row in rows
+        ]
+    return results
+
+
+def aggregate(dimensions=DIMENSIONS, user_id=None, start=None, end=None):
+    """
+    Totals per group for each dimension, keyed by dimension. start and end
+    are aware datetimes bounding activity_date (end exclusive).
+    """
+    if connection.vendor == 'djongo':
+        return _aggregate_mongo(dimensions, user_id, start, end)
+    return _aggregate_orm(dimensions, user_id, start, end)
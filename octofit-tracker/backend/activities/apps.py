@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ActivitiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'activities'
+    
+    def ready(self):
+        from octofit_tracker.routing import stick_on_change
+        from .models import Activity
+        # Writers read their own activities from the primary for a while
+        stick_on_change(Activity)
@@ -0,0 +1,21 @@
+"""Async variants of the hottest activity read paths (see octofit_tracker/async_api.py)"""
+from octofit_tracker.async_api import async_api_view
+from .models import Activity
+from .serializers import ActivitySerializer
+from .views import ActivityPagination
+
+
+@async_api_view
+async def my_activities(request):
+    """
+    The current user's activities, newest first, one keyset page at a time.
+    Query params: activity_type, intensity, cursor, page_size
+    """
+    activities = Activity.objects.select_related('user').filter(user=request.user)
+    for field in ('activity_type', 'intensity'):
+        value = request.query_params.get(field)
+        if value:
+            activities = activities.filter(**{field: value})
+    paginator = ActivityPagination()
+    page = await paginator.apaginate_queryset(activities, request)
+    return paginator.get_paginated_data(ActivitySerializer(page, many=True).data)
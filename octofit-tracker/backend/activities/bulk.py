@@ -0,0 +1,129 @@
+"""
+Bulk activity ingestion for device sync.
+
+A batch is validated with a single BulkActivitySerializer, deduplicated
+on the client-supplied idempotency_key (against both the database and
+earlier items in the same batch), inserted with bulk_create in chunks,
+and then applied to leaderboards, rollups and profile counters once for
+the whole batch. Backends that cannot return inserted rows (djongo)
+leave bulk_create'd objects without a primary key, so those are looked
+up again by idempotency key; items sent without one are saved one by
+one. Missing calories are estimated for the batch in one vectorized
+pass before insertion.
+
+A unique constraint on (user, idempotency_key) backs the deduplication:
+when a concurrent upload of the same keys commits between the lookup
+and the insert, the batch is rolled back and deduplicated again, and
+its items are reported as duplicates of the rows that won.
+"""
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from octofit_tracker import routing
+from search import index as search_index
+from teams import leaderboard
+from users import counters
+from . import estimation, rollups
+from .models import Activity
+from .serializers import BulkActivitySerializer
+
+BULK_CHUNK_SIZE = getattr(settings, 'ACTIVITY_BULK_CHUNK_SIZE', 500)
+
+BULK_MAX_ITEMS = getattr(settings, 'ACTIVITY_BULK_MAX_ITEMS', 5000)
+
+
+def ingest(user, items, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Create activities for user from a list of payload dicts.
+    Returns one result per item, in input order, with a status of
+    'created', 'duplicate' or 'invalid'.
+    """
+    results = [None] * len(items)
+    # One serializer instance validates every item, as ListSerializer does,
+    # but a bad item only rejects itself rather than the whole batch
+    serializer = BulkActivitySerializer()
+    pending = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[index] = {'index': index, 'status': 'invalid',
+                              'errors': {'non_field_errors': ['Expected an object']}}
+            continue
+        try:
+            data = serializer.run_validation(item)
+        except ValidationError as e:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': e.detail}
+            continue
+        pending.append((index, {**data, 'user': user}))
+
+    pending = _drop_duplicates(user, pending, results)
+    activities = [Activity(**data) for _, data in pending]
+    estimation.fill_missing_calories(activities)
+    try:
+        _create(user, activities, chunk_size)
+    except IntegrityError:
+        # Another upload of some of these keys committed first
+        by_index = {index: activity for (index, _), activity in zip(pending, activities)}
+        pending = _drop_duplicates(user, pending, results)
+        activities = [by_index[index] for index, _ in pending]
+        for activity in activities:
+            activity.pk = None
+            activity._state.adding = True
+        _create(user, activities, chunk_size)
+    routing.stick(user.pk)
+
+    for (index, _), activity in zip(pending, activities):
+        results[index] = {'index': index, 'status': 'created', 'id': activity.pk}
+    return results
+
+
+def _create(user, activities, chunk_size):
+    with transaction.atomic():
+        _insert(user, activities, chunk_size)
+        leaderboard.record_activities_created(activities)
+        rollups.record_activities_created(activities)
+        counters.record_activities_created(activities)
+        # bulk_create sends no post_save signals
+        search_index.index_objects('activity', activities)
+
+
+def _insert(user, activities, chunk_size):
+    """Insert activities, leaving each with its primary key set"""
+    returns_ids = connection.features.can_return_rows_from_bulk_insert
+    keyed = [activity for activity in activities if returns_ids or activity.idempotency_key]
+    for start in range(0, len(keyed), chunk_size):
+        Activity.objects.bulk_create(keyed[start:start + chunk_size])
+    if returns_ids:
+        return
+    # Keys were deduplicated against the user's rows and within the batch
+    ids = dict(
+        Activity.objects.filter(user=user, idempotency_key__in=[activity.idempotency_key for activity in keyed])
+        .values_list('idempotency_key', 'id')
+    ) if keyed else {}
+    for activity in activities:
+        if activity.idempotency_key:
+            activity.pk = ids[activity.idempotency_key]
+        else:
+            activity.save(force_insert=True)
+
+
+def _drop_duplicates(user, pending, results):
+    keys = {data['idempotency_key'] for _, data in pending if data.get('idempotency_key')}
+    existing = {}
+    if keys:
+        existing = dict(
+            Activity.objects.filter(user=user, idempotency_key__in=keys)
+            .values_list('idempotency_key', 'id')
+        )
+
+    seen = set()
+    unique = []
+    for index, data in pending:
+        key = data.get('idempotency_key')
+        if key and (key in existing or key in seen):
+            results[index] = {'index': index, 'status': 'duplicate', 'id': existing.get(key)}
+            continue
+        if key:
+            seen.add(key)
+        unique.append((index, data))
+    return unique
@@ -0,0 +1,83 @@
+"""
+Streaming activity export.
+
+Rows are read with .values().iterator() so no model instances are built
+and only one chunk is held in memory, then encoded as CSV or NDJSON and
+optionally gzip-compressed as they are streamed to the client.
+"""
+import csv
+import datetime
+import json
+import zlib
+
+EXPORT_FIELDS = [
+    'id', 'user_id', 'activity_type', 'title', 'description',
+    'duration_minutes', 'calories_burned', 'distance_km', 'intensity',
+    'location', 'activity_date', 'created_at', 'updated_at',
+]
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+class _Echo:
+    """File-like object whose write() returns the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'Cannot export {type(value).__name__}')
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            value.isoformat() if isinstance(value, datetime.datetime) else value
+            for value in (row[field] for field in EXPORT_FIELDS)
+        ])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(row, default=_json_default) + '\n'
+
+
+def encode(lines, buffer_size=64 * 1024):
+    """Encode lines to bytes, coalescing them into blocks of about buffer_size"""
+    block = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        block.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            yield b''.join(block)
+            block, size = [], 0
+    if block:
+        yield b''.join(block)
+
+
+def gzip_stream(blocks, level=6):
+    """Compress a stream of byte blocks into a gzip stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(queryset, output='csv', compress=False, chunk_size=2000):
+    """Byte stream of the activities in queryset in the requested format"""
+    rows = queryset.order_by('activity_date', 'id').values(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    lines = csv_lines(rows) if output == 'csv' else ndjson_lines(rows)
+    blocks = encode(lines)
+    return gzip_stream(blocks) if compress else blocks
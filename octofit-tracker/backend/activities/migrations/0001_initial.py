@@ -0,0 +1,80 @@
+# Generated by Django 4.1.7 on 2026-10-18 20:54
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'ISO Week'), ('month', 'Month')], max_length=10)),
+                ('period_start', models.DateField(help_text='Day, Monday of the ISO week, or first of the month')),
+                ('activity_type', models.CharField(choices=[('running', 'Running'), ('cycling', 'Cycling'), ('swimming', 'Swimming'), ('walking', 'Walking'), ('gym', 'Gym/Strength'), ('yoga', 'Yoga'), ('sports', 'Sports'), ('hiking', 'Hiking'), ('other', 'Other')], max_length=20)),
+                ('activities_count', models.IntegerField(default=0)),
+                ('total_duration_minutes', models.IntegerField(default=0)),
+                ('total_calories_burned', models.FloatField(default=0)),
+                ('total_distance_km', models.FloatField(default=0)),
+                ('total_points', models.IntegerField(default=0, help_text='Leaderboard points, summed per activity')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['period_start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity_type', models.CharField(choices=[('running', 'Running'), ('cycling', 'Cycling'), ('swimming', 'Swimming'), ('walking', 'Walking'), ('gym', 'Gym/Strength'), ('yoga', 'Yoga'), ('sports', 'Sports'), ('hiking', 'Hiking'), ('other', 'Other')], max_length=20)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('duration_minutes', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('calories_burned', models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(0)])),
+                ('calories_estimated', models.BooleanField(default=False, help_text='calories_burned was estimated by activities/estimation.py rather than supplied')),
+                ('distance_km', models.FloatField(blank=True, help_text='Distance covered in kilometers', null=True)),
+                ('intensity', models.CharField(choices=[('low', 'Low'), ('moderate', 'Moderate'), ('high', 'High')], default='moderate', max_length=20)),
+                ('location', models.CharField(blank=True, max_length=200)),
+                ('activity_date', models.DateTimeField()),
+                ('idempotency_key', models.CharField(blank=True, help_text='Client-supplied key used to deduplicate device sync uploads', max_length=100, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-activity_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='activityrollup',
+            index=models.Index(fields=['user', 'period', 'period_start'], name='activities__user_id_619bf7_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='activityrollup',
+            unique_together={('user', 'period', 'period_start', 'activity_type')},
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', '-activity_date'], name='activities__user_id_ae4551_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['activity_type'], name='activities__activit_8e7970_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['user', 'idempotency_key'], name='activities__user_id_868200_idx'),
+        ),
+    ]
@@ -23,6 +23,10 @@ class Activity(models.Model):
     description = models.TextField(blank=True)
     duration_minutes = models.IntegerField(validators=[MinValueValidator(1)])
     calories_burned = models.FloatField(null=True, blank=True, validators=[MinValueValidator(0)])
+    calories_estimated = models.BooleanField(
+        default=False,
+        help_text="calories_burned was estimated by activities/estimation.py rather than supplied"
+    )
     distance_km = models.FloatField(null=True, blank=True, help_text="Distance covered in kilometers")
     intensity = models.CharField(
         max_length=20,
@@ -31,6 +35,10 @@ class Activity(models.Model):
     )
     location = models.CharField(max_length=200, blank=True)
     activity_date = models.DateTimeField()
+    idempotency_key = models.CharField(
+        max_length=100, null=True, blank=True,
+        help_text="Client-supplied key used to deduplicate device sync uploads"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -39,7 +47,45 @@ class Activity(models.Model):
         indexes = [
             models.Index(fields=['user', '-activity_date']),
             models.Index(fields=['activity_type']),
+            models.Index(fields=['user', 'idempotency_key']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='activities_activity_user_idempotency_key_uniq',
+            ),
         ]
     
     def __str__(self):
         return f"{self.user.username} - {self.activity_type} on {self.activity_date.date()}"
+
+
+class ActivityRollup(models.Model):
+    """Pre-aggregated activity totals per user, period and activity type"""
+    PERIOD_CHOICES = [
+        ('day', 'Day'),
+        ('week', 'ISO Week'),
+        ('month', 'Month'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_rollups')
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES)
+    period_start = models.DateField(help_text="Day, Monday of the ISO week, or first of the month")
+    activity_type = models.CharField(max_length=20, choices=Activity.ACTIVITY_TYPES)
+    activities_count = models.IntegerField(default=0)
+    total_duration_minutes = models.IntegerField(default=0)
+    total_calories_burned = models.FloatField(default=0)
+    total_distance_km = models.FloatField(default=0)
+    total_points = models.IntegerField(default=0, help_text="Leaderboard points, summed per activity")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('user', 'period', 'period_start', 'activity_type')
+        ordering = ['period_start']
+        indexes = [
+            models.Index(fields=['user', 'period', 'period_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.activity_type} {self.period} of {self.period_start}"
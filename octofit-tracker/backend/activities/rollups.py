@@ -0,0 +1,199 @@
+"""
+Per-user daily, weekly and monthly activity rollups.
+
+Each activity contributes to one day, one ISO-week and one calendar-month
+bucket for its activity type. Writes adjust those three rows with F()
+expressions, so the summary endpoint reads a handful of pre-aggregated
+rows instead of scanning the activity history. A bucket's first write
+creates its row; when a concurrent write creates it first, the unique
+(user, period, period_start, activity_type) key rejects the second row
+and the totals are added to the winner's instead.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from teams.leaderboard import activity_points
+from .models import Activity, ActivityRollup
+
+PERIODS = ('day', 'week', 'month')
+
+TOTAL_FIELDS = (
+    'activities_count', 'total_duration_minutes',
+    'total_calories_burned', 'total_distance_km', 'total_points'
+)
+
+
+def bucket_start(period, day):
+    """First day of the day, ISO-week or month bucket containing a date"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def period_start(period, activity_date):
+    """First day of the bucket an activity timestamp falls into"""
+    if timezone.is_aware(activity_date):
+        activity_date = timezone.localtime(activity_date)
+    return bucket_start(period, activity_date.date())
+
+
+def activity_totals(activity, sign=1):
+    """Rollup field increments contributed by an activity"""
+    return {
+        'activities_count': sign,
+        'total_duration_minutes': sign * activity.duration_minutes,
+        'total_calories_burned': sign * (activity.calories_burned or 0),
+        'total_distance_km': sign * (activity.distance_km or 0),
+        'total_points': sign * activity_points(activity.duration_minutes, activity.calories_burned),
+    }
+
+
+def bucket_keys(activity):
+    """(period, period_start, activity_type) keys an activity belongs to"""
+    return [
+        (period, period_start(period, activity.activity_date), activity.activity_type)
+        for period in PERIODS
+    ]
+
+
+def apply(user_id, keys, totals):
+    """Add totals to the rollup rows identified by keys"""
+    with transaction.atomic():
+        for period, start, activity_type in keys:
+            rows = ActivityRollup.objects.filter(
+                user_id=user_id, period=period,
+                period_start=start, activity_type=activity_type
+            )
+            increments = {field: F(field) + value for field, value in totals.items()}
+            updated = rows.update(**increments)
+            if not updated and totals['activities_count'] > 0:
+                try:
+                    with transaction.atomic():
+                        ActivityRollup.objects.create(
+                            user_id=user_id, period=period, period_start=start,
+                            activity_type=activity_type, **totals
+                        )
+                except IntegrityError:
+                    rows.update(**increments)
+            elif updated and totals['activities_count'] < 0:
+                rows.filter(activities_count__lte=0).delete()
+
+
+def record_activity_created(activity):
+    apply(activity.user_id, bucket_keys(activity), activity_totals(activity))
+
+
+def record_activities_created(activities):
+    """Apply a batch of new activities with one update per touched bucket"""
+    buckets = {}
+    for activity in activities:
+        for key in bucket_keys(activity):
+            totals = buckets.setdefault((activity.user_id, key), dict.fromkeys(TOTAL_FIELDS, 0))
+            for field, value in activity_totals(activity).items():
+                totals[field] += value
+    for (user_id, key), totals in buckets.items():
+        apply(user_id, [key], totals)
+
+
+def record_activity_deleted(activity):
+    apply(activity.user_id, bucket_keys(activity), activity_totals(activity, -1))
+
+
+def snapshot(activity):
+    """Capture what an activity contributes before it is modified"""
+    return activity.user_id, bucket_keys(activity), activity_totals(activity, -1)
+
+
+def record_activity_updated(old_snapshot, activity):
+    old_user_id, old_keys, old_totals = old_snapshot
+    apply(old_user_id, old_keys, old_totals)
+    record_activity_created(activity)
+
+
+def summarize(user_id, period, start, end):
+    """
+    Rollup buckets for a user between two dates (inclusive), each with
+    overall totals and a per-activity-type breakdown.
+    """
+    rows = ActivityRollup.objects.filter(
+        user_id=user_id, period=period,
+        period_start__gte=bucket_start(period, start),
+        period_start__lte=end,
+    ).order_by('period_start', 'activity_type')
+
+    buckets = {}
+    for row in rows:
+        bucket = buckets.get(row.period_start)
+        if bucket is None:
+            bucket = buckets[row.period_start] = {'period_start': row.period_start}
+            if period == 'week':
+                year, week, _ = row.period_start.isocalendar()
+                bucket['iso_week'] = f'{year}-W{week:02d}'
+            bucket.update({field: 0 for field in TOTAL_FIELDS})
+            bucket['by_type'] = {}
+        type_totals = {field: getattr(row, field) for field in TOTAL_FIELDS}
+        bucket['by_type'][row.activity_type] = type_totals
+        for field, value in type_totals.items():
+            bucket[field] += value
+    return list(buckets.values())
+
+
+def rebuild(user_ids=None, chunk_size=2000):
+    """
+    Recompute rollups from scratch, for all users or only user_ids.
+    Activities are streamed in user order so memory is bounded by one
+    user's buckets. The old rows are replaced in one transaction, so
+    readers never see a user's buckets missing. Returns the number of
+    activities processed.
+    """
+    with transaction.atomic():
+        return _rebuild(user_ids, chunk_size)
+
+
+def _rebuild(user_ids, chunk_size):
+    activities = Activity.objects.all()
+    rollups = ActivityRollup.objects.all()
+    if user_ids is not None:
+        activities = activities.filter(user_id__in=user_ids)
+        rollups = rollups.filter(user_id__in=user_ids)
+    rollups.delete()
+
+    rows = activities.order_by('user_id').values_list(
+        'user_id', 'activity_type', 'activity_date',
+        'duration_minutes', 'calories_burned', 'distance_km'
+    )
+    processed = 0
+    current_user = None
+    buckets = {}
+    for user_id, activity_type, activity_date, duration, calories, distance in rows.iterator(chunk_size=chunk_size):
+        if user_id != current_user:
+            _flush(current_user, buckets)
+            current_user, buckets = user_id, {}
+        for period in PERIODS:
+            key = (period, period_start(period, activity_date), activity_type)
+            totals = buckets.setdefault(key, dict.fromkeys(TOTAL_FIELDS, 0))
+            totals['activities_count'] += 1
+            totals['total_duration_minutes'] += duration
+            totals['total_calories_burned'] += calories or 0
+            totals['total_distance_km'] += distance or 0
+            totals['total_points'] += activity_points(duration, calories)
+        processed += 1
+    _flush(current_user, buckets)
+    return processed
+
+
+def _flush(user_id, buckets):
+    if user_id is None:
+        return
+    ActivityRollup.objects.bulk_create([
+        ActivityRollup(
+            user_id=user_id, period=period, period_start=start,
+            activity_type=activity_type, **totals
+        )
+        for (period, start, activity_type), totals in buckets.items()
+    ])
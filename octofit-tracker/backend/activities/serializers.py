@@ -1,16 +1,69 @@
+import math
+from django.db.models import Manager
 from rest_framework import serializers
+from octofit_tracker.serializers import DynamicFieldsMixin
+from .estimation import pace_and_speed
 from .models import Activity
 
 
-class ActivitySerializer(serializers.ModelSerializer):
+def _pace_and_speed_rows(activities):
+    """[(pace, speed)] per activity, rounded, None where no distance was recorded"""
+    pace, speed = pace_and_speed(
+        [activity.distance_km for activity in activities],
+        [activity.duration_minutes for activity in activities],
+    )
+    return [
+        tuple(None if math.isnan(value) else round(value, 2) for value in row)
+        for row in zip(pace.tolist(), speed.tolist())
+    ]
+
+
+class ActivityListSerializer(serializers.ListSerializer):
+    """Computes pace and speed for a whole page in one vectorized pass"""
+    
+    def to_representation(self, data):
+        activities = list(data.all() if isinstance(data, Manager) else data)
+        self.child.page_pace_and_speed = dict(zip(map(id, activities), _pace_and_speed_rows(activities)))
+        try:
+            return super().to_representation(activities)
+        finally:
+            self.child.page_pace_and_speed = {}
+
+
+class ActivitySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Activity model"""
     username = serializers.CharField(source='user.username', read_only=True)
+    pace_min_per_km = serializers.SerializerMethodField()
+    speed_kmh = serializers.SerializerMethodField()
     
     class Meta:
         model = Activity
         fields = [
             'id', 'user', 'username', 'activity_type', 'title', 'description',
-            'duration_minutes', 'calories_burned', 'distance_km', 'intensity',
-            'location', 'activity_date', 'created_at', 'updated_at'
+            'duration_minutes', 'calories_burned', 'calories_estimated', 'distance_km',
+            'pace_min_per_km', 'speed_kmh', 'intensity',
+            'location', 'activity_date', 'idempotency_key', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'calories_estimated', 'created_at', 'updated_at']
+        list_serializer_class = ActivityListSerializer
+    
+    # (pace, speed) of the activities of the page being rendered, by id()
+    page_pace_and_speed = {}
+    
+    def to_representation(self, instance):
+        # Both fields read the row's pair, computed once
+        row = self.page_pace_and_speed.get(id(instance))
+        self._row_pace_and_speed = row or _pace_and_speed_rows([instance])[0]
+        return super().to_representation(instance)
+    
+    def get_pace_min_per_km(self, obj):
+        return self._row_pace_and_speed[0]
+    
+    def get_speed_kmh(self, obj):
+        return self._row_pace_and_speed[1]
+
+
+class BulkActivitySerializer(ActivitySerializer):
+    """Activity serializer for bulk ingestion; the owner comes from the request"""
+    class Meta(ActivitySerializer.Meta):
+        read_only_fields = ActivitySerializer.Meta.read_only_fields + ['user']
@@ -1,7 +1,18 @@
+import gzip
+import os
+import json
+from datetime import datetime, timedelta
+from unittest import mock
+from django.db import connection
+from django.db.models import QuerySet
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.utils import timezone
-from .models import Activity
+from rest_framework.test import APIClient
+from django.core.management import call_command
+from users.models import UserProfile
+from . import analytics, estimation, rollups
+from .models import Activity, ActivityRollup
 
 
 class ActivityTestCase(TestCase):
@@ -45,3 +56,573 @@ class ActivityTestCase(TestCase):
         )
         activities = Activity.objects.all()
         self.assertEqual(activities[0].id, recent_activity.id)
+
+
+class ActivityRollupTestCase(TestCase):
+    """Test cases for daily/weekly activity rollups"""
+    
+    def setUp(self):
+        """Set up test user and API client"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def post_activity(self, activity_type, day, duration, distance=None):
+        data = {
+            'user': self.user.id,
+            'activity_type': activity_type,
+            'title': 'Session',
+            'duration_minutes': duration,
+            'calories_burned': duration * 10,
+            'activity_date': datetime(2026, 10, day, 12, tzinfo=timezone.utc).isoformat(),
+        }
+        if distance is not None:
+            data['distance_km'] = distance
+        response = self.client.post('/api/activities/', data)
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+    
+    def summary(self, **params):
+        response = self.client.get('/api/activities/summary/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+    
+    def test_daily_summary(self):
+        """Test that writes are rolled up per day and activity type"""
+        self.post_activity('running', day=12, duration=30, distance=5)
+        self.post_activity('running', day=12, duration=20, distance=3)
+        self.post_activity('yoga', day=12, duration=60)
+        self.post_activity('running', day=13, duration=10)
+        
+        results = self.summary(start='2026-10-12', end='2026-10-13')
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['activities_count'], 3)
+        self.assertEqual(results[0]['total_duration_minutes'], 110)
+        self.assertEqual(results[0]['by_type']['running']['total_distance_km'], 8)
+        self.assertEqual(results[1]['total_calories_burned'], 100)
+    
+    def test_weekly_summary_tracks_updates_and_deletes(self):
+        """Test that ISO-week buckets follow updates and deletes"""
+        # 2026-10-12 is a Monday; the 18th is the Sunday of the same ISO week
+        first = self.post_activity('cycling', day=12, duration=40)
+        second = self.post_activity('cycling', day=18, duration=20)
+        self.client.patch(f'/api/activities/{first}/', {'activity_type': 'hiking'})
+        self.client.delete(f'/api/activities/{second}/')
+        
+        results = self.summary(period='week', start='2026-10-12', end='2026-10-18')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['iso_week'], '2026-W42')
+        self.assertEqual(results[0]['activities_count'], 1)
+        self.assertEqual(list(results[0]['by_type']), ['hiking'])
+        self.assertFalse(ActivityRollup.objects.filter(activity_type='cycling').exists())
+    
+    def test_invalid_summary_params(self):
+        """Test that bad range parameters are rejected"""
+        response = self.client.get('/api/activities/summary/', {'period': 'year'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/activities/summary/', {'start': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_invalid_summary_user(self):
+        """Test that staff get a 400 for a user_id that is not an id"""
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/activities/summary/', {'user_id': 'me'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/activities/summary/', {'user_id': self.user.id}).status_code, 200)
+    
+    def test_rebuild_matches_incremental(self):
+        """Test that a rebuild reproduces the incrementally maintained rows"""
+        self.post_activity('running', day=12, duration=30, distance=5)
+        self.post_activity('swimming', day=14, duration=45)
+        self.post_activity('running', day=20, duration=15)
+        fields = ('period', 'period_start', 'activity_type', 'activities_count',
+                  'total_duration_minutes', 'total_distance_km')
+        incremental = sorted(ActivityRollup.objects.values_list(*fields))
+        
+        self.assertEqual(rollups.rebuild(chunk_size=2), 3)
+        self.assertEqual(sorted(ActivityRollup.objects.values_list(*fields)), incremental)
+    
+    def test_failed_rebuild_keeps_rows(self):
+        """Test that a rebuild failing part way leaves the previous rows in place"""
+        self.post_activity('running', day=12, duration=30)
+        with mock.patch.object(rollups, '_flush', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            rollups.rebuild()
+        self.assertEqual(ActivityRollup.objects.count(), 3)
+    
+    def test_concurrent_bucket_creation(self):
+        """Test that a bucket created by another writer after the update is added to"""
+        activity = Activity(
+            user=self.user, activity_type='running', title='Session', duration_minutes=30,
+            calories_burned=300, activity_date=datetime(2026, 10, 12, 12, tzinfo=timezone.utc),
+        )
+        [key] = [key for key in rollups.bucket_keys(activity) if key[0] == 'day']
+        totals = rollups.activity_totals(activity)
+        update = QuerySet.update
+        
+        def race(queryset, **kwargs):
+            if not ActivityRollup.objects.exists():
+                # The other writer commits its row just after our update matched nothing
+                ActivityRollup.objects.create(
+                    user=self.user, period=key[0], period_start=key[1], activity_type=key[2], **totals
+                )
+                return 0
+            return update(queryset, **kwargs)
+        
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=race):
+            rollups.apply(self.user.id, [key], totals)
+        rollup = ActivityRollup.objects.get()
+        self.assertEqual((rollup.activities_count, rollup.total_duration_minutes), (2, 60))
+
+
+class ActivityQueryBudgetTestCase(TestCase):
+    """Test that activity list pages run a fixed number of queries"""
+    
+    def setUp(self):
+        """Set up test user and API client"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def add_activities(self, count):
+        for i in range(count):
+            Activity.objects.create(
+                user=self.user, activity_type='running', title=f'Run {i}',
+                duration_minutes=30, activity_date=timezone.now()
+            )
+    
+    def test_list_query_budget(self):
+        """Test that the list endpoint does not query per row"""
+        for count in (2, 8):
+            self.add_activities(count)
+            # Keyset pagination needs no COUNT query
+            with self.assertNumQueries(1):
+                self.client.get('/api/activities/')
+
+
+class ActivityPaginationTestCase(TestCase):
+    """Test cases for keyset pagination of the activity feed"""
+    
+    def setUp(self):
+        """Set up a user with 25 activities, two of them sharing a timestamp"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        for i in range(25):
+            Activity.objects.create(
+                user=self.user, activity_type='running', title=f'Run {i}',
+                duration_minutes=30, activity_date=now - timedelta(hours=min(i, 20))
+            )
+    
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+    
+    def test_cursor_walk_visits_every_row_once(self):
+        """Test that following next links returns each activity exactly once, newest first"""
+        ids = self.walk('/api/activities/')
+        expected = list(
+            Activity.objects.order_by('-activity_date', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+    
+    def test_previous_link(self):
+        """Test that the previous link returns the preceding page"""
+        first = self.client.get('/api/activities/').data
+        second = self.client.get(first['next']).data
+        self.assertIsNone(first['previous'])
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+    
+    def test_optional_total_and_page_size(self):
+        """Test that count is opt-in and page_size is honoured"""
+        response = self.client.get('/api/activities/', {'page_size': 5})
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(response.data['results']), 5)
+        response = self.client.get('/api/activities/', {'include_total': 'true'})
+        self.assertEqual(response.data['count'], 25)
+    
+    def test_page_number_fallback(self):
+        """Test that page-number requests keep the old response shape"""
+        response = self.client.get('/api/activities/', {'page': 3})
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 5)
+    
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/activities/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ActivityBulkIngestTestCase(TestCase):
+    """Test cases for bulk activity ingestion"""
+    
+    def setUp(self):
+        """Set up test user and API client"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def item(self, key, duration=30, **extra):
+        return {
+            'activity_type': 'running',
+            'title': f'Sync {key}',
+            'duration_minutes': duration,
+            'activity_date': '2026-10-12T07:00:00Z',
+            'idempotency_key': key,
+            **extra,
+        }
+    
+    def test_json_array_with_per_item_results(self):
+        """Test that valid items are created and invalid ones reported"""
+        items = [self.item('a'), self.item('b', duration=0), self.item('c'), self.item('a')]
+        response = self.client.post('/api/activities/bulk/?chunk_size=1', items, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r['status'] for r in response.data['results']],
+            ['created', 'invalid', 'created', 'duplicate']
+        )
+        self.assertIn('duration_minutes', response.data['results'][1]['errors'])
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(Activity.objects.filter(user=self.user).count(), 2)
+        rollup = ActivityRollup.objects.get(period='day', activity_type='running')
+        self.assertEqual(rollup.activities_count, 2)
+    
+    def test_resubmission_is_deduplicated(self):
+        """Test that replaying a sync batch creates nothing new"""
+        items = [self.item('a'), self.item('b')]
+        first = self.client.post('/api/activities/bulk/', items, format='json')
+        second = self.client.post('/api/activities/bulk/', items, format='json')
+        self.assertEqual(second.data['duplicate'], 2)
+        self.assertEqual(
+            [r['id'] for r in second.data['results']],
+            [r['id'] for r in first.data['results']]
+        )
+        self.assertEqual(Activity.objects.count(), 2)
+    
+    def test_ndjson_body(self):
+        """Test that newline-delimited JSON is accepted"""
+        body = '\n'.join(json.dumps(self.item(key)) for key in ('a', 'b', 'c')) + '\n'
+        response = self.client.post(
+            '/api/activities/bulk/', body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.data['created'], 3)
+    
+    def test_owner_is_request_user(self):
+        """Test that items cannot be filed under another user"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.post('/api/activities/bulk/', [self.item('a', user=other.id)], format='json')
+        self.assertEqual(Activity.objects.get().user, self.user)
+    
+    def test_non_array_body(self):
+        response = self.client.post('/api/activities/bulk/', self.item('a'), format='json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_ids_without_bulk_insert_returning(self):
+        """Test that created ids are resolved on backends like djongo that do not return them"""
+        items = [self.item('a'), self.item(None), self.item('b')]
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            response = self.client.post('/api/activities/bulk/?chunk_size=1', items, format='json')
+        ids = [result['id'] for result in response.data['results']]
+        self.assertNotIn(None, ids)
+        self.assertEqual(
+            [Activity.objects.get(pk=pk).title for pk in ids],
+            ['Sync a', 'Sync None', 'Sync b']
+        )
+
+    
+    def test_concurrent_upload_reported_as_duplicate(self):
+        """Test that a key committed by another upload after deduplication is reported as a duplicate"""
+        from . import bulk
+        drop_duplicates = bulk._drop_duplicates
+        winners = []
+        
+        def race(user, pending, results):
+            unique = drop_duplicates(user, pending, results)
+            if not winners:
+                winners.append(Activity.objects.create(
+                    user=self.user, activity_type='running', title='Other upload', duration_minutes=30,
+                    activity_date=timezone.now(), idempotency_key='a',
+                ))
+            return unique
+        
+        with mock.patch.object(bulk, '_drop_duplicates', side_effect=race):
+            response = self.client.post('/api/activities/bulk/', [self.item('a'), self.item('b')], format='json')
+        self.assertEqual(
+            [(r['status'], r['id']) for r in response.data['results']],
+            [('duplicate', winners[0].pk), ('created', Activity.objects.get(idempotency_key='b').pk)]
+        )
+        self.assertEqual(Activity.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(ActivityRollup.objects.get(period='day').activities_count, 1)
+
+
+class ActivityExportTestCase(TestCase):
+    """Test cases for streaming activity exports"""
+    
+    def setUp(self):
+        """Set up a user with activities on three days"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        for day in (10, 11, 12):
+            Activity.objects.create(
+                user=self.user, activity_type='running', title=f'Run on the {day}th',
+                duration_minutes=day, activity_date=datetime(2026, 10, day, 8, tzinfo=timezone.utc)
+            )
+        Activity.objects.create(
+            user=self.other, activity_type='yoga', title='Not mine',
+            duration_minutes=5, activity_date=datetime(2026, 10, 11, 8, tzinfo=timezone.utc)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def export(self, **params):
+        response = self.client.get('/api/activities/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+    
+    def test_csv_export(self):
+        """Test that the CSV export has a header and only the user's rows"""
+        response, body = self.export()
+        lines = body.decode().splitlines()
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertTrue(lines[0].startswith('id,user_id,activity_type'))
+        self.assertEqual(len(lines), 4)
+        self.assertIn('Run on the 10th', lines[1])
+    
+    def test_ndjson_export_with_date_range(self):
+        """Test that start and end bound the exported rows inclusively"""
+        _, body = self.export(output='ndjson', start='2026-10-11', end='2026-10-12')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row['duration_minutes'] for row in rows], [11, 12])
+        self.assertEqual(rows[0]['activity_date'], '2026-10-11T08:00:00+00:00')
+    
+    def test_gzip_export(self):
+        """Test that gzip output decompresses to the plain export"""
+        _, plain = self.export(output='ndjson')
+        response, compressed = self.export(output='ndjson', gzip='true')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(compressed), plain)
+    
+    def test_invalid_output(self):
+        response = self.client.get('/api/activities/export/', {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsyncActivityListTestCase(TestCase):
+    """Test cases for the async-native activity list"""
+    
+    def setUp(self):
+        """Set up test user with activities on both API clients"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        other = User.objects.create_user(username='other')
+        now = timezone.now()
+        for i in range(5):
+            for owner in (self.user, other):
+                Activity.objects.create(
+                    user=owner, activity_type='running' if i % 2 else 'yoga', title=f'Session {i}',
+                    duration_minutes=30, activity_date=now - timedelta(hours=i)
+                )
+        self.client.force_login(self.user)
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.user)
+    
+    def test_matches_sync_list(self):
+        """Test that the async route returns the same page and cursor as the sync one"""
+        response = self.client.get('/api/async/activities/?page_size=2&activity_type=yoga')
+        expected = self.api_client.get('/api/activities/?page_size=2&activity_type=yoga')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], json.loads(expected.content)['results'])
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIn('/api/async/activities/', response.json()['next'])
+    
+    async def test_served_through_asgi(self):
+        """Test that the route runs under the ASGI handler"""
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get('/api/async/activities/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+    
+    def test_requires_authentication(self):
+        """Test that anonymous requests are rejected"""
+        self.client.logout()
+        response = self.client.get('/api/async/activities/')
+        self.assertIn(response.status_code, (401, 403))
+
+
+class ActivityAnalyticsTestCase(TestCase):
+    """Test cases for grouped activity analytics"""
+    
+    def setUp(self):
+        """Set up activities of two users across types, hours and weeks"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        other = User.objects.create_user(username='other', password='testpass123')
+        for user, activity_type, intensity, day, hour, duration in (
+            (self.user, 'running', 'high', 12, 7, 30),
+            (self.user, 'running', 'low', 14, 18, 20),
+            (self.user, 'yoga', 'low', 20, 7, 60),
+            (other, 'cycling', 'moderate', 12, 7, 90),
+        ):
+            Activity.objects.create(
+                user=user, activity_type=activity_type, title='Session', intensity=intensity,
+                duration_minutes=duration, calories_burned=duration * 10, location='Park',
+                activity_date=datetime(2026, 10, day, hour, tzinfo=timezone.utc),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def analytics(self, **params):
+        response = self.client.get('/api/activities/analytics/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+    
+    def test_all_dimensions(self):
+        """Test that every grouping is returned for the current user only"""
+        results = self.analytics()
+        self.assertEqual(set(results), set(analytics.DIMENSIONS))
+        self.assertEqual(
+            [(row['key'], row['count'], row['total_duration_minutes']) for row in results['activity_type']],
+            [('running', 2, 50), ('yoga', 1, 60)]
+        )
+        self.assertEqual([(row['key'], row['count']) for row in results['hour']], [(7, 2), (18, 1)])
+        self.assertEqual(
+            [(row['key'].isoformat(), row['count']) for row in results['week']],
+            [('2026-10-12', 2), ('2026-10-19', 1)]
+        )
+        self.assertEqual(results['location'][0]['total_calories_burned'], 1100)
+    
+    def test_group_by_and_range(self):
+        """Test selecting dimensions and an inclusive date range"""
+        results = self.analytics(group_by='intensity', start='2026-10-13', end='2026-10-20')
+        self.assertEqual(list(results), ['intensity'])
+        self.assertEqual([(row['key'], row['count']) for row in results['intensity']], [('low', 2)])
+    
+    def test_staff_sees_all_users(self):
+        """Test that staff aggregate over everyone unless user_id is given"""
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(sum(row['count'] for row in self.analytics(group_by='intensity')['intensity']), 4)
+    
+    def test_invalid_group_by(self):
+        """Test that unknown dimensions are rejected"""
+        response = self.client.get('/api/activities/analytics/', {'group_by': 'activity_type,mood'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_mongo_pipeline(self):
+        """Test that the MongoDB pipeline computes all facets in one aggregation"""
+        stages = analytics.pipeline(['activity_type', 'hour'], user_id=self.user.id)
+        self.assertEqual(stages[0], {'$match': {'user_id': self.user.id}})
+        self.assertEqual(list(stages[1]['$facet']), ['activity_type', 'hour'])
+        self.assertEqual(stages[1]['$facet']['activity_type'][0]['$group']['_id'], '$activity_type')
+
+
+class CalorieEstimationTestCase(TestCase):
+    """Test cases for the calorie and pace estimation engine"""
+    
+    def setUp(self):
+        """Set up a user with a profile and API client"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.create(user=self.user, weight_kg=80, height_cm=180, age=35, gender='M')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def post_activity(self, **data):
+        payload = {
+            'user': self.user.id, 'activity_type': 'running', 'title': 'Run',
+            'duration_minutes': 30, 'activity_date': timezone.now().isoformat(), **data
+        }
+        response = self.client.post('/api/activities/', payload)
+        self.assertEqual(response.status_code, 201)
+        return response.data
+    
+    def test_vectorized_matches_single(self):
+        """Test that a batch is scored exactly like its rows one by one"""
+        types, intensities = ['running', 'yoga', 'unknown'], ['high', 'low', None]
+        durations, weights, genders = [45, 60, 20], [80, None, 55], ['M', 'F', None]
+        batch = estimation.estimate_calories(types, intensities, durations, weights, None, None, genders)
+        singles = [
+            estimation.estimate_calories([t], [i], [d], [w], None, None, [g])[0]
+            for t, i, d, w, g in zip(types, intensities, durations, weights, genders)
+        ]
+        self.assertEqual(batch.tolist(), singles)
+    
+    def test_estimate_scales_with_effort_and_weight(self):
+        """Test that intensity, duration and body weight raise the estimate"""
+        low, high = estimation.estimate_calories(['cycling'] * 2, ['low', 'high'], [60, 60])
+        self.assertLess(low, high)
+        light, heavy = estimation.estimate_calories(['cycling'] * 2, ['moderate'] * 2, [60, 60], [60, 100])
+        self.assertLess(light, heavy)
+        # A 70 kg, moderate 60 minute run is MET x weight, corrected by the
+        # resting rate, which is below the 3.5 ml/kg/min average at that weight
+        [run] = estimation.estimate_calories(['running'], ['moderate'], [60])
+        self.assertTrue(9.8 * 70 * 0.8 < run < 9.8 * 70)
+    
+    def test_resting_rate_correction_direction(self):
+        """Test that kcal per kg falls as weight rises at equal METs and duration"""
+        weights = [50, 70, 90, 120]
+        kcal = estimation.estimate_calories(
+            ['running'] * 4, ['moderate'] * 4, [60] * 4, weights, [175] * 4, [30] * 4, ['M'] * 4
+        )
+        per_kg = (kcal / weights).tolist()
+        self.assertEqual(per_kg, sorted(per_kg, reverse=True))
+        # Light users burn more per kg than plain METs, heavy users less
+        self.assertGreater(per_kg[0], 9.8)
+        self.assertLess(per_kg[-1], 9.8)
+    
+    def test_create_estimates_missing_calories(self):
+        """Test that activities logged without calories get an estimate"""
+        data = self.post_activity(distance_km=5)
+        self.assertTrue(data['calories_estimated'])
+        self.assertGreater(data['calories_burned'], 0)
+        self.assertEqual((data['pace_min_per_km'], data['speed_kmh']), (6.0, 10.0))
+        
+        data = self.post_activity(calories_burned=123)
+        self.assertEqual((data['calories_burned'], data['calories_estimated']), (123, False))
+        self.assertIsNone(data['pace_min_per_km'])
+    
+    def test_list_scores_page_once(self):
+        """Test that pace and speed of a list page come from one vectorized call"""
+        for distance in (5, 10, None):
+            Activity.objects.create(
+                user=self.user, activity_type='running', title='Run', duration_minutes=30,
+                distance_km=distance, activity_date=timezone.now()
+            )
+        with mock.patch('activities.serializers.pace_and_speed', wraps=estimation.pace_and_speed) as scored:
+            response = self.client.get('/api/activities/')
+        self.assertEqual(scored.call_count, 1)
+        pairs = [(row['pace_min_per_km'], row['speed_kmh']) for row in response.data['results']]
+        self.assertEqual(sorted(pairs, key=str), [(3.0, 20.0), (6.0, 10.0), (None, None)])
+    
+    def test_update_reestimates(self):
+        """Test that editing an estimated activity refreshes its estimate"""
+        data = self.post_activity()
+        response = self.client.patch(f"/api/activities/{data['id']}/", {'duration_minutes': 60})
+        self.assertAlmostEqual(response.data['calories_burned'], data['calories_burned'] * 2, delta=0.2)
+        response = self.client.patch(f"/api/activities/{data['id']}/", {'calories_burned': 50})
+        self.assertFalse(response.data['calories_estimated'])
+    
+    def test_bulk_ingest_scores_batch(self):
+        """Test that bulk ingest estimates missing calories for the whole batch"""
+        items = [{'activity_type': 'walking', 'title': f'Walk {i}', 'duration_minutes': 30 + i,
+                  'activity_date': timezone.now().isoformat()} for i in range(3)]
+        response = self.client.post('/api/activities/bulk/', items, format='json')
+        self.assertEqual(response.data['created'], 3)
+        self.assertFalse(Activity.objects.filter(calories_burned__isnull=True).exists())
+        self.assertEqual(Activity.objects.filter(calories_estimated=True).count(), 3)
+    
+    def test_backfill_command(self):
+        """Test that the backfill estimates historical rows and refreshes profile totals"""
+        for _ in range(3):
+            Activity.objects.create(
+                user=self.user, activity_type='swimming', title='Swim',
+                duration_minutes=40, activity_date=timezone.now()
+            )
+        call_command('backfill_calories', batch_size=2, stdout=open(os.devnull, 'w'))
+        calories = list(Activity.objects.values_list('calories_burned', flat=True))
+        self.assertTrue(all(value and value > 0 for value in calories))
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertAlmostEqual(profile.total_calories_burned, sum(calories), places=3)
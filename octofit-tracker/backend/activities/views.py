@@ -1,25 +1,47 @@
-from rest_framework import viewsets, permissions, filters
+from datetime import datetime, time, timedelta
+from rest_framework import viewsets, permissions, filters, status
+from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
+from rest_framework.response import Response
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django_filters.rest_framework import DjangoFilterBackend
+from octofit_tracker.pagination import KeysetPagination
+from teams import leaderboard
+from users import counters
+from . import analytics, estimation, rollups
+from .bulk import BULK_CHUNK_SIZE, BULK_MAX_ITEMS, ingest
+from .export import FORMATS as EXPORT_FORMATS, export_stream
+from .parsers import NDJSONParser
 from .models import Activity
 from .serializers import ActivitySerializer
 
 
+class ActivityPagination(KeysetPagination):
+    """Newest first, matching the (user, -activity_date) index"""
+    ordering = ('-activity_date', '-id')
+
+
 class ActivityViewSet(viewsets.ModelViewSet):
     """
     API endpoint for activities.
     Users can log and view their activities.
     """
-    queryset = Activity.objects.all()
+    queryset = Activity.objects.select_related('user')
     serializer_class = ActivitySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ActivityPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['activity_type', 'user', 'intensity']
     ordering_fields = ['activity_date', 'created_at', 'duration_minutes', 'calories_burned']
     ordering = ['-activity_date']
+    summary_default_days = {'day': 30, 'week': 12 * 7, 'month': 365}
     
     def get_queryset(self):
         """Return activities, optionally filtered by user"""
-        queryset = Activity.objects.all()
+        queryset = super().get_queryset()
         user_id = self.request.query_params.get('user_id', None)
         if user_id is not None:
             queryset = queryset.filter(user_id=user_id)
@@ -29,5 +51,203 @@ class ActivityViewSet(viewsets.ModelViewSet):
         return queryset
     
     def perform_create(self, serializer):
-        """Create activity for the authenticated user"""
-        serializer.save(user=self.request.user)
+        """Create activity for the authenticated user, estimating calories when missing"""
+        fields = estimation.calorie_fields(self.request.user.id, serializer.validated_data)
+        # The activity and its deltas commit together or not at all
+        with transaction.atomic():
+            activity = serializer.save(user=self.request.user, **fields)
+            leaderboard.record_activity_created(activity)
+            rollups.record_activity_created(activity)
+            counters.record_activity_created(activity)
+    
+    def perform_update(self, serializer):
+        """Update activity and apply the change to leaderboards, rollups and profile counters"""
+        old_user_id = serializer.instance.user_id
+        old_delta = leaderboard.ActivityDelta.for_activity(serializer.instance)
+        old_rollup = rollups.snapshot(serializer.instance)
+        old_counters = counters.snapshot(serializer.instance)
+        user = serializer.validated_data.get('user')
+        user_id = user.id if user is not None else old_user_id
+        fields = estimation.calorie_fields(user_id, serializer.validated_data, serializer.instance)
+        with transaction.atomic():
+            activity = serializer.save(**fields)
+            leaderboard.record_activity_updated(old_user_id, old_delta, activity)
+            rollups.record_activity_updated(old_rollup, activity)
+            counters.record_activity_updated(old_counters, activity)
+    
+    def perform_destroy(self, instance):
+        """Delete activity and remove it from leaderboards, rollups and profile counters"""
+        with transaction.atomic():
+            leaderboard.record_activity_deleted(instance)
+            rollups.record_activity_deleted(instance)
+            counters.record_activity_deleted(instance)
+            instance.delete()
+    
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Create many activities for the current user from a JSON array or NDJSON body.
+        Items carrying an already-seen idempotency_key are reported as duplicates.
+        Query params: chunk_size (rows per bulk insert)
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'error': 'Expected a JSON array or NDJSON body'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(items) > BULK_MAX_ITEMS:
+            return Response(
+                {'error': f'At most {BULK_MAX_ITEMS} activities per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            chunk_size = int(request.query_params.get('chunk_size', BULK_CHUNK_SIZE))
+        except ValueError:
+            chunk_size = 0
+        if chunk_size < 1:
+            return Response(
+                {'error': 'chunk_size must be a positive integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        results = ingest(request.user, items, chunk_size=chunk_size)
+        counts = {'created': 0, 'duplicate': 0, 'invalid': 0}
+        for result in results:
+            counts[result['status']] += 1
+        return Response({**counts, 'results': results})
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Get daily, weekly or monthly activity totals from the rollup table.
+        Query params: period (day|week|month), start, end (YYYY-MM-DD), user_id (staff only)
+        """
+        period = request.query_params.get('period', 'day')
+        if period not in rollups.PERIODS:
+            return Response(
+                {'error': 'period must be one of: ' + ', '.join(rollups.PERIODS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            end = self._parse_date_param('end') or timezone.localdate()
+            start = self._parse_date_param('start') or (
+                end - timedelta(days=self.summary_default_days[period])
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response(
+                {'error': 'start must not be after end'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        user_id = request.user.id
+        if request.user.is_staff and 'user_id' in request.query_params:
+            user_id = request.query_params['user_id']
+            if not user_id.isdigit():
+                return Response(
+                    {'error': 'user_id must be a user id'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            user_id = int(user_id)
+        
+        return Response({
+            'period': period,
+            'start': start,
+            'end': end,
+            'results': rollups.summarize(user_id, period, start, end),
+        })
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the activity history as a file download.
+        Query params: output (csv|ndjson), start, end (YYYY-MM-DD, inclusive),
+        gzip (true to compress), user_id (staff only)
+        """
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'error': 'output must be one of: ' + ', '.join(EXPORT_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = self._parse_date_param('start')
+            end = self._parse_date_param('end')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self.get_queryset()
+        if start is not None:
+            queryset = queryset.filter(activity_date__gte=self._start_of_day(start))
+        if end is not None:
+            queryset = queryset.filter(activity_date__lt=self._start_of_day(end + timedelta(days=1)))
+        
+        compress = request.query_params.get('gzip') in ('1', 'true', 'True')
+        content_type, extension = EXPORT_FORMATS[output]
+        filename = f'activities.{extension}'
+        if compress:
+            content_type, filename = 'application/gzip', filename + '.gz'
+        response = StreamingHttpResponse(
+            export_stream(queryset, output=output, compress=compress),
+            content_type=content_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        Get activity totals grouped by several dimensions in one request.
+        Query params: group_by (comma-separated activity_type, intensity, location,
+        hour, week; default all), start, end (YYYY-MM-DD, inclusive),
+        user_id (staff only; staff see all users without it)
+        """
+        group_by = request.query_params.get('group_by')
+        dimensions = group_by.split(',') if group_by else list(analytics.DIMENSIONS)
+        unknown = [dimension for dimension in dimensions if dimension not in analytics.DIMENSIONS]
+        if unknown:
+            return Response(
+                {'error': 'group_by must be a list of: ' + ', '.join(analytics.DIMENSIONS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = self._parse_date_param('start')
+            end = self._parse_date_param('end')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if start is not None and end is not None and start > end:
+            return Response(
+                {'error': 'start must not be after end'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        user_id = request.user.id
+        if request.user.is_staff:
+            user_id = request.query_params.get('user_id')
+            user_id = int(user_id) if user_id and user_id.isdigit() else None
+        
+        return Response({
+            'start': start,
+            'end': end,
+            'results': analytics.aggregate(
+                dimensions,
+                user_id=user_id,
+                start=self._start_of_day(start) if start is not None else None,
+                end=self._start_of_day(end + timedelta(days=1)) if end is not None else None,
+            ),
+        })
+    
+    def _start_of_day(self, day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+    
+    def _parse_date_param(self, name):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        parsed = parse_date(value)
+        if parsed is None:
+            raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+        return parsed
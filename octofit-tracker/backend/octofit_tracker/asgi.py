@@ -8,4 +8,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'octofit_tracker_core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup; needs the app registry
+from teams import live  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """Django, plus the leaderboard event streams which Django cannot stream asynchronously"""
+    leaderboard_id = live.route(scope)
+    if leaderboard_id is not None:
+        await live.leaderboard_stream(scope, receive, send, leaderboard_id)
+    else:
+        await django_application(scope, receive, send)
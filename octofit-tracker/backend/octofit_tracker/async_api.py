@@ -0,0 +1,94 @@
+"""
+Async-native read endpoints.
+
+DRF views are synchronous, so under ASGI every request holds a worker
+thread for its whole duration. Views decorated with async_api_view run
+on the event loop instead: only the (synchronous) DRF authentication,
+permission and throttle checks are called through sync_to_async, with
+the same policy as the sync routes (IsAuthenticated and the default
+throttles), data is fetched with Django's async ORM interface, and the
+result is rendered with DRF's JSON renderer so payloads are identical
+to the sync routes.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import exceptions, permissions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status_code, content_type='application/json'
+    )
+
+
+class _AccessPolicy(APIView):
+    """Permission and throttle classes of async endpoints"""
+    permission_classes = [permissions.IsAuthenticated]
+
+
+def api_request(request):
+    """DRF Request for a Django request, with the default authentication classes"""
+    return Request(request, authenticators=[
+        authentication() for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+
+
+def check_access(request):
+    """
+    Authenticate a DRF request and run the permission and throttle checks
+    APIView.initial() would, raising the same exceptions
+    """
+    policy = _AccessPolicy()
+    policy.request = request
+    policy.check_permissions(request)
+    policy.check_throttles(request)
+
+
+def error_status(exc, request):
+    """Status code APIView would answer an APIException with"""
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        # Same rule as APIView.permission_denied: 401 only with a WWW-Authenticate challenge
+        authenticators = request.authenticators
+        if not (authenticators and authenticators[0].authenticate_header(request)):
+            return status.HTTP_403_FORBIDDEN
+    return exc.status_code
+
+
+def error_headers(exc):
+    """Headers DRF's exception handler adds to the response of an APIException"""
+    wait = getattr(exc, 'wait', None)
+    return {'Retry-After': '%d' % wait} if wait else {}
+
+
+def _error(exc, request):
+    response = render({'detail': exc.detail}, error_status(exc, request))
+    for name, value in error_headers(exc).items():
+        response[name] = value
+    return response
+
+
+def async_api_view(view):
+    """
+    Wrap an async GET view taking (request, *args, **kwargs), where request
+    is an authenticated, permitted and unthrottled DRF Request, and returning JSON-serializable data
+    or a ready HttpResponse.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return render({'detail': f'Method "{request.method}" not allowed.'},
+                          status.HTTP_405_METHOD_NOT_ALLOWED)
+        drf_request = api_request(request)
+        try:
+            await sync_to_async(check_access)(drf_request)
+            result = await view(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return _error(exc, drf_request)
+        return result if isinstance(result, HttpResponse) else render(result)
+    return wrapper
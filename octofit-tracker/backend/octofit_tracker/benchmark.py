@@ -0,0 +1,311 @@
+"""
+In-process API benchmark (manage.py benchmark).
+
+Requests go through the full Django stack (middleware, authentication,
+routing, serializers, renderers) with the test client, so results do not
+depend on a web server or network and can be compared across commits.
+Every scenario reports throughput, p50/p95/p99 latency and the number of
+database queries per request.
+
+translation_overhead() (manage.py benchmark_translation) isolates what
+djongo adds to each query: Django compiles every query to SQL on any
+backend, and djongo then parses that SQL again to build the MongoDB
+query. Both steps are timed offline for the queries of the hot
+endpoints, so no database server is needed.
+"""
+import json
+import math
+import platform
+import subprocess
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+from unittest import mock
+
+import django
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.db.models import Count
+from django.db.utils import ConnectionHandler
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from activities.models import Activity
+from octofit_tracker.cache import response_cache
+from teams.models import LeaderboardEntry, RankingScore, Team, TeamMembership
+from users.models import UserProfile
+from workouts.models import Workout, WorkoutPlan, WorkoutPlanDay
+
+REPORT_VERSION = 1
+
+
+@dataclass
+class Scenario:
+    """One endpoint call; path and payload are built from the benchmark context"""
+    name: str
+    method: str
+    path: Callable[[dict], str]
+    payload: Optional[Callable[[dict, int], dict]] = None
+    expected_status: tuple = (200,)
+
+
+def default_scenarios():
+    """List/retrieve/create on every router; writes run after the reads"""
+    return [
+        Scenario('activities.list', 'get', lambda ctx: '/api/activities/'),
+        Scenario('activities.analytics', 'get', lambda ctx: '/api/activities/analytics/'),
+        Scenario('activities.retrieve', 'get', lambda ctx: f"/api/activities/{ctx['activity_id']}/"),
+        Scenario('teams.list', 'get', lambda ctx: '/api/teams/teams/'),
+        Scenario('teams.retrieve', 'get', lambda ctx: f"/api/teams/teams/{ctx['team_id']}/"),
+        Scenario('teams.my_teams', 'get', lambda ctx: '/api/teams/teams/my_teams/?window=week'),
+        Scenario('leaderboards.entries', 'get',
+                 lambda ctx: f"/api/teams/leaderboards/{ctx['leaderboard_id']}/entries/"),
+        Scenario('workout_plans.list', 'get', lambda ctx: '/api/workouts/plans/'),
+        Scenario('workout_plans.retrieve', 'get', lambda ctx: f"/api/workouts/plans/{ctx['plan_id']}/"),
+        Scenario('workouts.recommendations', 'get', lambda ctx: '/api/workouts/recommendations/'),
+        Scenario('search', 'get', lambda ctx: '/api/search/?q=session'),
+        Scenario('profiles.me', 'get', lambda ctx: '/api/users/profiles/me/'),
+        Scenario('rankings.me', 'get', lambda ctx: '/api/teams/rankings/users/me/'),
+        Scenario('activities.create', 'post', lambda ctx: '/api/activities/', lambda ctx, i: {
+            'user': ctx['user_id'],
+            'activity_type': 'running',
+            'title': f'Benchmark run {i}',
+            'duration_minutes': 30 + i % 60,
+            'calories_burned': 250 + i % 300,
+            'distance_km': 5.0,
+            'intensity': 'moderate',
+            'activity_date': timezone.now().isoformat(),
+        }, (201,)),
+        Scenario('teams.create', 'post', lambda ctx: '/api/teams/teams/', lambda ctx, i: {
+            'name': f"Benchmark team {ctx['run_id']}-{i}",
+            'owner_id': ctx['user_id'],
+        }, (201,)),
+        Scenario('workout_plans.create', 'post', lambda ctx: '/api/workouts/plans/', lambda ctx, i: {
+            'user': ctx['user_id'],
+            'name': f'Benchmark plan {i}',
+            'duration_days': 7,
+            'difficulty_level': 'beginner',
+        }, (201,)),
+    ]
+
+
+def prepare_context(user):
+    """Object ids the scenarios address, creating a workout plan if needed"""
+    team = Team.objects.filter(members=user).select_related('leaderboard').order_by('id').first()
+    if team is None:
+        raise ValueError(f'{user.username} is not a member of any team')
+    plan = WorkoutPlan.objects.filter(user=user).order_by('id').first()
+    if plan is None:
+        plan = WorkoutPlan.objects.create(user=user, name='Benchmark plan', duration_days=7)
+        WorkoutPlanDay.objects.bulk_create([
+            WorkoutPlanDay(workout_plan=plan, workout=workout, day_number=day)
+            for day, workout in enumerate(Workout.objects.order_by('id')[:7], 1)
+        ])
+    activity = Activity.objects.filter(user=user).order_by('-activity_date').first()
+    if activity is None:
+        raise ValueError(f'{user.username} has no activities')
+    return {
+        'user_id': user.pk,
+        'team_id': team.pk,
+        'leaderboard_id': team.leaderboard.pk,
+        'plan_id': plan.pk,
+        'activity_id': activity.pk,
+        'run_id': int(time.time()),
+    }
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class BenchmarkRunner:
+    """Run scenarios as one user and collect per-scenario statistics"""
+
+    def __init__(self, user, scenarios=None, requests=200, warmup=20):
+        self.user = user
+        self.scenarios = scenarios if scenarios is not None else default_scenarios()
+        self.requests = requests
+        self.warmup = warmup
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def run(self):
+        context = prepare_context(self.user)
+        # Rate limits would reject the benchmark load rather than measure it
+        with mock.patch.object(APIView, 'throttle_classes', ()):
+            return {scenario.name: self.run_scenario(scenario, context) for scenario in self.scenarios}
+
+    def _call(self, scenario, context, i):
+        path = scenario.path(context)
+        if scenario.payload is None:
+            return getattr(self.client, scenario.method)(path)
+        return getattr(self.client, scenario.method)(path, scenario.payload(context, i), format='json')
+
+    def run_scenario(self, scenario, context):
+        # Each scenario starts cold, so cached endpoints measure one miss
+        # and then hits regardless of what ran before
+        response_cache().clear()
+        for i in range(self.warmup):
+            self._call(scenario, context, -i - 1)
+
+        latencies = []
+        queries = []
+        errors = 0
+        started = time.perf_counter()
+        for i in range(self.requests):
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                response = self._call(scenario, context, i)
+                latencies.append((time.perf_counter() - request_started) * 1000)
+            queries.append(len(captured))
+            if response.status_code not in scenario.expected_status:
+                errors += 1
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': self.requests,
+            'errors': errors,
+            'throughput_rps': round(self.requests / elapsed, 1) if elapsed else None,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 3),
+                'p95': round(percentile(latencies, 95), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'mean': round(sum(latencies) / len(latencies), 3),
+            },
+            'queries': {
+                'mean': round(sum(queries) / len(queries), 2),
+                'max': max(queries),
+            },
+        }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(results, **dataset):
+    return {
+        'version': REPORT_VERSION,
+        'created_at': timezone.now().isoformat(),
+        'commit': _git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'dataset': dataset,
+        'scenarios': results,
+    }
+
+
+def compare(report, baseline, threshold=0.2, min_latency_ms=0.5):
+    """
+    Regressions of report against a baseline report: p95 latency or
+    throughput worse by more than threshold, or more queries per request.
+    Latency changes below min_latency_ms are treated as noise.
+    """
+    regressions = []
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        old_p95, new_p95 = previous['latency_ms']['p95'], current['latency_ms']['p95']
+        if old_p95 and new_p95 > max(old_p95 * (1 + threshold), old_p95 + min_latency_ms):
+            regressions.append(f'{name}: p95 {old_p95:.2f}ms -> {new_p95:.2f}ms')
+        old_rps, new_rps = previous['throughput_rps'], current['throughput_rps']
+        if old_rps and new_rps is not None and new_rps < old_rps * (1 - threshold):
+            regressions.append(f'{name}: throughput {old_rps:.1f}/s -> {new_rps:.1f}/s')
+        if current['queries']['max'] > previous['queries']['max']:
+            regressions.append(
+                f"{name}: queries {previous['queries']['max']} -> {current['queries']['max']}"
+            )
+    return regressions
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def translation_queries(user_id=1, team_id=1, leaderboard_id=1):
+    """The reads behind the hot endpoints, as unevaluated querysets"""
+    teams = Team.objects.select_related('owner').annotate(member_count=Count('members', distinct=True))
+    return {
+        'activities.list': Activity.objects.filter(user_id=user_id).order_by('-activity_date', '-id')[:21],
+        'activities.retrieve': Activity.objects.select_related('user').filter(pk=1),
+        'teams.list': teams.order_by('-created_at')[:10],
+        'teams.my_teams': teams.filter(members=user_id).order_by('-created_at'),
+        'teams.members': TeamMembership.objects.filter(team_id=team_id).select_related('user')
+        .order_by('joined_at', 'id')[:11],
+        'leaderboards.entries': LeaderboardEntry.objects.filter(leaderboard_id=leaderboard_id)
+        .select_related('user').order_by('rank', 'id')[:11],
+        'workouts.list': Workout.objects.filter(category='cardio').order_by('-created_at')[:10],
+        'profiles.me': UserProfile.objects.select_related('user').filter(user_id=user_id),
+        'rankings.top': RankingScore.objects.filter(scope='user').order_by('-points', 'object_id')
+        .values_list('object_id', 'points')[:10],
+    }
+
+
+def _djongo_connection():
+    """An unconnected octofit_tracker.mongo connection; translating SQL needs no server"""
+    from octofit_tracker.mongo.base import DatabaseWrapper
+
+    settings_dict = ConnectionHandler().configure_settings({DEFAULT_DB_ALIAS: {
+        'ENGINE': 'octofit_tracker.mongo', 'NAME': 'octofit_translation', 'ENFORCE_SCHEMA': False,
+        'CLIENT': {'host': 'localhost', 'serverSelectionTimeoutMS': 100},
+    }})[DEFAULT_DB_ALIAS]
+    wrapper = DatabaseWrapper(settings_dict, alias='translation-benchmark')
+    wrapper.connect()
+    return wrapper
+
+
+def _median_us(step, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        step()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return round(samples[len(samples) // 2], 1)
+
+
+def translation_overhead(queries=None, repeat=50):
+    """
+    Median microseconds per query to compile it to SQL (paid on every
+    backend) and for djongo to translate that SQL to MongoDB (paid only on
+    djongo), with their ratio.
+    """
+    # djongo.base has to be imported before its query module
+    from octofit_tracker.mongo.base import DatabaseWrapper  # noqa: F401
+    from djongo.sql2mongo.query import Query
+
+    queries = queries if queries is not None else translation_queries()
+    mongo = _djongo_connection()
+    results = {}
+    try:
+        for name, queryset in queries.items():
+            sql, params = queryset.query.get_compiler(connection=mongo).as_sql()
+            compile_us = _median_us(lambda: queryset.query.clone().get_compiler(connection=mongo).as_sql(), repeat)
+            translate_us = _median_us(
+                lambda: Query(mongo.client_connection, mongo.connection, mongo.djongo_connection, sql, params),
+                repeat,
+            )
+            results[name] = {
+                'compile_us': compile_us,
+                'translate_us': translate_us,
+                'overhead': round(translate_us / compile_us, 1) if compile_us else None,
+            }
+    finally:
+        mongo.close()
+    return results
@@ -0,0 +1,211 @@
+"""
+Read-through response cache for rarely changing list/retrieve endpoints.
+
+Rendered responses are stored in the ``responses`` cache alias (in-process
+LocMemCache by default, memcached or Redis via settings) together with an
+ETag, so a hit skips the database, the serializer and the renderer, and
+a matching If-None-Match returns 304 straight away.
+
+Invalidation is generation based: list keys embed a per-namespace
+generation and detail keys a per-object generation. Model signals bump
+the generations, which orphans exactly the affected keys. The bump waits
+for the surrounding transaction to commit: a response cached from a read
+before the commit would otherwise outlive the change it missed.
+"""
+import hashlib
+import threading
+from collections import Counter
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import HttpResponse
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+CACHE_ALIAS = 'responses'
+
+
+def response_cache():
+    return caches[CACHE_ALIAS]
+
+
+class CacheStats:
+    """Hit/miss/invalidation counters per namespace"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def incr(self, namespace, event):
+        with self._lock:
+            self._counts[(namespace, event)] += 1
+
+    def report(self):
+        with self._lock:
+            counts = dict(self._counts)
+        report = {}
+        for (namespace, event), value in counts.items():
+            report.setdefault(namespace, {'hit': 0, 'miss': 0, 'not_modified': 0, 'invalidate': 0})
+            report[namespace][event] = value
+        for namespace_stats in report.values():
+            lookups = namespace_stats['hit'] + namespace_stats['not_modified'] + namespace_stats['miss']
+            namespace_stats['hit_ratio'] = round(
+                (namespace_stats['hit'] + namespace_stats['not_modified']) / lookups, 3
+            ) if lookups else None
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def _generation_key(namespace, pk=None):
+    return f'gen:{namespace}:list' if pk is None else f'gen:{namespace}:obj:{pk}'
+
+
+def _bump(key):
+    cache = response_cache()
+    # add() is a no-op when the key exists, so incr() always has a base
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def invalidate(namespace, pk=None):
+    """Invalidate all list responses of a namespace and, if given, one object"""
+    _bump(_generation_key(namespace))
+    if pk is not None:
+        _bump(_generation_key(namespace, pk))
+    stats.incr(namespace, 'invalidate')
+
+
+def invalidate_on_change(model, namespace, pk_getter=lambda instance: instance.pk):
+    """Connect save/delete signals of model to invalidate(namespace, pk_getter(instance)) on commit"""
+    def receiver(sender, instance, **kwargs):
+        pk = pk_getter(instance)
+        transaction.on_commit(lambda: invalidate(namespace, pk))
+
+    dispatch_uid = f'response-cache:{namespace}:{model._meta.label}'
+    post_save.connect(receiver, sender=model, weak=False, dispatch_uid=dispatch_uid)
+    post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=dispatch_uid)
+
+
+def invalidate_on_m2m_change(field, namespace):
+    """
+    Invalidate the owning objects, on commit, when a many-to-many field is
+    changed through the related manager (add/remove/clear bypass save
+    signals).
+    """
+    def receiver(sender, instance, action, reverse, pk_set, **kwargs):
+        if not action.startswith('post_'):
+            return
+        pks = [instance.pk] if not reverse else list(pk_set) if pk_set else [None]
+
+        def bump():
+            for pk in pks:
+                invalidate(namespace, pk)
+        transaction.on_commit(bump)
+
+    dispatch_uid = f'response-cache:{namespace}:{field.through._meta.label}:m2m'
+    m2m_changed.connect(receiver, sender=field.through, weak=False, dispatch_uid=dispatch_uid)
+
+
+def _etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    return etag in [tag.strip() for tag in header.split(',')] or header.strip() == '*'
+
+
+class CachedResponseMixin:
+    """
+    Serve list and retrieve from the response cache.
+
+    Set ``cache_namespace`` to the namespace invalidated by model signals,
+    and ``cache_per_user = True`` if responses depend on the requesting user.
+    """
+    cache_namespace = None
+    cache_per_user = False
+    cache_timeout = None  # None uses the cache alias default
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, None, args, kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        return self.cached_response(super().retrieve, request, pk, args, kwargs)
+
+    def cache_key(self, request, pk, generations):
+        scope = f'user:{request.user.pk}' if self.cache_per_user else 'all'
+        params = '&'.join(
+            f'{name}={value}'
+            for name, values in sorted(request.query_params.lists())
+            for value in values
+        )
+        raw = f'{self.cache_namespace}|{self.action}|{pk}|{scope}|{request.accepted_media_type}|{params}|{generations}'
+        return f'response:{self.cache_namespace}:' + hashlib.md5(raw.encode()).hexdigest()
+
+    def cached_response(self, handler, request, object_pk, args, kwargs):
+        cache = response_cache()
+        generation_key = _generation_key(self.cache_namespace, object_pk)
+        key = self.cache_key(request, object_pk, cache.get(generation_key, 0))
+
+        entry = cache.get(key)
+        if entry is not None:
+            if _etag_matches(request, entry['etag']):
+                stats.incr(self.cache_namespace, 'not_modified')
+                return self._not_modified(entry['etag'])
+            stats.incr(self.cache_namespace, 'hit')
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+            response['ETag'] = entry['etag']
+            response['X-Cache'] = 'HIT'
+            return response
+
+        stats.incr(self.cache_namespace, 'miss')
+        from .routing import use_primary
+        # Cached responses are served to everyone: never fill them from a lagging replica
+        with use_primary():
+            response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+
+        etag = '"%s"' % hashlib.md5(response.content).hexdigest()
+        cache.set(key, {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': etag,
+        }, **({} if self.cache_timeout is None else {'timeout': self.cache_timeout}))
+        if _etag_matches(request, etag):
+            return self._not_modified(etag)
+        response['ETag'] = etag
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def _not_modified(self, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response['ETag'] = etag
+        return response
+
+
+class ResponseCacheStatsView(APIView):
+    """
+    Admin-only hit/miss counters of the response cache per namespace.
+    DELETE clears the counters.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response(stats.report())
+
+    def delete(self, request, format=None):
+        stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
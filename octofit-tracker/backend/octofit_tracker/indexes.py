@@ -0,0 +1,318 @@
+"""
+Index verification and query plan checks.
+
+The index plan of the project is what its models declare: unique
+fields, foreign keys, unique_together, Meta.indexes and unique
+constraints, which between them cover every filter and ordering path of
+the API. Migrations create
+them on SQL databases, but djongo skips or mistranslates index
+statements it cannot parse (partial indexes, descending keys) and
+databases populated before the migrations shipped never ran them, so
+missing_indexes() compares the plan with the indexes that actually exist
+(index_information() on MongoDB, the introspection API elsewhere) and
+create_indexes() adds what is missing (manage.py verify_indexes).
+
+collection_scans() asks the database how it would run recorded SELECT
+statements and reports the tables or collections it would read in full,
+which tests use to keep the filtered endpoints on their indexes. It has
+no plan check for other vendors and reports nothing there.
+"""
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Index, Q, UniqueConstraint
+
+PROJECT_APPS = ('users', 'activities', 'teams', 'workouts', 'search')
+
+ASCENDING, DESCENDING = 1, -1
+
+# EXPLAIN QUERY PLAN detail of a table walked from end to end, directly
+# or through an index
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(?P<table>\w+)(?: AS \w+)?(?P<index> USING .+)?$')
+
+
+@dataclass(frozen=True)
+class PlannedIndex:
+    """An index the models declare"""
+    model: type
+    name: str
+    # Field names, '-' prefixed when descending
+    fields: tuple
+    # ((column, ASCENDING|DESCENDING), ...)
+    keys: tuple
+    unique: bool = False
+    # The models.Index to create, None for unique constraints
+    index: object = None
+    # The conditional models.UniqueConstraint to create
+    constraint: object = None
+    # partialFilterExpression of a conditional index on MongoDB
+    partial: dict = None
+
+    def __str__(self):
+        kind = 'unique' if self.unique else 'index'
+        return f"{self.model._meta.db_table}: {kind} ({', '.join(self.fields)})"
+
+
+def project_models(app_labels=PROJECT_APPS):
+    return [model for label in app_labels for model in apps.get_app_config(label).get_models()]
+
+
+def _keys(model, fields):
+    return tuple(
+        (model._meta.get_field(name.lstrip('-')).column, DESCENDING if name.startswith('-') else ASCENDING)
+        for name in fields
+    )
+
+
+# BSON types a non-null value of a field is stored as
+_BSON_TYPES = {
+    'CharField': 'string',
+    'TextField': 'string',
+    'SlugField': 'string',
+    'IntegerField': ['int', 'long'],
+    'BigIntegerField': ['int', 'long'],
+    'PositiveIntegerField': ['int', 'long'],
+    'FloatField': 'double',
+    'DateTimeField': 'date',
+}
+
+
+def _partial_filter(model, condition):
+    """partialFilterExpression of a condition made of field__isnull=False terms, None otherwise
+
+    MongoDB partial indexes take no $ne or $not, and a sparse compound
+    index still holds every document that has any of its keys, so
+    non-null is spelled as a $type match.
+    """
+    if not isinstance(condition, Q) or condition.connector != Q.AND or condition.negated:
+        return None
+    expression = {}
+    for child in condition.children:
+        if not isinstance(child, tuple) or not child[0].endswith('__isnull') or child[1] is not False:
+            return None
+        field = model._meta.get_field(child[0][:-len('__isnull')])
+        bson_type = _BSON_TYPES.get(field.get_internal_type())
+        if bson_type is None:
+            return None
+        expression[field.column] = {'$type': bson_type}
+    return expression
+
+
+def planned_indexes(models=None, using=DEFAULT_DB_ALIAS):
+    """The indexes declared by models (default: the project's) that the database supports"""
+    features = connections[using].features
+    planned = []
+    for model in models if models is not None else project_models():
+        opts = model._meta
+        for field in opts.local_fields:
+            # Unique fields and foreign keys; filters on a foreign key rely on its index
+            if field.primary_key or not (field.unique or field.db_index):
+                continue
+            fields = (field.name,)
+            name = f"{opts.db_table}_{field.column}_{'uniq' if field.unique else 'idx'}"
+            planned.append(PlannedIndex(
+                model, name, fields, _keys(model, fields), unique=field.unique,
+                index=None if field.unique else Index(fields=list(fields), name=name),
+            ))
+        for fields in opts.unique_together:
+            planned.append(PlannedIndex(
+                model, f"{opts.db_table}_{'_'.join(fields)}_uniq", tuple(fields), _keys(model, fields), unique=True,
+            ))
+        for index in opts.indexes:
+            if index.condition is not None and not features.supports_partial_indexes:
+                continue
+            planned.append(PlannedIndex(
+                model, index.name, tuple(index.fields), _keys(model, index.fields), index=index,
+            ))
+        for constraint in opts.constraints:
+            if not isinstance(constraint, UniqueConstraint) or not constraint.fields:
+                continue
+            fields = tuple(constraint.fields)
+            if constraint.condition is None:
+                planned.append(PlannedIndex(model, constraint.name, fields, _keys(model, fields), unique=True))
+            elif features.supports_partial_indexes:
+                planned.append(PlannedIndex(
+                    model, constraint.name, fields, _keys(model, fields), unique=True, constraint=constraint,
+                ))
+            elif connections[using].vendor == 'djongo':
+                # djongo skips the migration's partial index; create it natively
+                partial = _partial_filter(model, constraint.condition)
+                if partial is not None:
+                    planned.append(PlannedIndex(
+                        model, constraint.name, fields, _keys(model, fields), unique=True, partial=partial,
+                    ))
+    return planned
+
+
+def live_indexes(model, using=DEFAULT_DB_ALIAS):
+    """{keys: unique} of the indexes that exist on model's table or collection"""
+    connection = connections[using]
+    if connection.vendor == 'djongo':
+        connection.ensure_connection()
+        information = connection.connection[model._meta.db_table].index_information()
+        return {
+            tuple((column, int(direction)) for column, direction in spec['key']): spec.get('unique', False)
+            for spec in information.values()
+        }
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    live = {}
+    for constraint in constraints.values():
+        if not (constraint['index'] or constraint['unique']) or not constraint['columns']:
+            continue
+        orders = constraint.get('orders') or [None] * len(constraint['columns'])
+        keys = tuple(
+            (column, DESCENDING if order == 'DESC' else ASCENDING)
+            for column, order in zip(constraint['columns'], orders)
+        )
+        live[keys] = live.get(keys, False) or constraint['unique']
+    return live
+
+
+def _exists(planned, live):
+    # An index read backwards serves the mirrored key order
+    flipped = tuple((column, -direction) for column, direction in planned.keys)
+    return any(
+        keys in (planned.keys, flipped) and (unique or not planned.unique)
+        for keys, unique in live.items()
+    )
+
+
+def missing_indexes(models=None, using=DEFAULT_DB_ALIAS):
+    """Planned indexes that do not exist in the database"""
+    live = {}
+    missing = []
+    for planned in planned_indexes(models, using):
+        if planned.model not in live:
+            live[planned.model] = live_indexes(planned.model, using)
+        if not _exists(planned, live[planned.model]):
+            missing.append(planned)
+    return missing
+
+
+def create_indexes(indexes, using=DEFAULT_DB_ALIAS):
+    """Create planned indexes, natively on MongoDB (djongo may not translate them)"""
+    connection = connections[using]
+    if connection.vendor == 'djongo':
+        connection.ensure_connection()
+        for planned in indexes:
+            options = {'partialFilterExpression': planned.partial} if planned.partial else {}
+            connection.connection[planned.model._meta.db_table].create_index(
+                list(planned.keys), name=planned.name, unique=planned.unique, **options,
+            )
+        return
+    with connection.schema_editor() as editor:
+        for planned in indexes:
+            if planned.index is not None:
+                editor.add_index(planned.model, planned.index)
+            elif planned.constraint is not None:
+                editor.add_constraint(planned.model, planned.constraint)
+            else:
+                editor.alter_unique_together(planned.model, [], [planned.fields])
+
+
+@contextmanager
+def capture_statements(using=DEFAULT_DB_ALIAS):
+    """Record the (sql, params) of every statement run in the block"""
+    statements = []
+
+    def record(execute, sql, params, many, context):
+        statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(record):
+        yield statements
+
+
+def _sqlite_scans(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        details = [row[-1] for row in cursor.fetchall()]
+    # An index walked in the requested order stops at the LIMIT; one
+    # walked before a sort is read in full
+    ordered_walk = ' LIMIT ' in sql and not any(detail.startswith('USE TEMP B-TREE') for detail in details)
+    return [
+        match.group('table') for match in map(_SQLITE_SCAN.match, details)
+        if match and not (match.group('index') and ordered_walk)
+    ]
+
+
+def _postgresql_scans(connection, sql, params):
+    def walk(node):
+        if node.get('Node Type') == 'Seq Scan':
+            yield node['Relation Name']
+        for child in node.get('Plans', ()):
+            yield from walk(child)
+
+    with connection.cursor() as cursor:
+        # Tiny test tables are cheaper to scan; ask whether an index path exists at all
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            [[plan]] = cursor.fetchone()
+        finally:
+            cursor.execute('RESET enable_seqscan')
+    return list(walk(plan['Plan']))
+
+
+def _winning_stages(document):
+    if isinstance(document, dict):
+        for key, value in document.items():
+            if key == 'winningPlan':
+                yield from _stages(value)
+            else:
+                yield from _winning_stages(value)
+    elif isinstance(document, list):
+        for value in document:
+            yield from _winning_stages(value)
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+def _mongo_scans(connection, sql, params):
+    # djongo.base has to be imported before its query module
+    from octofit_tracker.mongo.base import DatabaseWrapper  # noqa: F401
+    from djongo.sql2mongo.query import Query
+
+    connection.ensure_connection()
+    select = Query(connection.client_connection, connection.connection, connection.djongo_connection, sql, params)._query
+    if select._needs_aggregation():
+        explained = connection.connection.command(
+            'aggregate', select.left_table, pipeline=select._make_pipeline(), explain=True,
+        )
+    else:
+        explained = select._get_cursor().explain()
+    return [select.left_table] if 'COLLSCAN' in _winning_stages(explained) else []
+
+
+def collection_scans(statements, using=DEFAULT_DB_ALIAS):
+    """
+    [(table, sql)] for each full table or collection scan the SELECT
+    statements would do. Vendors without a plan check (anything but
+    SQLite, PostgreSQL and MongoDB) are unsupported and report no scans.
+    """
+    connection = connections[using]
+    explain = {
+        'sqlite': _sqlite_scans,
+        'postgresql': _postgresql_scans,
+        'djongo': _mongo_scans,
+    }.get(connection.vendor)
+    if explain is None:
+        return []
+    return [
+        (table, sql)
+        for sql, params in statements if sql.lstrip().upper().startswith('SELECT')
+        for table in explain(connection, sql, params)
+    ]
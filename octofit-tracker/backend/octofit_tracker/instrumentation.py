@@ -0,0 +1,371 @@
+"""
+Per-endpoint query count and latency instrumentation.
+
+RequestTimingMiddleware measures every request and files the sample
+under the resolved viewset action (e.g. ``ActivityViewSet.list``).
+Samples are appended to per-thread ring buffers, so recording never
+takes a lock; the buffers are only merged when the admin report at
+``/api/metrics/`` is requested.
+
+The middleware works for both sync and async views. Queries are timed
+by an execute wrapper installed on every connection that reports to the
+current request's timer through a context variable, which also follows
+async views into the threads where their ORM calls run.
+
+PoolMonitor listens to the MongoDB driver's connection pool events and
+reports, per server, how long threads waited to check out a connection,
+how many timed out and how many connections were opened, at
+``/api/metrics/db-pool/``.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from pymongo import monitoring
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+PERCENTILES = (50, 95, 99)
+
+METRICS = ('queries', 'db_ms', 'serialize_ms', 'total_ms')
+
+
+class MetricsCollector:
+    """Collects request samples into per-thread buffers"""
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._local = threading.local()
+        self._buffers = []
+        self._registry_lock = threading.Lock()
+
+    def _buffer(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = {}
+            # Only taken once per thread, never on the recording path
+            with self._registry_lock:
+                self._buffers.append(buffer)
+        return buffer
+
+    def record(self, endpoint, sample):
+        """Record a (queries, db_ms, serialize_ms, total_ms) sample"""
+        buffer = self._buffer()
+        samples = buffer.get(endpoint)
+        if samples is None:
+            samples = buffer[endpoint] = deque(maxlen=self.max_samples)
+        samples.append(sample)
+
+    def report(self):
+        """Aggregate percentiles per endpoint across all threads"""
+        merged = {}
+        with self._registry_lock:
+            buffers = list(self._buffers)
+        for buffer in buffers:
+            for endpoint, samples in list(buffer.items()):
+                merged.setdefault(endpoint, []).extend(list(samples))
+
+        report = {}
+        for endpoint, samples in sorted(merged.items()):
+            columns = list(zip(*samples))
+            report[endpoint] = {'count': len(samples)}
+            for name, values in zip(METRICS, columns):
+                report[endpoint][name] = _percentiles(sorted(values))
+        return report
+
+    def reset(self):
+        with self._registry_lock:
+            for buffer in self._buffers:
+                buffer.clear()
+
+
+def _percentiles(values):
+    result = {}
+    for p in PERCENTILES:
+        index = max(0, -(-len(values) * p // 100) - 1)
+        result[f'p{p}'] = round(values[index], 3)
+    return result
+
+
+collector = MetricsCollector(getattr(settings, 'REQUEST_METRICS_MAX_SAMPLES', 1000))
+
+
+class _QueryTimer:
+    """Database execute wrapper that counts queries and their duration"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+_current_timer = ContextVar('request_query_timer', default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def _install(connection):
+    if _timed_execute not in connection.execute_wrappers:
+        # Outermost, below any connection.execute_wrapper() block already
+        # open, which pops its own wrapper off the end when it exits
+        connection.execute_wrappers.insert(0, _timed_execute)
+
+
+def _install_on_connection(sender, connection, **kwargs):
+    _install(connection)
+
+
+connection_created.connect(_install_on_connection, dispatch_uid='request-timing')
+
+
+def endpoint_name(request):
+    """Name of the viewset action (or URL name) that handled a request"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class RequestTimingMiddleware:
+    """
+    Record query count, DB time, serialization time and wall time per
+    endpoint, and expose them in a Server-Timing response header.
+
+    Serialization time is the time spent in the view minus the database
+    time inside it, which for DRF viewsets is dominated by serializers.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'REQUEST_METRICS_ENABLED', True)
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets Django call this middleware without a thread under ASGI
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        # Connections opened before this module was loaded missed connection_created
+        for connection in connections.all():
+            _install(connection)
+        timer, token, start = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self.finish(request, response, timer, start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        timer, token, start = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self.finish(request, response, timer, start)
+
+    def start(self, request):
+        timer = _QueryTimer()
+        request._timing = {'timer': timer}
+        return timer, _current_timer.set(timer), time.perf_counter()
+
+    def finish(self, request, response, timer, start):
+        total = time.perf_counter() - start
+
+        timing = request._timing
+        view_seconds = timing.get('view_end', 0) - timing.get('view_start', 0)
+        view_db_seconds = timing.get('db_after_view', 0) - timing.get('db_before_view', 0)
+        serialize = max(0.0, view_seconds - view_db_seconds) if 'view_end' in timing else 0.0
+
+        endpoint = endpoint_name(request)
+        if endpoint is not None:
+            collector.record(endpoint, (
+                timer.queries, timer.seconds * 1000, serialize * 1000, total * 1000
+            ))
+        response['Server-Timing'] = (
+            f'db;dur={timer.seconds * 1000:.2f};desc="{timer.queries} queries", '
+            f'serialize;dur={serialize * 1000:.2f}, '
+            f'total;dur={total * 1000:.2f}'
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = getattr(request, '_timing', None)
+        if timing is not None:
+            timing['db_before_view'] = timing['timer'].seconds
+            timing['view_start'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after this hook, so it marks the end of the view
+        timing = getattr(request, '_timing', None)
+        if timing is not None:
+            timing['view_end'] = time.perf_counter()
+            timing['db_after_view'] = timing['timer'].seconds
+        return response
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """
+    Connection pool gauges and checkout wait times per server address.
+
+    Events arrive on the threads doing the checkout, so the start of a
+    wait is kept thread-local; counters are updated under one lock, which
+    is only held for a few increments.
+    """
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def _pool(self, address):
+        pool = self._pools.get(address)
+        if pool is None:
+            pool = self._pools[address] = {
+                'open': 0, 'in_use': 0, 'created': 0, 'closed': 0, 'cleared': 0,
+                'checkouts': 0, 'failed': {}, 'waits': deque(maxlen=self.max_samples),
+            }
+        return pool
+
+    def _count(self, address, name, delta=1):
+        with self._lock:
+            self._pool(address)[name] += delta
+
+    def _waited(self, address):
+        started = getattr(self._local, 'started', {}).pop(address, None)
+        return None if started is None else (time.perf_counter() - started) * 1000
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_cleared(self, event):
+        self._count(event.address, 'cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['created'] += 1
+            pool['open'] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['closed'] += 1
+            pool['open'] -= 1
+
+    def connection_check_out_started(self, event):
+        if isinstance(event, monitoring.ConnectionCheckOutFailedEvent):
+            # pymongo 3.12 publishes failed checkouts through this callback
+            return self.connection_check_out_failed(event)
+        if not hasattr(self._local, 'started'):
+            self._local.started = {}
+        self._local.started[event.address] = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._waited(event.address)
+        with self._lock:
+            pool = self._pool(event.address)
+            pool['checkouts'] += 1
+            pool['in_use'] += 1
+            if waited is not None:
+                pool['waits'].append(waited)
+
+    def connection_check_out_failed(self, event):
+        self._waited(event.address)
+        with self._lock:
+            failed = self._pool(event.address)['failed']
+            failed[event.reason] = failed.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        self._count(event.address, 'in_use', -1)
+
+    def report(self):
+        """Gauges, counters and wait-time percentiles (ms) per 'host:port'"""
+        with self._lock:
+            pools = {address: {**pool, 'failed': dict(pool['failed']), 'waits': sorted(pool['waits'])}
+                     for address, pool in self._pools.items()}
+        report = {}
+        for (host, port), pool in sorted(pools.items()):
+            waits = pool.pop('waits')
+            pool['wait_ms'] = {**_percentiles(waits), 'max': round(waits[-1], 3)} if waits else None
+            report[f'{host}:{port}'] = pool
+        return report
+
+    def reset(self):
+        """Clear counters and samples; open and in-use gauges are kept"""
+        with self._lock:
+            for pool in self._pools.values():
+                pool.update(created=0, closed=0, cleared=0, checkouts=0, failed={})
+                pool['waits'].clear()
+
+
+pool_monitor = PoolMonitor(getattr(settings, 'REQUEST_METRICS_MAX_SAMPLES', 1000))
+
+
+class RequestMetricsView(APIView):
+    """
+    Admin-only report of per-endpoint query counts and latency percentiles.
+    DELETE clears the collected samples.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response(collector.report())
+
+    def delete(self, request, format=None):
+        collector.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DatabasePoolMetricsView(APIView):
+    """
+    Admin-only report of MongoDB connection pool usage and wait times.
+    DELETE clears the counters.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response(pool_monitor.report())
+
+    def delete(self, request, format=None):
+        pool_monitor.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
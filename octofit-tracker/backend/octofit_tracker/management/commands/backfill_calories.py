@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from activities import estimation, rollups
+from teams import ranking
+from teams.leaderboard import rebuild_leaderboard
+from teams.models import Leaderboard
+from users import counters
+
+
+class Command(BaseCommand):
+    help = 'Estimate calories for activities recorded without them and refresh the totals they feed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Number of activities estimated per vectorized batch'
+        )
+        parser.add_argument(
+            '--recompute', action='store_true',
+            help='Also re-estimate previously estimated activities (e.g. after profile changes)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Count the activities that would be estimated without updating them'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Estimating missing calories...')
+        estimated, user_ids = estimation.backfill(
+            batch_size=options['batch_size'],
+            recompute=options['recompute'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'Would estimate' if options['dry_run'] else 'Estimated'
+        self.stdout.write(self.style.SUCCESS(f'✓ {verb} calories for {estimated} activities'))
+        if options['dry_run'] or not user_ids:
+            return
+
+        # Calories feed points, rollups and profile totals of the affected users
+        user_ids = sorted(user_ids)
+        rollups.rebuild(user_ids=user_ids)
+        counters.reconcile(user_ids=user_ids)
+        leaderboards = Leaderboard.objects.filter(team__members__in=user_ids).distinct().select_related('team')
+        for leaderboard in leaderboards:
+            rebuild_leaderboard(leaderboard)
+        ranking.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✓ Refreshed totals of {len(user_ids)} users'))
@@ -0,0 +1,95 @@
+import json
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from activities.models import Activity
+from octofit_tracker.benchmark import BenchmarkRunner, build_report, compare, default_scenarios, load_report
+from octofit_tracker.seeding import ScaleSeeder
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the API against a freshly seeded test database and write a JSON report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10000, help='Activities to seed')
+        parser.add_argument('--users', type=int, help='Synthetic users (default: activities / 200)')
+        parser.add_argument('--teams', type=int, help='Synthetic teams (default: users / 25)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the dataset')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario')
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Only run this scenario, e.g. activities.list (can be repeated)'
+        )
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--baseline', help='Fail if the report regresses against this JSON report')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Allowed relative p95 latency/throughput change before a regression is reported'
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Keep the test database between runs and reuse its data if already seeded'
+        )
+
+    def handle(self, *args, **options):
+        scenarios = default_scenarios()
+        if options['scenarios']:
+            unknown = set(options['scenarios']) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in scenarios if scenario.name in options['scenarios']]
+
+        # Benchmarks never touch the configured database, only its test copy
+        old_name = connection.creation.create_test_db(verbosity=0, keepdb=options['keepdb'])
+        try:
+            report = self.run_benchmark(scenarios, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"✓ Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            regressions = compare(report, load_report(options['baseline']), options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against baseline:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('✓ No regressions against baseline'))
+
+    def run_benchmark(self, scenarios, options):
+        if not Activity.objects.exists():
+            ScaleSeeder(
+                activities=options['scale'],
+                users=options['users'],
+                teams=options['teams'],
+                seed=options['seed'],
+                # Up to now rather than midnight, so the current week has activities on a Monday too
+                anchor=timezone.now(),
+                log=lambda message: self.stderr.write(f'✓ {message}'),
+            ).run()
+
+        # The first synthetic user owns a team, so every scenario has data
+        user = User.objects.filter(username__startswith='athlete').order_by('id').first()
+        runner = BenchmarkRunner(user, scenarios, requests=options['requests'], warmup=options['warmup'])
+        results = runner.run()
+        for name, result in results.items():
+            latency = result['latency_ms']
+            self.stderr.write(
+                f"{name:<24} {result['throughput_rps']:>8}/s  p50 {latency['p50']:>7.2f}ms  "
+                f"p95 {latency['p95']:>7.2f}ms  p99 {latency['p99']:>7.2f}ms  "
+                f"queries {result['queries']['max']:>3}  errors {result['errors']}"
+            )
+        return build_report(
+            results,
+            activities=Activity.objects.count(),
+            users=User.objects.count(),
+            seed=options['seed'],
+            requests=options['requests'],
+            warmup=options['warmup'],
+        )
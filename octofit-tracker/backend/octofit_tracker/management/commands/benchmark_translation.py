@@ -0,0 +1,26 @@
+import json
+from django.core.management.base import BaseCommand
+from octofit_tracker.benchmark import translation_overhead
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-query cost of djongo translating SQL to MongoDB against compiling the SQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=200, help='Timed runs per query')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        results = translation_overhead(repeat=options['repeat'])
+        for name, result in results.items():
+            self.stderr.write(
+                f"{name:<24} compile {result['compile_us']:>8.1f}us  "
+                f"translate {result['translate_us']:>9.1f}us  x{result['overhead']}"
+            )
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"✓ Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
@@ -1,8 +1,16 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from users.models import UserProfile
-from activities.models import Activity
-from teams.models import Team, TeamMembership, Leaderboard, LeaderboardEntry
+from activities.models import Activity, ActivityRollup
+from activities import rollups
+from users import counters
+from teams import ranking
+from teams.models import Team, TeamMembership, Leaderboard, LeaderboardEntry, RankingNode, RankingScore
+from teams.leaderboard import rebuild_leaderboard
+from octofit_tracker.seeding import ScaleSeeder, create_workouts
+from search import index as search_index
+from search.models import SearchPosting
+from workouts import recommendations
 from workouts.models import Workout, WorkoutPlan, WorkoutPlanDay
 from datetime import datetime, timedelta
 from django.utils import timezone
@@ -12,19 +20,44 @@ import random
 class Command(BaseCommand):
     help = 'Populate the octofit_db database with test data'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, metavar='ACTIVITIES',
+            help='Generate a synthetic load-test dataset with this many activities '
+                 'instead of the superhero sample data'
+        )
+        parser.add_argument('--users', type=int, help='Synthetic users (default: activities / 200)')
+        parser.add_argument('--teams', type=int, help='Synthetic teams (default: users / 25)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Worker processes generating activities, one user shard at a time'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for reproducible data')
+        parser.add_argument('--days', type=int, default=365, help='Spread activities over this many days')
+
     def handle(self, *args, **options):
-        # Clear existing data
+        # Clear existing data, dependent rows first so large tables are
+        # removed with a single DELETE rather than collected for cascades
         self.stdout.write('Clearing existing data...')
-        User.objects.all().delete()
-        UserProfile.objects.all().delete()
+        RankingScore.objects.all().delete()
+        RankingNode.objects.all().delete()
+        SearchPosting.objects.all().delete()
+        ActivityRollup.objects.all().delete()
         Activity.objects.all().delete()
-        Team.objects.all().delete()
-        TeamMembership.objects.all().delete()
-        Leaderboard.objects.all().delete()
         LeaderboardEntry.objects.all().delete()
-        Workout.objects.all().delete()
-        WorkoutPlan.objects.all().delete()
+        Leaderboard.objects.all().delete()
+        TeamMembership.objects.all().delete()
         WorkoutPlanDay.objects.all().delete()
+        WorkoutPlan.objects.all().delete()
+        UserProfile.objects.all().delete()
+        Team.objects.all().delete()
+        Workout.objects.all().delete()
+        User.objects.all().delete()
+        
+        if options['scale']:
+            self.populate_at_scale(options)
+            return
         
         self.stdout.write('Starting database population...')
         
@@ -40,6 +73,14 @@ class Command(BaseCommand):
         activities = self.create_activities(users)
         self.stdout.write(self.style.SUCCESS(f'✓ Created {len(activities)} activities'))
         
+        # Build activity rollups
+        rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS('✓ Built activity rollups'))
+        
+        # Fill in the profile activity counters
+        counters.reconcile()
+        self.stdout.write(self.style.SUCCESS('✓ Computed profile activity counters'))
+        
         # Create sample workouts
         workouts = self.create_workouts()
         self.stdout.write(self.style.SUCCESS(f'✓ Created {len(workouts)} workout templates'))
@@ -52,12 +93,41 @@ class Command(BaseCommand):
         leaderboards = self.create_leaderboards(teams, users, activities)
         self.stdout.write(self.style.SUCCESS(f'✓ Created {len(leaderboards)} leaderboards'))
         
+        # Rank users and teams globally
+        ranking.rebuild()
+        self.stdout.write(self.style.SUCCESS('✓ Built global rankings'))
+        
         # Create workout plans
         plans = self.create_workout_plans(users, workouts)
         self.stdout.write(self.style.SUCCESS(f'✓ Created {len(plans)} workout plans'))
         
+        # Precompute workout recommendations
+        refreshed = recommendations.refresh()
+        self.stdout.write(self.style.SUCCESS(f'✓ Recommended workouts for {refreshed} users'))
+        
+        # Build the search index
+        indexed = search_index.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {sum(indexed.values())} documents for search'))
+        
         self.stdout.write(self.style.SUCCESS('\n✓ Database population completed successfully!'))
 
+    def populate_at_scale(self, options):
+        """Seed a large synthetic dataset with bulk inserts"""
+        self.stdout.write(f"Seeding {options['scale']} synthetic activities...")
+        seeder = ScaleSeeder(
+            activities=options['scale'],
+            users=options['users'],
+            teams=options['teams'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            seed=options['seed'],
+            days=options['days'],
+            log=lambda message: self.stdout.write(self.style.SUCCESS(f'✓ {message}')),
+        )
+        seeder.run()
+        
+        self.stdout.write(self.style.SUCCESS('\n✓ Synthetic dataset completed successfully!'))
+
     def create_superhero_users(self):
         """Create sample superhero users"""
         superhero_data = [
@@ -106,8 +176,6 @@ class Command(BaseCommand):
                     'height_cm': random.randint(150, 200),
                     'weight_kg': random.randint(50, 100),
                     'fitness_level': random.choice(fitness_levels),
-                    'total_workouts': random.randint(0, 50),
-                    'total_activities': random.randint(0, 100),
                 }
             )
             profiles.append(profile)
@@ -140,78 +208,7 @@ class Command(BaseCommand):
 
     def create_workouts(self):
         """Create sample workout templates"""
-        workouts_data = [
-            {
-                'title': 'Morning Run',
-                'description': 'A refreshing morning run to start the day',
-                'category': 'cardio',
-                'difficulty': 'beginner',
-                'estimated_duration_minutes': 30,
-                'estimated_calories': 300,
-                'instructions': 'Warm up for 5 minutes, then run at a steady pace for 25 minutes.',
-                'equipment_needed': 'Running shoes',
-            },
-            {
-                'title': 'Strength Training Session',
-                'description': 'Full body strength workout',
-                'category': 'strength',
-                'difficulty': 'intermediate',
-                'estimated_duration_minutes': 60,
-                'estimated_calories': 400,
-                'instructions': 'Perform 3 sets of various exercises targeting all major muscle groups.',
-                'equipment_needed': 'Dumbbells, Barbell, Bench',
-            },
-            {
-                'title': 'Yoga Flow',
-                'description': 'Relaxing yoga session for flexibility',
-                'category': 'flexibility',
-                'difficulty': 'beginner',
-                'estimated_duration_minutes': 45,
-                'estimated_calories': 150,
-                'instructions': 'Follow a guided yoga sequence focusing on flexibility and mindfulness.',
-                'equipment_needed': 'Yoga Mat',
-            },
-            {
-                'title': 'HIIT Workout',
-                'description': 'High Intensity Interval Training',
-                'category': 'hiit',
-                'difficulty': 'advanced',
-                'estimated_duration_minutes': 30,
-                'estimated_calories': 500,
-                'instructions': 'Perform 30 seconds of high intensity exercise followed by 30 seconds rest.',
-                'equipment_needed': 'None',
-            },
-            {
-                'title': 'Cycling Adventure',
-                'description': 'Outdoor cycling session',
-                'category': 'cardio',
-                'difficulty': 'intermediate',
-                'estimated_duration_minutes': 90,
-                'estimated_calories': 600,
-                'instructions': 'Ride on varying terrain at a comfortable pace.',
-                'equipment_needed': 'Bicycle',
-            },
-            {
-                'title': 'Swimming Session',
-                'description': 'Pool workout combining different strokes',
-                'category': 'cardio',
-                'difficulty': 'intermediate',
-                'estimated_duration_minutes': 45,
-                'estimated_calories': 350,
-                'instructions': 'Practice different swimming strokes for full body conditioning.',
-                'equipment_needed': 'Swimming Pool, Swimsuit',
-            },
-        ]
-        
-        workouts = []
-        for workout_data in workouts_data:
-            workout, created = Workout.objects.get_or_create(
-                title=workout_data['title'],
-                defaults=workout_data
-            )
-            workouts.append(workout)
-        
-        return workouts
+        return create_workouts()
 
     def create_superhero_teams(self, users):
         """Create Marvel and DC teams"""
@@ -258,21 +255,7 @@ class Command(BaseCommand):
             
             # Create leaderboard entries
             if created:
-                members = team.members.all()
-                for rank, member in enumerate(members, 1):
-                    member_activities = activities.filter(user=member)
-                    total_duration = sum(a.duration_minutes for a in member_activities)
-                    total_calories = sum(a.calories_burned or 0 for a in member_activities)
-                    
-                    LeaderboardEntry.objects.create(
-                        leaderboard=leaderboard,
-                        user=member,
-                        rank=rank,
-                        points=rank * 100,
-                        activities_count=member_activities.count(),
-                        total_duration_minutes=total_duration,
-                        total_calories_burned=total_calories,
-                    )
+                rebuild_leaderboard(leaderboard)
             
             leaderboards.append(leaderboard)
         
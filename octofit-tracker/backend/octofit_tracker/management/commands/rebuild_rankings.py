@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from teams import ranking
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the global user and team rankings from activities and leaderboard entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Number of activities fetched from the database per round trip'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding global rankings...')
+        users, teams = ranking.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Ranked {users} users and {teams} teams'))
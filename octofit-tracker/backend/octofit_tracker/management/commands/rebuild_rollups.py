@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from activities import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily/weekly activity rollup table from the activity history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only rebuild rollups for this user id (can be repeated)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Number of activities fetched from the database per round trip'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding activity rollups...')
+        processed = rollups.rebuild(
+            user_ids=options['user_ids'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✓ Rolled up {processed} activities'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from search import index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of workouts, activities and teams'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', action='append', dest='kinds', choices=index.KINDS,
+            help='Only reindex this document type (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of documents tokenized per batch'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding search index...')
+        indexed = index.rebuild(
+            kinds=options['kinds'] or index.KINDS,
+            batch_size=options['batch_size'],
+        )
+        for kind, count in indexed.items():
+            self.stdout.write(self.style.SUCCESS(f'✓ Indexed {count} {kind} documents'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from users import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute UserProfile activity counters from the activity history and fix drifted ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only reconcile the profile of this user id (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of profiles recomputed per batch'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report drifted profiles without updating them'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Reconciling profile counters...')
+        checked, fixed = counters.reconcile(
+            user_ids=options['user_ids'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+        )
+        verb = 'would fix' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'✓ Checked {checked} profiles, {verb} {fixed}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from workouts import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed workout recommendations of every user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only refresh the recommendations of this user id (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of users scored per vectorized batch'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Refreshing workout recommendations...')
+        refreshed = recommendations.refresh(
+            user_ids=options['user_ids'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✓ Refreshed recommendations of {refreshed} users'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from octofit_tracker import indexes
+
+
+class Command(BaseCommand):
+    help = 'Check that every index the models declare exists in the database, optionally creating missing ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--app', action='append', dest='app_labels', choices=indexes.PROJECT_APPS,
+            help='Only check the models of this app (can be repeated)'
+        )
+        parser.add_argument(
+            '--create', action='store_true',
+            help='Create the missing indexes instead of failing'
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database alias to check'
+        )
+
+    def handle(self, *args, **options):
+        models = indexes.project_models(options['app_labels'] or indexes.PROJECT_APPS)
+        planned = indexes.planned_indexes(models, using=options['database'])
+        missing = indexes.missing_indexes(models, using=options['database'])
+        self.stdout.write(f'Checked {len(planned)} indexes on {len(models)} models')
+        for index in missing:
+            self.stdout.write(f'  missing {index}')
+        if not missing:
+            self.stdout.write(self.style.SUCCESS('✓ All indexes exist'))
+            return
+        if not options['create']:
+            raise CommandError(f'{len(missing)} indexes are missing; run with --create to add them')
+        indexes.create_indexes(missing, using=options['database'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {len(missing)} indexes'))
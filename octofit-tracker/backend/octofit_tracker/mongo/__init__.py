@@ -0,0 +1,5 @@
+"""
+djongo with one long-lived MongoDB client per process.
+
+Use ``'ENGINE': 'octofit_tracker.mongo'`` with the same settings as djongo.
+"""
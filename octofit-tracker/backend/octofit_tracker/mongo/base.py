@@ -0,0 +1,71 @@
+"""
+djongo DatabaseWrapper that keeps the MongoDB client open.
+
+Django opens a database connection per thread and, unless CONN_MAX_AGE
+says otherwise, closes it at the end of every request. djongo shares one
+MongoClient per database name across all threads, so each of those
+closes tore down the connection pool under every other thread and the
+next request opened it again, listing the collections anew. Here clients
+are shared per distinct set of CLIENT options (so an alias with another
+read preference gets its own pool) together with djongo's collection
+cache, closing a Django connection only drops the thread's reference,
+and every client reports pool events to the PoolMonitor.
+
+djongo cannot translate partial indexes (CREATE INDEX ... WHERE), so
+they are declared unsupported and Django skips them on MongoDB. Nor can
+it skip conflicting rows of a bulk insert (INSERT ... ON CONFLICT DO
+NOTHING): the insert fails on the unique index instead, so
+ignore_conflicts is declared unsupported too.
+"""
+import threading
+from collections import OrderedDict
+
+from djongo import base, features
+from pymongo import MongoClient
+
+from octofit_tracker.instrumentation import pool_monitor
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def shared_client(options):
+    """
+    (MongoClient, {(database name, enforce_schema): djongo state}) shared
+    by the process for a set of CLIENT options
+    """
+    key = repr(sorted(options.items()))
+    with _lock:
+        if key not in _clients:
+            # connect=False defers connecting to the first query, after any fork
+            _clients[key] = (MongoClient(
+                **options, document_class=OrderedDict, connect=False,
+                event_listeners=[pool_monitor],
+            ), {})
+        return _clients[key]
+
+
+class DatabaseFeatures(features.DatabaseFeatures):
+    supports_partial_indexes = False
+    supports_ignore_conflicts = False
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    features_class = DatabaseFeatures
+
+    def get_new_connection(self, connection_params):
+        name = connection_params.pop('name')
+        enforce_schema = connection_params.pop('enforce_schema')
+        self.client_connection, djongo_clients = shared_client(connection_params)
+        database = self.client_connection[name]
+        with _lock:
+            self.djongo_connection = djongo_clients.get((name, enforce_schema))
+            if self.djongo_connection is None:
+                self.djongo_connection = djongo_clients[(name, enforce_schema)] = base.DjongoClient(
+                    database, enforce_schema
+                )
+        return database
+
+    def _close(self):
+        # The client and its pool belong to the whole process
+        self.client_connection = None
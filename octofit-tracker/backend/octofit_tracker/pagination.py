@@ -0,0 +1,203 @@
+"""
+Keyset (seek) pagination for deep feeds.
+
+PageNumberPagination runs a COUNT and an OFFSET scan on every request,
+so deep pages get linearly slower. KeysetPagination instead remembers
+the sort key of the last row it returned in an opaque cursor and asks
+for rows strictly after it, which an index on the ordering fields
+answers in constant time regardless of depth. Rows computed in Python
+(a sorted list) are paged the same way with paginate_rows().
+"""
+import bisect
+import datetime
+import decimal
+import hashlib
+import json
+import uuid
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate on a fixed ordering whose last field is unique (usually id).
+
+    Requests carrying ``page`` or ``ordering`` fall back to page-number
+    pagination so existing clients keep working. ``include_total=true``
+    adds a ``count`` that is cached for ``total_cache_timeout`` seconds,
+    so it may lag behind recent writes.
+    """
+    ordering = ()
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    total_query_param = 'include_total'
+    total_cache_timeout = 60
+    fallback_params = ('page', 'ordering')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_fallback(request):
+            return self.fallback.paginate_queryset(queryset, request, view)
+        if self.wants_total(request):
+            self.total = self.approximate_count(queryset)
+        return self.page_rows(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Variant for async views; the page itself is fetched with async iteration"""
+        if self.use_fallback(request):
+            return await sync_to_async(self.fallback.paginate_queryset)(queryset, request, view)
+        if self.wants_total(request):
+            self.total = await sync_to_async(self.approximate_count)(queryset)
+        return self.page_rows([row async for row in self.page_queryset(queryset, request)])
+
+    def paginate_rows(self, rows, request, view=None):
+        """Variant for a list already sorted on an all-ascending ordering"""
+        if self.use_fallback(request):
+            return self.fallback.paginate_queryset(rows, request, view)
+        if self.wants_total(request):
+            self.total = len(rows)
+        self.page_size = self.get_page_size(request)
+        self.cursor_values, self.reverse = self.decode_cursor(request)
+        if self.cursor_values is None:
+            return self.page_rows(rows[:self.page_size + 1])
+        keys = [self.key(row) for row in rows]
+        if self.reverse:
+            # Rows before the cursor, nearest first, as page_queryset returns them
+            stop = bisect.bisect_left(keys, self.cursor_values)
+            return self.page_rows(rows[max(0, stop - self.page_size - 1):stop][::-1])
+        start = bisect.bisect_right(keys, self.cursor_values)
+        return self.page_rows(rows[start:start + self.page_size + 1])
+
+    def use_fallback(self, request):
+        self.request = request
+        self.fallback = None
+        self.total = None
+        if any(param in request.query_params for param in self.fallback_params):
+            self.fallback = PageNumberPagination()
+        return self.fallback is not None
+
+    def wants_total(self, request):
+        return request.query_params.get(self.total_query_param) in ('1', 'true', 'True')
+
+    def page_queryset(self, queryset, request):
+        """The rows of the requested page plus one, to tell whether more follow"""
+        self.page_size = self.get_page_size(request)
+        self.cursor_values, self.reverse = self.decode_cursor(request)
+        ordering = self.reversed_ordering() if self.reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if self.cursor_values is not None:
+            queryset = queryset.filter(self.after(ordering, self.cursor_values))
+        return queryset[:self.page_size + 1]
+
+    def page_rows(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, self.cursor_values is not None
+
+        self.next_values = self.key(rows[-1]) if rows and has_next else None
+        self.previous_values = self.key(rows[0]) if rows and has_previous else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data)
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        if self.fallback is not None:
+            return self.fallback.get_paginated_response(data).data
+        payload = {
+            'next': self.get_link(self.next_values, reverse=False),
+            'previous': self.get_link(self.previous_values, reverse=True),
+            'results': data,
+        }
+        if self.total is not None:
+            payload = {'count': self.total, **payload}
+        return payload
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def reversed_ordering(self):
+        return tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+
+    def key(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field.lstrip('-')] for field in self.ordering]
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def after(self, ordering, values):
+        """
+        Rows strictly after values in the given ordering, i.e.
+        (a > x) OR (a = x AND b > y) ... with < for descending fields.
+        """
+        clauses = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {f.lstrip('-'): v for f, v in zip(ordering[:i], values[:i])}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+        return reduce(lambda a, b: a | b, clauses)
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({'k': values, 'r': int(reverse)}, default=_encode_value)
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(urlsafe_b64decode(padded.encode()))
+            values, reverse = payload['k'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def get_link(self, values, reverse):
+        if values is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.total_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def approximate_count(self, queryset):
+        query_hash = hashlib.md5(str(queryset.query).encode()).hexdigest()
+        return cache.get_or_set(
+            f'keyset-total:{query_hash}', queryset.count, self.total_cache_timeout
+        )
+
+
+def _encode_value(value):
+    # Full precision: DjangoJSONEncoder drops microseconds, which would make
+    # cursors skip or repeat rows that differ only below the millisecond
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
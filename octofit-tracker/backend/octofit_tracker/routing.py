@@ -0,0 +1,177 @@
+"""
+Read/write splitting.
+
+ReadReplicaRouter sends the reads of safe requests (GET, HEAD, OPTIONS)
+to settings.READ_DATABASE, an alias of the same MongoDB deployment whose
+read preference lets secondaries serve them. Writes, reads made while
+handling other requests and reads outside requests (management
+commands, workers) stay on 'default'. Where READ_DATABASE is not
+configured everything uses 'default'.
+
+Secondaries may lag the primary, so a user who wrote an activity or a
+team membership reads from the primary for READ_YOUR_WRITES_SECONDS
+afterwards. The marker lives in the response cache, so every worker
+sees it when that cache is shared.
+"""
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models.signals import post_delete, post_save
+from django.utils.functional import SimpleLazyObject, empty
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import response_cache
+
+READ_YOUR_WRITES_SECONDS = getattr(settings, 'READ_YOUR_WRITES_SECONDS', 5)
+
+# Apps whose rows must be readable right after they are written, e.g. a
+# session created at login
+PRIMARY_APPS = frozenset(('sessions', 'admin'))
+
+
+def read_database():
+    """The replica alias, or None when reads are not split"""
+    alias = getattr(settings, 'READ_DATABASE', None)
+    if alias and alias != DEFAULT_DB_ALIAS and alias in connections.databases:
+        return alias
+    return None
+
+
+def _sticky_key(user_id):
+    return f'read-your-writes:{user_id}'
+
+
+def stick(user_id):
+    """Keep a user's reads on the primary for READ_YOUR_WRITES_SECONDS"""
+    if user_id is not None and read_database() is not None:
+        response_cache().set(_sticky_key(user_id), True, READ_YOUR_WRITES_SECONDS)
+
+
+def is_sticky(user_id):
+    return response_cache().get(_sticky_key(user_id), False)
+
+
+def stick_on_change(model, user_getter=lambda instance: instance.user_id):
+    """Connect save/delete signals of model to stick(user_getter(instance))"""
+    def receiver(sender, instance, **kwargs):
+        stick(user_getter(instance))
+
+    dispatch_uid = f'read-your-writes:{model._meta.label}'
+    post_save.connect(receiver, sender=model, weak=False, dispatch_uid=dispatch_uid)
+    post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=dispatch_uid)
+
+
+class _RequestState:
+    """Routing state of the request being handled"""
+
+    def __init__(self, request):
+        self.request = request
+        self.replica_allowed = request.method in SAFE_METHODS
+        self.user_id = None
+        self.sticky = False
+
+    def user_is_sticky(self):
+        user_id = _authenticated_user_id(self.request)
+        if user_id is None:
+            return False
+        if user_id != self.user_id:
+            # One cache lookup per request, once the user is known
+            self.user_id, self.sticky = user_id, is_sticky(user_id)
+        return self.sticky
+
+
+_state = ContextVar('read_routing_state', default=None)
+
+
+def _authenticated_user_id(request):
+    """
+    Id of the request's user if authentication has already run. Never
+    triggers it: that would query the database from inside the router.
+    """
+    user = request.__dict__.get('user')
+    if isinstance(user, SimpleLazyObject):
+        user = user.__dict__['_wrapped']
+        if user is empty:
+            return None
+    if user is None or not user.is_authenticated:
+        return None
+    return user.pk
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary for the rest of the block"""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    allowed = state.replica_allowed
+    state.replica_allowed = False
+    try:
+        yield
+    finally:
+        state.replica_allowed = allowed
+
+
+class ReadReplicaRouter:
+    """Database router splitting reads from writes (see module docstring)"""
+
+    def db_for_read(self, model, **hints):
+        replica = read_database()
+        state = _state.get()
+        if replica is None or state is None:
+            return None
+        if (not state.replica_allowed or model._meta.app_label in PRIMARY_APPS
+                or state.user_is_sticky()):
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Later reads of this request should see the write
+            state.replica_allowed = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        aliases = {DEFAULT_DB_ALIAS, read_database()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == getattr(settings, 'READ_DATABASE', None):
+            return False
+        return None
+
+
+class ReadRoutingMiddleware:
+    """Make the current request visible to ReadReplicaRouter"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = _state.set(_RequestState(request))
+        try:
+            return self.get_response(request)
+        finally:
+            _state.reset(token)
+
+    async def __acall__(self, request):
+        token = _state.set(_RequestState(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            _state.reset(token)
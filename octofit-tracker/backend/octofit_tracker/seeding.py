@@ -0,0 +1,319 @@
+"""
+Large synthetic datasets for load testing (populate_db --scale).
+
+Everything is inserted with bulk_create in batches. Activities are
+generated per user shard, optionally in parallel worker processes, from
+a random.Random seeded with (seed, shard) so the same options always
+produce the same data. Leaderboard totals are accumulated while the
+activities are generated, so no second pass over the activity table is
+needed to rank teams. The data derived from activities (rollups, profile
+counters, workout recommendations, the search index) is then built in
+batches, so a seeded database serves every endpoint like a populated one.
+"""
+import multiprocessing
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections
+from django.utils import timezone
+
+from activities import rollups
+from activities.models import Activity
+from search import index as search_index
+from teams import ranking
+from teams.leaderboard import ActivityDelta, activity_points
+from teams.models import Team, TeamMembership, Leaderboard, LeaderboardEntry
+from users import counters
+from users.models import UserProfile
+from workouts import recommendations
+from workouts.models import Workout
+
+ACTIVITY_TYPES = ['running', 'cycling', 'swimming', 'walking', 'gym', 'yoga', 'sports', 'hiking']
+INTENSITIES = ['low', 'moderate', 'high']
+LOCATIONS = ['Park', 'Gym', 'Home', 'Beach', 'Trail']
+FITNESS_LEVELS = ['beginner', 'intermediate', 'advanced']
+GENDERS = ['M', 'F', 'O']
+
+SAMPLE_WORKOUTS = [
+    {
+        'title': 'Morning Run',
+        'description': 'A refreshing morning run to start the day',
+        'category': 'cardio',
+        'difficulty': 'beginner',
+        'estimated_duration_minutes': 30,
+        'estimated_calories': 300,
+        'instructions': 'Warm up for 5 minutes, then run at a steady pace for 25 minutes.',
+        'equipment_needed': 'Running shoes',
+    },
+    {
+        'title': 'Strength Training Session',
+        'description': 'Full body strength workout',
+        'category': 'strength',
+        'difficulty': 'intermediate',
+        'estimated_duration_minutes': 60,
+        'estimated_calories': 400,
+        'instructions': 'Perform 3 sets of various exercises targeting all major muscle groups.',
+        'equipment_needed': 'Dumbbells, Barbell, Bench',
+    },
+    {
+        'title': 'Yoga Flow',
+        'description': 'Relaxing yoga session for flexibility',
+        'category': 'flexibility',
+        'difficulty': 'beginner',
+        'estimated_duration_minutes': 45,
+        'estimated_calories': 150,
+        'instructions': 'Follow a guided yoga sequence focusing on flexibility and mindfulness.',
+        'equipment_needed': 'Yoga Mat',
+    },
+    {
+        'title': 'HIIT Workout',
+        'description': 'High Intensity Interval Training',
+        'category': 'hiit',
+        'difficulty': 'advanced',
+        'estimated_duration_minutes': 30,
+        'estimated_calories': 500,
+        'instructions': 'Perform 30 seconds of high intensity exercise followed by 30 seconds rest.',
+        'equipment_needed': 'None',
+    },
+    {
+        'title': 'Cycling Adventure',
+        'description': 'Outdoor cycling session',
+        'category': 'cardio',
+        'difficulty': 'intermediate',
+        'estimated_duration_minutes': 90,
+        'estimated_calories': 600,
+        'instructions': 'Ride on varying terrain at a comfortable pace.',
+        'equipment_needed': 'Bicycle',
+    },
+    {
+        'title': 'Swimming Session',
+        'description': 'Pool workout combining different strokes',
+        'category': 'cardio',
+        'difficulty': 'intermediate',
+        'estimated_duration_minutes': 45,
+        'estimated_calories': 350,
+        'instructions': 'Practice different swimming strokes for full body conditioning.',
+        'equipment_needed': 'Swimming Pool, Swimsuit',
+    },
+]
+
+
+def create_workouts():
+    """Create the sample workout templates, returning them"""
+    return [
+        Workout.objects.get_or_create(title=workout_data['title'], defaults=workout_data)[0]
+        for workout_data in SAMPLE_WORKOUTS
+    ]
+
+
+def _seed_activity_shard(task):
+    """
+    Generate and insert the activities of one user shard.
+    Runs in a worker process; returns (rows inserted, {user_id: ActivityDelta}).
+    """
+    shard, user_counts, seed, batch_size, anchor, days = task
+    rng = random.Random(f'{seed}:activities:{shard}')
+    totals = {}
+    batch = []
+    inserted = 0
+    for user_id, count in user_counts:
+        total = ActivityDelta()
+        for i in range(count):
+            duration = rng.randint(15, 120)
+            calories = rng.randint(100, 800)
+            batch.append(Activity(
+                user_id=user_id,
+                activity_type=rng.choice(ACTIVITY_TYPES),
+                title=f'Session {i + 1}',
+                duration_minutes=duration,
+                calories_burned=calories,
+                distance_km=round(rng.uniform(1, 20), 2),
+                intensity=rng.choice(INTENSITIES),
+                location=rng.choice(LOCATIONS),
+                activity_date=anchor - timedelta(minutes=rng.randint(0, days * 24 * 60)),
+            ))
+            total += ActivityDelta(1, duration, calories, activity_points(duration, calories))
+            if len(batch) >= batch_size:
+                Activity.objects.bulk_create(batch)
+                inserted += len(batch)
+                batch = []
+        totals[user_id] = total
+    if batch:
+        Activity.objects.bulk_create(batch)
+        inserted += len(batch)
+    connections.close_all()
+    return inserted, totals
+
+
+class ScaleSeeder:
+    """
+    Seed users, teams, memberships, activities and leaderboards at scale,
+    then the workout templates and everything derived from the activities
+    """
+
+    def __init__(self, activities, users=None, teams=None, batch_size=5000,
+                 workers=1, seed=0, days=365, anchor=None, log=print):
+        self.activities = activities
+        self.users = users or max(1, activities // 200)
+        self.teams = teams or max(1, self.users // 25)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.seed = seed
+        self.days = days
+        self.anchor = anchor or timezone.make_aware(
+            datetime.combine(timezone.localdate(), datetime.min.time())
+        )
+        self.log = log
+        self.rng = random.Random(f'{seed}:base')
+        self._rows = 0
+
+    def run(self):
+        user_ids = self._timed('users', self.seed_users)
+        self._timed('user profiles', lambda: self.seed_profiles(user_ids))
+        team_members = self._timed('team memberships', lambda: self.seed_teams(user_ids))
+        totals = self._timed('activities', lambda: self.seed_activities(user_ids))
+        self._timed('leaderboard entries', lambda: self.seed_leaderboards(team_members, totals))
+        self._timed('ranking scores', lambda: self.seed_rankings(team_members, totals))
+        self._timed('workout templates', self.seed_workouts)
+        self._timed('activities rolled up', self.build_rollups)
+        self._timed('profile counters', self.build_counters)
+        self._timed('users with workout recommendations', self.build_recommendations)
+        self._timed('documents indexed for search', self.build_search_index)
+
+    def _timed(self, label, step):
+        start = time.perf_counter()
+        result = step()
+        elapsed = time.perf_counter() - start
+        rows = self._rows
+        self.log(f'{rows} {label} in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/sec)')
+        return result
+
+    def _bulk(self, model, objects):
+        for start in range(0, len(objects), self.batch_size):
+            model.objects.bulk_create(objects[start:start + self.batch_size])
+        self._rows = len(objects)
+
+    def seed_users(self):
+        # Hashing is deliberately slow, so every synthetic user shares one hash
+        password = make_password('testpass123')
+        self._bulk(User, [
+            User(username=f'athlete{i:07d}', email=f'athlete{i:07d}@example.com',
+                 first_name='Athlete', last_name=f'{i:07d}', password=password)
+            for i in range(self.users)
+        ])
+        return list(
+            User.objects.filter(username__startswith='athlete')
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def seed_profiles(self, user_ids):
+        rng = self.rng
+        self._bulk(UserProfile, [
+            UserProfile(
+                user_id=user_id,
+                gender=rng.choice(GENDERS),
+                age=rng.randint(18, 65),
+                height_cm=rng.randint(150, 200),
+                weight_kg=rng.randint(50, 100),
+                fitness_level=rng.choice(FITNESS_LEVELS),
+            )
+            for user_id in user_ids
+        ])
+
+    def seed_teams(self, user_ids):
+        """Split users round-robin into teams; the first member owns the team"""
+        team_members = [user_ids[i::self.teams] for i in range(self.teams)]
+        team_members = [members for members in team_members if members]
+        self._bulk(Team, [
+            Team(name=f'Team {i:05d}', owner_id=members[0], description='Synthetic team')
+            for i, members in enumerate(team_members)
+        ])
+        team_ids = list(
+            Team.objects.filter(name__startswith='Team ').order_by('id').values_list('id', flat=True)
+        )
+        memberships = [
+            TeamMembership(team_id=team_id, user_id=user_id,
+                           role='owner' if user_id == members[0] else 'member')
+            for team_id, members in zip(team_ids, team_members)
+            for user_id in members
+        ]
+        self._bulk(TeamMembership, memberships)
+        return list(zip(team_ids, team_members))
+
+    def seed_activities(self, user_ids):
+        per_user, remainder = divmod(self.activities, len(user_ids))
+        counts = [(user_id, per_user + (1 if i < remainder else 0)) for i, user_id in enumerate(user_ids)]
+        shard_count = max(self.workers * 4, 1)
+        tasks = [
+            (shard, counts[shard::shard_count], self.seed, self.batch_size, self.anchor, self.days)
+            for shard in range(shard_count)
+        ]
+
+        totals = {}
+        inserted = 0
+        if self.workers > 1:
+            # Worker processes must not share the parent's database connections
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(self.workers) as pool:
+                results = pool.imap_unordered(_seed_activity_shard, tasks)
+                for shard_inserted, shard_totals in results:
+                    inserted += shard_inserted
+                    totals.update(shard_totals)
+        else:
+            for task in tasks:
+                shard_inserted, shard_totals = _seed_activity_shard(task)
+                inserted += shard_inserted
+                totals.update(shard_totals)
+        self._rows = inserted
+        return totals
+
+    def seed_leaderboards(self, team_members, totals):
+        self._bulk(Leaderboard, [Leaderboard(team_id=team_id) for team_id, _ in team_members])
+        leaderboard_ids = dict(
+            Leaderboard.objects.filter(team_id__in=[team_id for team_id, _ in team_members])
+            .values_list('team_id', 'id')
+        )
+        entries = []
+        for team_id, members in team_members:
+            standings = sorted(members, key=lambda user_id: -totals.get(user_id, ActivityDelta()).points)
+            for rank, user_id in enumerate(standings, 1):
+                total = totals.get(user_id, ActivityDelta())
+                entries.append(LeaderboardEntry(
+                    leaderboard_id=leaderboard_ids[team_id],
+                    user_id=user_id,
+                    rank=rank,
+                    points=total.points,
+                    activities_count=total.activities_count,
+                    total_duration_minutes=total.duration_minutes,
+                    total_calories_burned=total.calories_burned,
+                ))
+        self._bulk(LeaderboardEntry, entries)
+
+    def seed_rankings(self, team_members, totals):
+        user_points = {user_id: total.points for user_id, total in totals.items()}
+        team_points = {
+            team_id: sum(user_points.get(user_id, 0) for user_id in members)
+            for team_id, members in team_members
+        }
+        ranking.replace('user', user_points, batch_size=self.batch_size)
+        ranking.replace('team', team_points, batch_size=self.batch_size)
+        self._rows = len(user_points) + len(team_points)
+
+    def seed_workouts(self):
+        self._rows = len(create_workouts())
+
+    def build_rollups(self):
+        self._rows = rollups.rebuild(chunk_size=self.batch_size)
+
+    def build_counters(self):
+        checked, _ = counters.reconcile(batch_size=self.batch_size)
+        self._rows = checked
+
+    def build_recommendations(self):
+        self._rows = recommendations.refresh(batch_size=self.batch_size)
+
+    def build_search_index(self):
+        self._rows = sum(search_index.rebuild(batch_size=self.batch_size).values())
@@ -0,0 +1,57 @@
+"""
+Client-selected response fields.
+
+``?fields=id,name`` trims a response to the listed fields and
+``?expand=members`` adds the fields a serializer lists in
+``Meta.expandable_fields``, which are left out by default because they
+are expensive to load or render (large nested collections). Only the
+top-level serializer of a response is affected; nested serializers keep
+all of their fields.
+"""
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def query_list(request, name):
+    """Comma-separated values of a query parameter as a set, or None when absent"""
+    if request is None or name not in request.query_params:
+        return None
+    return {
+        value.strip()
+        for param in request.query_params.getlist(name)
+        for value in param.split(',') if value.strip()
+    }
+
+
+def expanded(request, name):
+    """Whether the request asks for an expandable field"""
+    return name in (query_list(request, 'expand') or ())
+
+
+class DynamicFieldsMixin:
+    """Honour ``?fields=`` and ``?expand=`` on a ModelSerializer"""
+
+    def _is_response_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_response_root():
+            return fields
+        request = self.context.get('request')
+        expand = query_list(request, 'expand') or set()
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                fields.pop(name, None)
+
+        selected = query_list(request, 'fields')
+        # Writes validate against every field whatever the client wants back
+        if selected and request.method in SAFE_METHODS:
+            selected |= expand
+            for name in list(fields):
+                if name not in selected:
+                    fields.pop(name)
+        return fields
@@ -5,6 +5,8 @@ Django settings for octofit_tracker project.
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,19 +46,23 @@ INSTALLED_APPS = [
     'dj_rest_auth',
     
     # Local apps
+    'octofit_tracker',
     'users.apps.UsersConfig',
     'activities.apps.ActivitiesConfig',
     'teams.apps.TeamsConfig',
     'workouts.apps.WorkoutsConfig',
+    'search.apps.SearchConfig',
 ]
 
 MIDDLEWARE = [
+    'octofit_tracker.instrumentation.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'octofit_tracker.routing.ReadRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,18 +89,137 @@ WSGI_APPLICATION = 'octofit_tracker.wsgi.application'
 
 
 # Database
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'djongo',
-        'NAME': 'octofit_db',
-        'ENFORCE_SCHEMA': False,
-        'CLIENT': {
-            'host': 'localhost',
-            'port': 27017,
+# DATABASE_ENGINE selects the backend: 'mongo' (default), 'postgresql'
+# or 'sqlite'. The relational backends use Django's own SQL, real
+# migrations and every Meta.indexes entry, including partial indexes;
+# PostgreSQL needs the psycopg2 (or psycopg2-binary) package. Code with a
+# native MongoDB path (analytics, bulk writes) falls back to the ORM
+# everywhere else.
+
+DATABASE_ENGINE = os.getenv('DATABASE_ENGINE', 'mongo')
+
+# With a replica configured (MONGODB_READ_PREFERENCE, e.g.
+# secondaryPreferred on a replica set, or POSTGRES_REPLICA_HOST), reads of
+# GET requests go through the READ_DATABASE alias (see
+# octofit_tracker/routing.py). Users read from the primary for
+# READ_YOUR_WRITES_SECONDS after writing an activity or team membership.
+READ_DATABASE = 'reads'
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+DATABASE_ROUTERS = ['octofit_tracker.routing.ReadReplicaRouter']
+
+if DATABASE_ENGINE == 'mongo':
+    # octofit_tracker.mongo is djongo with one MongoClient per process (see
+    # octofit_tracker/mongo/base.py). Each worker process has its own pool
+    # of up to MONGODB_MAX_POOL_SIZE connections per server, shared by its
+    # threads; size it to the worker's thread count. Connections idle for
+    # MONGODB_MAX_IDLE_TIME_MS are closed, and a request that waits longer
+    # than MONGODB_WAIT_QUEUE_TIMEOUT_MS for a free one fails instead of
+    # piling up. zstd and snappy compression need the zstandard or
+    # python-snappy package.
+    MONGODB_CLIENT = {
+        'host': os.getenv('MONGODB_HOST', 'localhost'),
+        'port': int(os.getenv('MONGODB_PORT', '27017')),
+        'maxPoolSize': int(os.getenv('MONGODB_MAX_POOL_SIZE', '20')),
+        'minPoolSize': int(os.getenv('MONGODB_MIN_POOL_SIZE', '0')),
+        'maxIdleTimeMS': int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', '300000')),
+        'waitQueueTimeoutMS': int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '5000')),
+        'connectTimeoutMS': int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', '5000')),
+        'serverSelectionTimeoutMS': int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '10000')),
+    }
+    if os.getenv('MONGODB_COMPRESSORS', 'zlib'):
+        MONGODB_CLIENT['compressors'] = os.getenv('MONGODB_COMPRESSORS', 'zlib')
+
+    DATABASES = {
+        'default': {
+            'ENGINE': 'octofit_tracker.mongo',
+            'NAME': 'octofit_db',
+            'ENFORCE_SCHEMA': False,
+            'CLIENT': MONGODB_CLIENT,
+        },
+    }
+    MONGODB_READ_PREFERENCE = os.getenv('MONGODB_READ_PREFERENCE', '')
+    if MONGODB_READ_PREFERENCE:
+        DATABASES[READ_DATABASE] = {
+            **DATABASES['default'],
+            'CLIENT': {**MONGODB_CLIENT, 'readPreference': MONGODB_READ_PREFERENCE},
+            'TEST': {'MIRROR': 'default'},
         }
+elif DATABASE_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'octofit_db'),
+            'USER': os.getenv('POSTGRES_USER', 'octofit'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            # Keep connections across requests instead of reconnecting each time
+            'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+        },
     }
+    if os.getenv('POSTGRES_REPLICA_HOST'):
+        DATABASES[READ_DATABASE] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('POSTGRES_REPLICA_HOST'),
+            'TEST': {'MIRROR': 'default'},
+        }
+elif DATABASE_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+        },
+    }
+else:
+    raise ImproperlyConfigured(
+        f"DATABASE_ENGINE must be 'mongo', 'postgresql' or 'sqlite', not {DATABASE_ENGINE!r}"
+    )
+
+
+# Request instrumentation (see octofit_tracker/instrumentation.py)
+
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'True') == 'True'
+REQUEST_METRICS_MAX_SAMPLES = 1000
+
+
+# Bulk activity ingestion (POST /api/activities/bulk/)
+
+ACTIVITY_BULK_CHUNK_SIZE = 500
+ACTIVITY_BULK_MAX_ITEMS = 5000
+
+
+# Cache
+# The 'responses' alias backs the read-through response cache in
+# octofit_tracker/cache.py. Point RESPONSE_CACHE_BACKEND at
+# django.core.cache.backends.memcached.PyMemcacheCache or
+# django.core.cache.backends.redis.RedisCache to share it between workers.
+
+RESPONSE_CACHE_BACKEND = os.getenv(
+    'RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': RESPONSE_CACHE_BACKEND,
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION', 'octofit-responses'),
+        'TIMEOUT': 300,
+    },
 }
+if RESPONSE_CACHE_BACKEND.endswith('LocMemCache'):
+    # LocMemCache evicts the least recently used entries once full
+    CACHES['responses']['OPTIONS'] = {'MAX_ENTRIES': 5000}
+
+
+# Leaderboard push over Server-Sent Events (see teams/live.py). Changes are
+# coalesced into at most one message per interval; a comment line is sent
+# after HEARTBEAT seconds of silence to keep proxies from closing the stream.
+
+LEADERBOARD_PUSH_INTERVAL = 1.0
+LEADERBOARD_PUSH_HEARTBEAT = 15.0
 
 
 # Password validation
@@ -0,0 +1,539 @@
+import socketserver
+import struct
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock
+
+import bson
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Sum
+from django.db.utils import ConnectionHandler
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from rest_framework.test import APIClient
+from activities.models import Activity, ActivityRollup
+from search.models import SearchPosting
+from teams.leaderboard import rebuild_leaderboard
+from teams.models import Team, TeamMembership, Leaderboard, LeaderboardEntry
+from users.models import UserProfile
+from workouts.models import Workout, WorkoutPlan, WorkoutRecommendation
+from . import indexes
+from .benchmark import (
+    BenchmarkRunner, compare, default_scenarios, prepare_context, translation_overhead, translation_queries,
+)
+from .instrumentation import MetricsCollector, PoolMonitor, collector, pool_monitor
+from .mongo.base import DatabaseWrapper, shared_client
+from .routing import ReadReplicaRouter, ReadRoutingMiddleware, read_database, use_primary
+from .seeding import ScaleSeeder
+
+
+class MetricsCollectorTestCase(TestCase):
+    """Test cases for the per-thread metrics collector"""
+    
+    def test_report_percentiles(self):
+        """Test that samples are aggregated into nearest-rank percentiles"""
+        metrics = MetricsCollector(max_samples=100)
+        for i in range(1, 101):
+            metrics.record('ActivityViewSet.list', (i, i / 10, 0.5, i))
+        report = metrics.report()['ActivityViewSet.list']
+        self.assertEqual(report['count'], 100)
+        self.assertEqual(report['queries'], {'p50': 50, 'p95': 95, 'p99': 99})
+        self.assertEqual(report['total_ms']['p99'], 99)
+    
+    def test_buffers_are_bounded(self):
+        """Test that only the most recent samples are kept"""
+        metrics = MetricsCollector(max_samples=10)
+        for i in range(25):
+            metrics.record('TeamViewSet.list', (i, 0, 0, 0))
+        self.assertEqual(metrics.report()['TeamViewSet.list']['count'], 10)
+
+
+class RequestTimingMiddlewareTestCase(TestCase):
+    """Test cases for request timing instrumentation"""
+    
+    def setUp(self):
+        """Set up an admin user and API client"""
+        self.admin = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        collector.reset()
+    
+    def test_server_timing_header(self):
+        """Test that responses carry a Server-Timing header"""
+        response = self.client.get('/api/activities/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+    
+    def test_metrics_report_by_action(self):
+        """Test that samples are grouped by viewset action"""
+        self.client.get('/api/activities/')
+        self.client.get('/api/teams/teams/')
+        report = self.client.get('/api/metrics/').data
+        self.assertEqual(report['ActivityViewSet.list']['count'], 1)
+        self.assertIn('TeamViewSet.list', report)
+        self.assertGreater(report['ActivityViewSet.list']['queries']['p50'], 0)
+    
+    async def test_async_views_are_measured(self):
+        """Test that queries of async views are counted under ASGI"""
+        await sync_to_async(self.client.force_login)(self.admin)
+        self.async_client.cookies = self.client.cookies
+        response = await self.async_client.get('/api/async/activities/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        report = collector.report()['async-my-activities']
+        self.assertGreater(report['queries']['p50'], 0)
+    
+    def test_metrics_report_is_admin_only(self):
+        """Test that regular users cannot read the report"""
+        user = User.objects.create_user(username='user', password='testpass123')
+        self.client.force_authenticate(user)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 403)
+
+
+class ScaleSeederTestCase(TestCase):
+    """Test cases for the populate_db --scale bulk seeder"""
+    
+    anchor = timezone.now()
+    
+    def seed(self):
+        seeder = ScaleSeeder(activities=200, users=20, teams=4, batch_size=50, seed=7,
+                             anchor=self.anchor, log=lambda message: None)
+        seeder.run()
+        return seeder
+    
+    def test_row_counts(self):
+        """Test that every table is seeded with the requested volume"""
+        self.seed()
+        self.assertEqual(Activity.objects.count(), 200)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(UserProfile.objects.count(), 20)
+        self.assertEqual(Team.objects.count(), 4)
+        self.assertEqual(TeamMembership.objects.count(), 20)
+        self.assertEqual(LeaderboardEntry.objects.count(), 20)
+    
+    def test_derived_data(self):
+        """Test that the data populate_db derives from activities is built too"""
+        self.seed()
+        self.assertEqual(Workout.objects.count(), 6)
+        self.assertEqual(
+            ActivityRollup.objects.filter(period='day').aggregate(total=Sum('activities_count'))['total'], 200
+        )
+        self.assertEqual(UserProfile.objects.filter(total_activities=10).count(), 20)
+        self.assertEqual(WorkoutRecommendation.objects.count(), 20)
+        self.assertEqual(
+            SearchPosting.objects.filter(kind='activity').values('object_id').distinct().count(), 200
+        )
+    
+    def test_leaderboards_match_rebuild(self):
+        """Test that seeded standings equal a rebuild from the activities"""
+        self.seed()
+        for board in Leaderboard.objects.all():
+            seeded = list(board.entries.order_by('rank').values_list('user_id', 'points'))
+            rebuild_leaderboard(board)
+            self.assertEqual(seeded, list(board.entries.order_by('rank').values_list('user_id', 'points')))
+    
+    def test_deterministic(self):
+        """Test that the same seed produces the same activities"""
+        runs = []
+        for _ in range(2):
+            # Roll each run back so both seed an empty database
+            sid = transaction.savepoint()
+            self.seed()
+            runs.append(list(Activity.objects.order_by('id').values_list(
+                'duration_minutes', 'activity_type', 'activity_date'
+            )))
+            transaction.savepoint_rollback(sid)
+        self.assertEqual(runs[0], runs[1])
+
+
+class BenchmarkTestCase(TestCase):
+    """Test cases for the API benchmark runner"""
+    
+    def test_scenarios_run_without_errors(self):
+        """Test that every default scenario succeeds against a seeded dataset"""
+        ScaleSeeder(activities=100, users=10, teams=2, log=lambda message: None).run()
+        user = User.objects.order_by('id').first()
+        results = BenchmarkRunner(user, requests=3, warmup=1).run()
+        self.assertEqual(set(results), {scenario.name for scenario in default_scenarios()})
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertGreaterEqual(result['latency_ms']['p99'], result['latency_ms']['p50'])
+    
+    def test_seeded_scenarios_return_data(self):
+        """Test that read scenarios over derived data measure non-empty responses"""
+        # Every activity today, so windowed stats have data on any weekday
+        ScaleSeeder(activities=100, users=10, teams=2, days=0, anchor=timezone.now(), log=lambda message: None).run()
+        user = User.objects.order_by('id').first()
+        context = prepare_context(user)
+        client = APIClient()
+        client.force_authenticate(user)
+        scenarios = {scenario.name: scenario for scenario in default_scenarios()}
+        for name in ('workouts.recommendations', 'search', 'teams.my_teams'):
+            response = client.get(scenarios[name].path(context))
+            self.assertTrue(response.data['results'], name)
+        self.assertGreater(response.data['results'][0]['stats']['points'], 0)
+    
+    def test_compare_reports_regressions(self):
+        """Test that slower p95 and extra queries are reported, noise is not"""
+        def report(p95, queries):
+            return {'scenarios': {'teams.list': {
+                'throughput_rps': 100, 'latency_ms': {'p95': p95}, 'queries': {'max': queries},
+            }}}
+        self.assertEqual(compare(report(10.2, 3), report(10, 3)), [])
+        self.assertEqual(compare(report(0.3, 3), report(0.1, 3)), [])
+        self.assertEqual(len(compare(report(20, 4), report(10, 3))), 2)
+    
+    def test_translation_overhead(self):
+        """Test that djongo translation is timed offline for every hot query"""
+        results = translation_overhead(repeat=2)
+        self.assertEqual(set(results), set(translation_queries()))
+        for name, result in results.items():
+            self.assertGreater(result['compile_us'], 0, name)
+            self.assertGreater(result['translate_us'], 0, name)
+
+
+OP_REPLY, OP_QUERY, OP_MSG = 1, 2004, 2013
+
+
+class MongoStandIn(socketserver.ThreadingTCPServer):
+    """
+    Just enough of mongod's wire protocol for a driver to connect and run
+    commands: the handshake is answered, every other command succeeds
+    after `delay` seconds. Tracks the peak number of concurrent commands.
+    """
+    daemon_threads = True
+    
+    def __init__(self, delay):
+        super().__init__(('127.0.0.1', 0), MongoStandInHandler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+    
+    @property
+    def port(self):
+        return self.server_address[1]
+    
+    def hello(self):
+        return {
+            'ismaster': True, 'maxBsonObjectSize': 16 * 1024 * 1024,
+            'maxMessageSizeBytes': 48000000, 'maxWriteBatchSize': 100000,
+            'localTime': datetime.now(dt_timezone.utc), 'minWireVersion': 0, 'maxWireVersion': 8, 'ok': 1.0,
+        }
+    
+    def run(self, command):
+        if next(iter(command)).lower() in ('ismaster', 'hello'):
+            return self.hello()
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return {'ok': 1.0}
+
+
+class MongoStandInHandler(socketserver.BaseRequestHandler):
+    
+    def read(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+    
+    def handle(self):
+        while True:
+            header = self.read(16)
+            if header is None:
+                return
+            length, request_id, _, opcode = struct.unpack('<iiii', header)
+            body = self.read(length - 16)
+            if opcode == OP_QUERY:
+                # flags, collection name, skip, limit, command
+                start = body.index(b'\0', 4) + 9
+                reply_opcode, prefix = OP_REPLY, struct.pack('<iqii', 0, 0, 0, 1)
+            else:
+                # flags, section kind 0, command
+                start = 5
+                reply_opcode, prefix = OP_MSG, struct.pack('<IB', 0, 0)
+            size = struct.unpack('<i', body[start:start + 4])[0]
+            payload = prefix + bson.encode(self.server.run(bson.decode(body[start:start + size])))
+            self.request.sendall(struct.pack('<iiii', 16 + len(payload), 0, request_id, reply_opcode) + payload)
+
+
+class MongoPoolTestCase(TestCase):
+    """Stress tests of the MongoDB connection pool against a mongod stand-in"""
+    
+    def setUp(self):
+        """Start a stand-in server whose commands take 20ms"""
+        self.server = MongoStandIn(delay=0.02)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.monitor = PoolMonitor()
+    
+    def mongo_client(self, **options):
+        client = MongoClient(
+            '127.0.0.1', self.server.port, connect=False, serverSelectionTimeoutMS=2000,
+            event_listeners=[self.monitor], **options
+        )
+        self.addCleanup(client.close)
+        return client
+    
+    def hammer(self, client, threads=16, commands=5):
+        """Run commands from many threads at once; returns the errors"""
+        errors = []
+        
+        def work():
+            for _ in range(commands):
+                try:
+                    client.admin.command('ping')
+                except PyMongoError as error:
+                    errors.append(error)
+        
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return errors
+    
+    def pool(self):
+        return self.monitor.report()[f'127.0.0.1:{self.server.port}']
+    
+    def test_pool_bounds_connections(self):
+        """Test that 16 threads share maxPoolSize connections and their waits are measured"""
+        self.assertEqual(self.hammer(self.mongo_client(maxPoolSize=4)), [])
+        self.assertLessEqual(self.server.peak, 4)
+        pool = self.pool()
+        self.assertEqual(pool['checkouts'], 80)
+        self.assertLessEqual(pool['created'], 4)
+        self.assertEqual(pool['in_use'], 0)
+        self.assertEqual(pool['failed'], {})
+        # Four connections for sixteen threads: most checkouts queue behind a 20ms command
+        self.assertGreater(pool['wait_ms']['p95'], 10)
+    
+    def test_wait_queue_timeout(self):
+        """Test that checkouts give up after waitQueueTimeoutMS and are counted"""
+        errors = self.hammer(self.mongo_client(maxPoolSize=1, waitQueueTimeoutMS=5), threads=8, commands=1)
+        self.assertGreater(len(errors), 0)
+        self.assertEqual(self.pool()['failed'], {'timeout': len(errors)})
+    
+    def test_idle_connections_are_closed(self):
+        client = self.mongo_client(maxPoolSize=4, maxIdleTimeMS=1)
+        self.hammer(client, threads=4, commands=1)
+        time.sleep(0.05)
+        client.admin.command('ping')
+        self.assertGreater(self.pool()['closed'], 0)
+    
+    def test_django_connections_share_the_client(self):
+        """Test that closing a Django connection keeps the client and its pool open"""
+        settings_dict = ConnectionHandler().configure_settings({DEFAULT_DB_ALIAS: {
+            'ENGINE': 'octofit_tracker.mongo', 'NAME': 'octofit_pool_test', 'ENFORCE_SCHEMA': False,
+            'CLIENT': {'host': '127.0.0.1', 'port': self.server.port},
+        }})[DEFAULT_DB_ALIAS]
+        pool_monitor.reset()
+        clients = set()
+        for _ in range(3):
+            wrapper = DatabaseWrapper(settings_dict, alias='pool-test')
+            wrapper.connect()
+            wrapper.connection.command('ping')
+            clients.add(id(wrapper.client_connection))
+            wrapper.close()
+        self.assertEqual(len(clients), 1)
+        pool = pool_monitor.report()[f'127.0.0.1:{self.server.port}']
+        self.assertEqual((pool['created'], pool['closed'], pool['checkouts']), (1, 0, 3))
+    
+    def test_read_preference_gets_its_own_client(self):
+        options = {'host': '127.0.0.1', 'port': self.server.port}
+        primary, _ = shared_client(options)
+        self.assertIs(shared_client(dict(options))[0], primary)
+        secondary, _ = shared_client({**options, 'readPreference': 'secondaryPreferred'})
+        self.assertIsNot(secondary, primary)
+        self.assertEqual(secondary.read_preference.mongos_mode, 'secondaryPreferred')
+
+
+@override_settings(READ_DATABASE='reads')
+class ReadReplicaRouterTestCase(TestCase):
+    """Test cases for read/write splitting"""
+    
+    def setUp(self):
+        """Declare a replica alias (never connected to) and clear stickiness"""
+        patcher = mock.patch.dict(connections.databases, {'reads': dict(connections.databases[DEFAULT_DB_ALIAS])})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        caches['responses'].clear()
+        self.router = ReadReplicaRouter()
+        self.user = User.objects.create_user(username='writer', password='testpass123')
+        self.factory = RequestFactory()
+    
+    def route(self, method='get', user=None, during=lambda: None):
+        """Alias chosen for an activity read while handling a request"""
+        request = getattr(self.factory, method)('/api/activities/')
+        request.user = user or AnonymousUser()
+        
+        def view(request):
+            during()
+            return self.router.db_for_read(Activity)
+        
+        return ReadRoutingMiddleware(view)(request)
+    
+    def test_safe_requests_read_from_replica(self):
+        self.assertEqual(self.route('get', self.user), 'reads')
+        self.assertEqual(self.route('post', self.user), DEFAULT_DB_ALIAS)
+    
+    def test_reads_outside_requests_use_default(self):
+        """Test that commands and workers are left to the default database"""
+        self.assertIsNone(self.router.db_for_read(Activity))
+        self.assertEqual(self.router.db_for_write(Activity), DEFAULT_DB_ALIAS)
+    
+    def test_read_your_writes(self):
+        """Test that a user who wrote an activity reads from the primary, others do not"""
+        other = User.objects.create_user(username='reader')
+        Activity.objects.create(user=self.user, activity_type='running', title='Run', duration_minutes=30,
+                                activity_date=timezone.now())
+        self.assertEqual(self.route('get', self.user), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.route('get', other), 'reads')
+        
+        caches['responses'].delete(f'read-your-writes:{self.user.pk}')
+        self.assertEqual(self.route('get', self.user), 'reads')
+    
+    def test_membership_write_sticks(self):
+        team = Team.objects.create(name='Team', owner=self.user)
+        TeamMembership.objects.create(team=team, user=self.user)
+        self.assertEqual(self.route('get', self.user), DEFAULT_DB_ALIAS)
+    
+    def test_reads_after_a_write_in_the_request(self):
+        """Test that a write pins the rest of the request to the primary"""
+        self.assertEqual(self.route(during=lambda: self.router.db_for_write(Activity)), DEFAULT_DB_ALIAS)
+    
+    def test_use_primary(self):
+        def view(request):
+            with use_primary():
+                inside = self.router.db_for_read(Activity)
+            return inside, self.router.db_for_read(Activity)
+        
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        self.assertEqual(ReadRoutingMiddleware(view)(request), (DEFAULT_DB_ALIAS, 'reads'))
+    
+    def test_sessions_read_from_primary(self):
+        request = self.factory.get('/')
+        request.user = AnonymousUser()
+        self.assertEqual(ReadRoutingMiddleware(lambda request: self.router.db_for_read(Session))(request),
+                         DEFAULT_DB_ALIAS)
+    
+    def test_unresolved_user_is_not_loaded(self):
+        """Test that routing never evaluates a lazy request.user"""
+        loader = mock.Mock(return_value=self.user)
+        request = self.factory.get('/')
+        request.user = SimpleLazyObject(loader)
+        self.assertEqual(ReadRoutingMiddleware(lambda request: self.router.db_for_read(Activity))(request), 'reads')
+        loader.assert_not_called()
+    
+    def test_not_split_without_replica(self):
+        with override_settings(READ_DATABASE=None):
+            self.assertIsNone(read_database())
+            self.assertIsNone(self.route('get', self.user))
+
+
+class IndexPlanTestCase(TestCase):
+    """Test cases for the index plan of the filtered endpoints"""
+    
+    def setUp(self):
+        """Set up teams, leaderboard standings and workout plans"""
+        self.user = User.objects.create_user(username='member', password='testpass123')
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.team = Team.objects.create(name='Indexed', owner=self.user)
+        TeamMembership.objects.create(team=self.team, user=self.user, role='owner')
+        TeamMembership.objects.create(team=self.team, user=self.staff, role='admin')
+        self.leaderboard = Leaderboard.objects.create(team=self.team)
+        rebuild_leaderboard(self.leaderboard)
+        WorkoutPlan.objects.create(user=self.user, name='Plan', duration_days=7)
+        self.client = APIClient()
+    
+    def assertNoScans(self, user, path):
+        self.client.force_authenticate(user)
+        with indexes.capture_statements() as statements:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200, path)
+        self.assertTrue(statements, path)
+        self.assertEqual(indexes.collection_scans(statements), [], path)
+    
+    def test_filter_paths_use_indexes(self):
+        """Test that every filter and ordering path is answered from an index"""
+        team, leaderboard = self.team.pk, self.leaderboard.pk
+        for path in (
+            f'/api/teams/memberships/?team={team}',
+            f'/api/teams/memberships/?user={self.user.pk}',
+            '/api/teams/memberships/?role=admin',
+            f'/api/teams/memberships/?team={team}&role=admin',
+            '/api/teams/teams/my_teams/',
+            '/api/teams/teams/my_teams/?window=week',
+            f'/api/teams/leaderboard-entries/?leaderboard={leaderboard}',
+            f'/api/teams/leaderboard-entries/?leaderboard={leaderboard}&ordering=-points',
+            f'/api/teams/leaderboard-entries/?user={self.user.pk}',
+            '/api/teams/leaderboard-entries/',
+            '/api/workouts/plans/',
+        ):
+            self.assertNoScans(self.user, path)
+        for path in (
+            f'/api/workouts/plans/?user={self.user.pk}',
+            '/api/workouts/plans/?is_active=true',
+            '/api/workouts/plans/?difficulty_level=beginner',
+            '/api/workouts/plans/?is_active=true&difficulty_level=beginner',
+        ):
+            self.assertNoScans(self.staff, path)
+    
+    def test_scan_is_detected(self):
+        """Test that a filter on an unindexed column is reported"""
+        with indexes.capture_statements() as statements:
+            list(Activity.objects.filter(description='none'))
+        self.assertEqual([table for table, _ in indexes.collection_scans(statements)], ['activities_activity'])
+    
+    def test_unsupported_vendor_reports_no_scans(self):
+        with indexes.capture_statements() as statements:
+            list(Activity.objects.filter(description='none'))
+        with mock.patch.object(type(connections[DEFAULT_DB_ALIAS]), 'vendor', 'oracle'):
+            self.assertEqual(indexes.collection_scans(statements), [])
+    
+    def test_migrated_database_has_every_index(self):
+        self.assertEqual(indexes.missing_indexes(), [])
+    
+    def test_conditional_unique_index_on_mongodb(self):
+        """Test that a partial unique constraint djongo skips is planned as a native partial index"""
+        connection = connections[DEFAULT_DB_ALIAS]
+        with mock.patch.object(type(connection.features), 'supports_partial_indexes', False), \
+                mock.patch.object(type(connection), 'vendor', 'djongo'):
+            [planned] = [index for index in indexes.planned_indexes([Activity]) if index.partial]
+        self.assertTrue(planned.unique)
+        self.assertEqual(planned.keys, (('user_id', 1), ('idempotency_key', 1)))
+        self.assertEqual(planned.partial, {'idempotency_key': {'$type': 'string'}})
+
+
+class VerifyIndexesCommandTestCase(TransactionTestCase):
+    """Test cases for manage.py verify_indexes"""
+    
+    def test_missing_index_is_created(self):
+        """Test that a dropped index is reported and recreated"""
+        [planned] = [index for index in indexes.planned_indexes([TeamMembership])
+                     if index.fields == ('role', 'team')]
+        with connections[DEFAULT_DB_ALIAS].schema_editor() as editor:
+            editor.remove_index(TeamMembership, planned.index)
+        with self.assertRaisesMessage(CommandError, '1 indexes are missing'):
+            call_command('verify_indexes', app_labels=['teams'], stdout=mock.Mock())
+        call_command('verify_indexes', app_labels=['teams'], create=True, stdout=mock.Mock())
+        self.assertEqual(indexes.missing_indexes([TeamMembership]), [])
@@ -6,6 +6,11 @@ from django.urls import path, include
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
+from activities.async_views import my_activities
+from teams.async_views import leaderboard_entries
+from users.async_views import my_profile
+from .cache import ResponseCacheStatsView
+from .instrumentation import DatabasePoolMetricsView, RequestMetricsView
 import os
 
 
@@ -38,12 +43,14 @@ class APIRootView(APIView):
                 'activities': f"{base_url}/api/activities/",
                 'teams': f"{base_url}/api/teams/",
                 'workouts': f"{base_url}/api/workouts/",
+                'search': f"{base_url}/api/search/",
             },
             'available_endpoints': {
                 'api/users/': 'User management and profiles',
                 'api/activities/': 'Activity logging and tracking',
                 'api/teams/': 'Team management and leaderboards',
                 'api/workouts/': 'Workout templates and plans',
+                'api/search/': 'Full-text search over workouts, activities and teams',
                 'api/auth/': 'Authentication endpoints',
             }
         })
@@ -59,4 +66,12 @@ urlpatterns = [
     path('api/activities/', include('activities.urls')),
     path('api/teams/', include('teams.urls')),
     path('api/workouts/', include('workouts.urls')),
+    path('api/search/', include('search.urls')),
+    # Async-native variants of the hottest read paths, for ASGI deployments
+    path('api/async/activities/', my_activities, name='async-my-activities'),
+    path('api/async/teams/leaderboards/<int:pk>/entries/', leaderboard_entries, name='async-leaderboard-entries'),
+    path('api/async/users/profiles/me/', my_profile, name='async-my-profile'),
+    path('api/metrics/', RequestMetricsView.as_view(), name='request-metrics'),
+    path('api/metrics/cache/', ResponseCacheStatsView.as_view(), name='response-cache-metrics'),
+    path('api/metrics/db-pool/', DatabasePoolMetricsView.as_view(), name='db-pool-metrics'),
 ]
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import SearchPosting
+
+
+@admin.register(SearchPosting)
+class SearchPostingAdmin(admin.ModelAdmin):
+    list_display = ('term', 'kind', 'object_id', 'owner_id', 'weight')
+    list_filter = ('kind',)
+    search_fields = ('term',)
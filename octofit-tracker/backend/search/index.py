@@ -0,0 +1,223 @@
+"""
+Full-text search over workouts, activities and teams.
+
+Documents are tokenized (lowercased, accents folded, stopwords dropped)
+into SearchPosting rows, one per distinct term with a field-weighted
+count, kept up to date by model signals and by bulk ingest. A query
+looks each of its terms up through the (term, kind, owner_id) index,
+the last one as a prefix so results follow typing, which is a range
+scan on any backend: the work depends on how many documents contain
+the terms, not on the size of the collections. Every query term must
+match; documents are ranked by the summed weights of their matching
+terms, rarer terms counting more.
+
+Activities are private: they are indexed with their owner and only
+match that user's searches.
+"""
+import math
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+
+from activities.models import Activity
+from teams.models import Team
+from workouts.models import Workout
+from .models import SearchPosting
+
+# Terms longer than this are truncated, like the term column
+MAX_TERM_LENGTH = 64
+
+MAX_QUERY_TERMS = 8
+
+# Postings read per query term; bounds the cost of very common terms
+MAX_POSTINGS = getattr(settings, 'SEARCH_MAX_POSTINGS', 10000)
+
+# Hits a ?search= on a list endpoint ranks; deeper matches are dropped
+MAX_RESULTS = getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+
+# A term only matching as a prefix of the document term counts this much
+PREFIX_MATCH_FACTOR = 0.5
+
+STOPWORDS = frozenset((
+    'a', 'an', 'and', 'at', 'by', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with',
+))
+
+TOKEN = re.compile(r'\w+')
+
+
+@dataclass(frozen=True)
+class Indexed:
+    """How documents of one kind are indexed"""
+    model: type
+    # field -> weight
+    fields: dict
+    # Field holding the owner of private documents
+    owner_field: str = None
+    # Fields returned with a hit
+    display: tuple = field(default=())
+
+
+INDEXES = {
+    'workout': Indexed(
+        Workout, {'title': 3, 'description': 1, 'equipment_needed': 1},
+        display=('title', 'category', 'difficulty'),
+    ),
+    'activity': Indexed(
+        Activity, {'title': 3, 'description': 1, 'location': 2}, owner_field='user_id',
+        display=('title', 'activity_type', 'activity_date'),
+    ),
+    'team': Indexed(
+        Team, {'name': 3, 'description': 1},
+        display=('name',),
+    ),
+}
+
+KINDS = tuple(INDEXES)
+
+
+def tokenize(text):
+    """Search terms of a text, in order"""
+    folded = ''.join(
+        char for char in unicodedata.normalize('NFKD', (text or '').lower())
+        if not unicodedata.combining(char)
+    )
+    return [
+        token[:MAX_TERM_LENGTH] for token in TOKEN.findall(folded)
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def document_terms(kind, obj):
+    """{term: weight} of one document"""
+    terms = {}
+    for name, weight in INDEXES[kind].fields.items():
+        for term in tokenize(getattr(obj, name)):
+            terms[term] = terms.get(term, 0) + weight
+    return terms
+
+
+def _postings(kind, objects):
+    owner_field = INDEXES[kind].owner_field
+    return [
+        SearchPosting(
+            term=term, kind=kind, object_id=obj.pk, weight=weight,
+            owner_id=getattr(obj, owner_field) if owner_field else None,
+        )
+        for obj in objects
+        for term, weight in document_terms(kind, obj).items()
+    ]
+
+
+def index_objects(kind, objects, batch_size=5000):
+    """(Re)index saved documents of one kind"""
+    objects = list(objects)
+    if not objects:
+        return
+    if any(obj.pk is None for obj in objects):
+        # Postings of an unsaved document could never be matched or removed
+        raise ValueError(f'Cannot index unsaved {kind} documents')
+    with transaction.atomic():
+        remove(kind, [obj.pk for obj in objects])
+        SearchPosting.objects.bulk_create(_postings(kind, objects), batch_size=batch_size)
+
+
+def remove(kind, object_ids):
+    SearchPosting.objects.filter(kind=kind, object_id__in=object_ids).delete()
+
+
+def rebuild(kinds=KINDS, batch_size=2000):
+    """Reindex every document of the given kinds. Returns {kind: documents indexed}"""
+    indexed = {}
+    for kind in kinds:
+        SearchPosting.objects.filter(kind=kind).delete()
+        documents = INDEXES[kind].model.objects.order_by('pk')
+        count = 0
+        last_pk = 0
+        while True:
+            batch = list(documents.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            SearchPosting.objects.bulk_create(_postings(kind, batch), batch_size=batch_size)
+            count += len(batch)
+        indexed[kind] = count
+    return indexed
+
+
+def _visible(kinds, user_id):
+    """Postings of the requested kinds, private ones only for their owner"""
+    public = [kind for kind in kinds if INDEXES[kind].owner_field is None]
+    private = [kind for kind in kinds if INDEXES[kind].owner_field is not None]
+    condition = Q(kind__in=public)
+    if private:
+        condition |= Q(kind__in=private, owner_id=user_id)
+    return SearchPosting.objects.filter(condition)
+
+
+def search(query, user_id, kinds=KINDS, limit=20):
+    """Ranked [(kind, object_id, score)] of the documents matching every query term"""
+    tokens = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+    if not tokens:
+        return []
+
+    scores = {}
+    matches = {}
+    for position, token in enumerate(tokens):
+        postings = _visible(kinds, user_id)
+        if position == len(tokens) - 1:
+            # The last term may still be being typed
+            postings = postings.filter(term__gte=token, term__lt=token + '\uffff')
+        else:
+            postings = postings.filter(term=token)
+        best = {}
+        # Heaviest first, so a very common term keeps its best documents
+        postings = postings.order_by('-weight', 'kind', 'object_id')
+        for kind, object_id, term, weight in postings.values_list(
+            'kind', 'object_id', 'term', 'weight'
+        )[:MAX_POSTINGS]:
+            key = (kind, object_id)
+            best[key] = max(best.get(key, 0), weight * (1 if term == token else PREFIX_MATCH_FACTOR))
+        if not best:
+            return []
+        rarity = 1 / (1 + math.log(len(best)))
+        for key, weight in best.items():
+            scores[key] = scores.get(key, 0) + weight * rarity
+            matches[key] = matches.get(key, 0) + 1
+
+    hits = [(kind, object_id, score) for (kind, object_id), score in scores.items()
+            if matches[(kind, object_id)] == len(tokens)]
+    hits.sort(key=lambda hit: (-hit[2], KINDS.index(hit[0]), hit[1]))
+    return hits[:limit]
+
+
+def describe(hits):
+    """Result rows for hits, with each kind's display fields (one query per kind)"""
+    ids = {}
+    for kind, object_id, _ in hits:
+        ids.setdefault(kind, []).append(object_id)
+    rows = {
+        (kind, row['id']): row
+        for kind, object_ids in ids.items()
+        for row in INDEXES[kind].model.objects.filter(pk__in=object_ids).values('id', *INDEXES[kind].display)
+    }
+    return [
+        {'type': kind, 'score': round(score, 4), **rows[(kind, object_id)]}
+        for kind, object_id, score in hits if (kind, object_id) in rows
+    ]
+
+
+def connect_signals():
+    for kind, indexed in INDEXES.items():
+        post_save.connect(
+            lambda sender, instance, kind=kind, **kwargs: index_objects(kind, [instance]),
+            sender=indexed.model, weak=False, dispatch_uid=f'search_index_{kind}',
+        )
+        post_delete.connect(
+            lambda sender, instance, kind=kind, **kwargs: remove(kind, [instance.pk]),
+            sender=indexed.model, weak=False, dispatch_uid=f'search_remove_{kind}',
+        )
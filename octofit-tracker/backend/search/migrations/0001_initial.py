@@ -0,0 +1,33 @@
+# Generated by Django 4.1.7 on 2026-10-18 20:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('workout', 'Workout'), ('activity', 'Activity'), ('team', 'Team')], max_length=10)),
+                ('object_id', models.IntegerField()),
+                ('owner_id', models.IntegerField(blank=True, null=True)),
+                ('weight', models.FloatField(help_text='Field-weighted number of occurrences of the term')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['term', 'kind', 'owner_id'], name='search_sear_term_ebe8d4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['kind', 'object_id'], name='search_sear_kind_6d5110_idx'),
+        ),
+    ]
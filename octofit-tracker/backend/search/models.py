@@ -0,0 +1,26 @@
+from django.db import models
+
+
+class SearchPosting(models.Model):
+    """One term of an indexed workout, activity or team; the inverted index behind /api/search/"""
+    KIND_CHOICES = [
+        ('workout', 'Workout'),
+        ('activity', 'Activity'),
+        ('team', 'Team'),
+    ]
+    
+    term = models.CharField(max_length=64)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.IntegerField()
+    # Only set for private documents (activities), which match only for their owner
+    owner_id = models.IntegerField(null=True, blank=True)
+    weight = models.FloatField(help_text="Field-weighted number of occurrences of the term")
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'kind', 'owner_id']),
+            models.Index(fields=['kind', 'object_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.term} -> {self.kind} {self.object_id}"
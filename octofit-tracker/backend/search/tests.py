@@ -0,0 +1,134 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APIClient
+from activities.models import Activity
+from teams.models import Team
+from workouts.models import Workout
+from . import index
+from .models import SearchPosting
+
+
+class SearchIndexTestCase(TestCase):
+    """Test cases for the full-text search index"""
+    
+    def setUp(self):
+        """Set up workouts, teams and activities of two users"""
+        self.user = User.objects.create_user(username='searcher')
+        self.other = User.objects.create_user(username='other')
+        self.flow = Workout.objects.create(
+            title='Morning Yoga Flow', description='Gentle stretching', category='flexibility',
+            estimated_duration_minutes=30, instructions='Breathe', equipment_needed='Yoga mat'
+        )
+        self.hiit = Workout.objects.create(
+            title='Tabata Sprint', description='Short yoga cooldown after sprints', category='hiit',
+            estimated_duration_minutes=20, instructions='Go hard'
+        )
+        self.team = Team.objects.create(name='Yoga Warriors', description='Morning sessions', owner=self.user)
+        self.mine = Activity.objects.create(
+            user=self.user, activity_type='yoga', title='Café yoga', location='Riverside',
+            duration_minutes=45, activity_date=timezone.now()
+        )
+        Activity.objects.create(
+            user=self.other, activity_type='yoga', title='Private yoga',
+            duration_minutes=30, activity_date=timezone.now()
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def search(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [(row['type'], row['id']) for row in response.data['results']]
+    
+    def test_tokenize(self):
+        """Test that text is lowercased, accent-folded and stripped of stopwords"""
+        self.assertEqual(index.tokenize('The Café at the RIVER-side'), ['cafe', 'river', 'side'])
+    
+    def test_ranked_unified_results(self):
+        """Test that title matches outrank description matches across types"""
+        results = self.search(q='yoga')
+        self.assertEqual(results[-1], ('workout', self.hiit.id))
+        self.assertEqual(
+            set(results), {('workout', self.flow.id), ('workout', self.hiit.id),
+                           ('team', self.team.id), ('activity', self.mine.id)}
+        )
+    
+    def test_prefix_and_all_terms(self):
+        """Test that the last term matches as a prefix and every term is required"""
+        self.assertEqual(self.search(q='morning yo'), [('workout', self.flow.id), ('team', self.team.id)])
+        self.assertEqual(self.search(q='cafe river'), [('activity', self.mine.id)])
+        self.assertEqual(self.search(q='yoga zumba'), [])
+    
+    def test_type_filter_and_validation(self):
+        """Test restricting result types and rejecting bad parameters"""
+        self.assertEqual(self.search(q='yoga', type='team'), [('team', self.team.id)])
+        self.assertEqual(self.client.get('/api/search/', {'q': 'yoga', 'type': 'user'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+    
+    def test_index_follows_writes(self):
+        """Test that edits and deletes update the postings"""
+        self.flow.title = 'Evening Stretch'
+        self.flow.save()
+        self.assertNotIn(('workout', self.flow.id), self.search(q='morning', type='workout'))
+        self.team.delete()
+        self.assertFalse(SearchPosting.objects.filter(kind='team', object_id=self.team.id).exists())
+    
+    def test_bulk_ingest_is_indexed(self):
+        """Test that activities uploaded in bulk are searchable"""
+        self.client.post('/api/activities/bulk/', [{
+            'activity_type': 'hiking', 'title': 'Summit push', 'duration_minutes': 240,
+            'calories_burned': 0, 'activity_date': timezone.now().isoformat(),
+        }], format='json')
+        self.assertEqual(len(self.search(q='summit')), 1)
+    
+    def test_bulk_ingest_indexes_created_ids(self):
+        """Test that bulk postings point at the new rows when bulk inserts return no ids"""
+        features = type(connection.features)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', False):
+            response = self.client.post('/api/activities/bulk/', [{
+                'activity_type': 'hiking', 'title': f'Summit {key}', 'duration_minutes': 240,
+                'calories_burned': 0, 'activity_date': timezone.now().isoformat(), 'idempotency_key': key,
+            } for key in ('a', 'b')], format='json')
+        ids = {row['id'] for row in response.data['results']}
+        postings = SearchPosting.objects.filter(kind='activity', term='summit')
+        self.assertEqual(set(postings.values_list('object_id', flat=True)), ids)
+        self.assertEqual({pk for _, pk in self.search(q='summit')}, ids)
+    
+    def test_unsaved_documents_are_rejected(self):
+        """Test that indexing a document without a primary key fails"""
+        with self.assertRaises(ValueError):
+            index.index_objects('activity', [Activity(user=self.user, title='Draft')])
+    
+    def test_viewset_search_uses_index(self):
+        """Test that ?search= on workouts and teams is answered from the index"""
+        response = self.client.get('/api/workouts/templates/', {'search': 'tabata'})
+        self.assertEqual([workout['id'] for workout in response.data['results']], [self.hiit.id])
+        response = self.client.get('/api/teams/teams/', {'search': 'warr'})
+        self.assertEqual([team['id'] for team in response.data['results']], [self.team.id])
+    
+    def test_viewset_search_keeps_relevance_order(self):
+        """Test that ?search= results are ranked unless an ordering is requested"""
+        url = '/api/workouts/templates/'
+        response = self.client.get(url, {'search': 'yoga'})
+        self.assertEqual([workout['id'] for workout in response.data['results']], [self.flow.id, self.hiit.id])
+        response = self.client.get(url, {'search': 'yoga', 'ordering': 'estimated_duration_minutes'})
+        self.assertEqual([workout['id'] for workout in response.data['results']], [self.hiit.id, self.flow.id])
+    
+    def test_viewset_search_without_terms_falls_back(self):
+        """Test that a ?search= of only stopwords or single characters uses SearchFilter"""
+        Team.objects.create(name='Runners', owner=self.other)
+        response = self.client.get('/api/teams/teams/', {'search': 'w'})
+        self.assertEqual([team['id'] for team in response.data['results']], [self.team.id])
+        response = self.client.get('/api/teams/teams/', {'search': 'the'})
+        self.assertEqual(response.data['results'], [])
+    
+    def test_rebuild(self):
+        """Test that a rebuild recreates the same postings"""
+        before = sorted(SearchPosting.objects.values_list('term', 'kind', 'object_id', 'weight'))
+        self.assertEqual(index.rebuild(), {'workout': 2, 'activity': 2, 'team': 1})
+        after = sorted(SearchPosting.objects.values_list('term', 'kind', 'object_id', 'weight'))
+        self.assertEqual(before, after)
@@ -0,0 +1,37 @@
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from . import index
+
+
+class SearchView(APIView):
+    """
+    API endpoint for full-text search.
+    Ranked workouts, teams and the current user's activities matching a query.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 20
+    max_limit = 50
+    
+    def get(self, request, format=None):
+        """
+        Search the index.
+        Query params: q, type (comma-separated workout, activity, team; default all), limit
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        types = request.query_params.get('type')
+        kinds = types.split(',') if types else list(index.KINDS)
+        if any(kind not in index.KINDS for kind in kinds):
+            return Response(
+                {'error': 'type must be a list of: ' + ', '.join(index.KINDS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = max(1, min(int(request.query_params['limit']), self.max_limit))
+        except (KeyError, ValueError):
+            limit = self.default_limit
+        
+        hits = index.search(query, request.user.id, kinds=kinds, limit=limit)
+        return Response({'query': query, 'results': index.describe(hits)})
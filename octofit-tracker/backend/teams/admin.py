@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Team, TeamMembership, Leaderboard, LeaderboardEntry
+from django.db.models import Count
+from .models import Team, TeamMembership, Leaderboard, LeaderboardEntry, RankingScore
 
 
 class TeamMembershipInline(admin.TabularInline):
@@ -14,6 +15,11 @@ class TeamAdmin(admin.ModelAdmin):
     search_fields = ('name', 'owner__username')
     readonly_fields = ('created_at', 'updated_at')
     inlines = [TeamMembershipInline]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('owner').annotate(
+            member_count=Count('members', distinct=True)
+        )
 
 
 @admin.register(TeamMembership)
@@ -35,3 +41,10 @@ class LeaderboardEntryAdmin(admin.ModelAdmin):
     list_filter = ('leaderboard', 'rank')
     search_fields = ('user__username',)
     readonly_fields = ('updated_at',)
+
+
+@admin.register(RankingScore)
+class RankingScoreAdmin(admin.ModelAdmin):
+    list_display = ('scope', 'object_id', 'points', 'updated_at')
+    list_filter = ('scope',)
+    readonly_fields = ('updated_at',)
@@ -4,3 +4,25 @@ from django.apps import AppConfig
 class TeamsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'teams'
+    
+    def ready(self):
+        from django.contrib.auth.models import User
+        from django.db.models.signals import post_delete
+        from octofit_tracker.cache import invalidate_on_change, invalidate_on_m2m_change
+        from octofit_tracker.routing import stick_on_change
+        from . import ranking
+        from .models import Team, TeamMembership
+        invalidate_on_change(Team, 'teams')
+        invalidate_on_change(TeamMembership, 'teams', lambda membership: membership.team_id)
+        invalidate_on_m2m_change(Team.members, 'teams')
+        stick_on_change(TeamMembership)
+        
+        # Deleted users and teams leave the global ranking
+        post_delete.connect(
+            lambda sender, instance, **kwargs: ranking.discard('user', instance.pk),
+            sender=User, weak=False, dispatch_uid='ranking_discard_user'
+        )
+        post_delete.connect(
+            lambda sender, instance, **kwargs: ranking.discard('team', instance.pk),
+            sender=Team, weak=False, dispatch_uid='ranking_discard_team'
+        )
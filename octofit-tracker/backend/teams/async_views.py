@@ -0,0 +1,17 @@
+"""Async variants of the hottest leaderboard read paths (see octofit_tracker/async_api.py)"""
+from rest_framework.exceptions import NotFound
+from octofit_tracker.async_api import async_api_view
+from .models import Leaderboard, LeaderboardEntry
+from .serializers import LeaderboardEntrySerializer
+from .views import LeaderboardEntryPagination
+
+
+@async_api_view
+async def leaderboard_entries(request, pk):
+    """Entries of a leaderboard in rank order, one keyset page at a time"""
+    if not await Leaderboard.objects.filter(pk=pk).aexists():
+        raise NotFound()
+    entries = LeaderboardEntry.objects.filter(leaderboard_id=pk).select_related('user')
+    paginator = LeaderboardEntryPagination()
+    page = await paginator.apaginate_queryset(entries, request)
+    return paginator.get_paginated_data(LeaderboardEntrySerializer(page, many=True).data)
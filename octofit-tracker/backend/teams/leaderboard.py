@@ -0,0 +1,286 @@
+"""
+Incremental leaderboard maintenance.
+
+Activity writes are converted into deltas that are applied to the
+LeaderboardEntry rows of every team the activity owner belongs to.
+Only the entries whose position is actually crossed by the new point
+total are re-ranked, so the cost of a write does not depend on team size.
+Members joining or leaving a team add or drop their entry the same way.
+
+Points are only ever changed with F() expressions, so concurrent deltas
+always add up. Ranks are shifted from values read earlier in the
+transaction, and select_for_update() does not lock anything on MongoDB
+or SQLite, so a delta applied in between can leave duplicate, skipped or
+misordered ranks. Every write therefore checks the ranks around the
+entries it moved and renumbers the leaderboard from its points when they
+do not follow.
+"""
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Q
+from django.utils import timezone
+
+from . import live, ranking
+from .models import Leaderboard, LeaderboardEntry
+
+# Scoring: one point per active minute plus one point per 10 kcal burned
+CALORIES_PER_POINT = 10
+
+
+@dataclass(frozen=True)
+class ActivityDelta:
+    """Change an activity write makes to a user's leaderboard totals"""
+    activities_count: int = 0
+    duration_minutes: int = 0
+    calories_burned: float = 0
+    points: int = 0
+
+    @classmethod
+    def for_activity(cls, activity):
+        """Delta contributed by a single activity"""
+        calories = activity.calories_burned or 0
+        return cls(
+            activities_count=1,
+            duration_minutes=activity.duration_minutes,
+            calories_burned=calories,
+            points=activity_points(activity.duration_minutes, calories),
+        )
+
+    def __neg__(self):
+        return ActivityDelta(
+            -self.activities_count, -self.duration_minutes,
+            -self.calories_burned, -self.points
+        )
+
+    def __add__(self, other):
+        return ActivityDelta(
+            self.activities_count + other.activities_count,
+            self.duration_minutes + other.duration_minutes,
+            self.calories_burned + other.calories_burned,
+            self.points + other.points,
+        )
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __bool__(self):
+        return any((
+            self.activities_count, self.duration_minutes,
+            self.calories_burned, self.points
+        ))
+
+
+def activity_points(duration_minutes, calories_burned):
+    """Points awarded for an activity"""
+    return int(duration_minutes) + int((calories_burned or 0) // CALORIES_PER_POINT)
+
+
+def _activity_totals(user_ids):
+    """{user id: ActivityDelta} of all the users' activities"""
+    from activities.models import Activity
+
+    totals = {user_id: ActivityDelta() for user_id in user_ids}
+    rows = Activity.objects.filter(user_id__in=user_ids).values_list(
+        'user_id', 'duration_minutes', 'calories_burned'
+    )
+    for user_id, duration, calories in rows.iterator():
+        totals[user_id] += ActivityDelta(
+            1, duration, calories or 0, activity_points(duration, calories)
+        )
+    return totals
+
+
+def apply_activity_delta(user_id, delta):
+    """Apply a delta to every leaderboard the user appears on and to the global ranking"""
+    if not delta:
+        return
+    leaderboards = list(
+        Leaderboard.objects.filter(team__members=user_id).values_list('id', 'team_id')
+    )
+    with transaction.atomic():
+        for leaderboard_id, team_id in leaderboards:
+            _apply_to_entry(leaderboard_id, user_id, delta)
+            ranking.add_points('team', team_id, delta.points)
+        ranking.add_points('user', user_id, delta.points)
+
+
+def record_activity_created(activity):
+    apply_activity_delta(activity.user_id, ActivityDelta.for_activity(activity))
+
+
+def record_activities_created(activities):
+    """Apply a batch of new activities with one delta per user"""
+    deltas = {}
+    for activity in activities:
+        delta = ActivityDelta.for_activity(activity)
+        deltas[activity.user_id] = deltas.get(activity.user_id, ActivityDelta()) + delta
+    for user_id, delta in deltas.items():
+        apply_activity_delta(user_id, delta)
+
+
+def record_activity_deleted(activity):
+    apply_activity_delta(activity.user_id, -ActivityDelta.for_activity(activity))
+
+
+def record_activity_updated(old_user_id, old_delta, activity):
+    """Apply the difference between an activity's old and new state"""
+    new_delta = ActivityDelta.for_activity(activity)
+    if old_user_id == activity.user_id:
+        apply_activity_delta(activity.user_id, new_delta - old_delta)
+    else:
+        apply_activity_delta(old_user_id, -old_delta)
+        apply_activity_delta(activity.user_id, new_delta)
+
+
+def record_member_added(team_id, user_id):
+    """
+    Rank a new member on the team's leaderboard with their all-time totals,
+    which a rebuild would count as well
+    """
+    leaderboard_id = Leaderboard.objects.filter(team_id=team_id).values_list('id', flat=True).first()
+    if leaderboard_id is None:
+        return
+    # A membership saved from request data may still hold the id as text
+    user_id = int(user_id)
+    total = _activity_totals([user_id])[user_id]
+    with transaction.atomic():
+        if LeaderboardEntry.objects.filter(leaderboard_id=leaderboard_id, user_id=user_id).exists():
+            return
+        _apply_to_entry(leaderboard_id, user_id, total)
+        ranking.add_points('team', team_id, total.points)
+
+
+def record_member_removed(team_id, user_id):
+    """Drop a former member's entry, moving the entries below it up"""
+    with transaction.atomic():
+        entry = LeaderboardEntry.objects.select_for_update().filter(
+            leaderboard__team_id=team_id, user_id=user_id
+        ).first()
+        if entry is None:
+            return
+        entry.delete()
+        LeaderboardEntry.objects.filter(leaderboard_id=entry.leaderboard_id, rank__gt=entry.rank).update(
+            rank=F('rank') - 1, updated_at=timezone.now()
+        )
+        ranking.add_points('team', team_id, -entry.points)
+        live.notify(entry.leaderboard_id, reset=True)
+
+
+def _entry_for_update(leaderboard_id, user_id):
+    """The user's entry, created last in the standings if missing"""
+    entries = LeaderboardEntry.objects.filter(leaderboard_id=leaderboard_id)
+    entry = entries.select_for_update().filter(user_id=user_id).first()
+    if entry is None:
+        last_rank = entries.aggregate(Max('rank'))['rank__max'] or 0
+        entry = LeaderboardEntry.objects.create(
+            leaderboard_id=leaderboard_id, user_id=user_id, rank=last_rank + 1
+        )
+    return entry
+
+
+def _apply_to_entry(leaderboard_id, user_id, delta):
+    entry = _entry_for_update(leaderboard_id, user_id)
+    old_points = entry.points
+    # update() skips auto_now; updated_at tells push subscribers what changed
+    LeaderboardEntry.objects.filter(pk=entry.pk).update(
+        points=F('points') + delta.points,
+        activities_count=F('activities_count') + delta.activities_count,
+        total_duration_minutes=F('total_duration_minutes') + delta.duration_minutes,
+        total_calories_burned=F('total_calories_burned') + delta.calories_burned,
+        updated_at=timezone.now(),
+    )
+    new_rank = _rerank(entry, old_points, old_points + delta.points)
+    if not _ranks_follow_points(entry, min(entry.rank, new_rank), max(entry.rank, new_rank)):
+        renumber_leaderboard(leaderboard_id)
+    live.notify(leaderboard_id)
+
+
+def _rerank(entry, old_points, new_points):
+    """
+    Move an entry to its new position, shifting only the entries it passes.
+    Ties keep their existing order. Returns the entry's new rank.
+    """
+    others = LeaderboardEntry.objects.filter(
+        leaderboard_id=entry.leaderboard_id
+    ).exclude(pk=entry.pk)
+
+    if new_points > old_points:
+        passed = others.filter(rank__lt=entry.rank, points__lt=new_points)
+        new_rank = passed.aggregate(Min('rank'))['rank__min']
+        shift = 1
+    elif new_points < old_points:
+        passed = others.filter(rank__gt=entry.rank, points__gt=new_points)
+        new_rank = passed.aggregate(Max('rank'))['rank__max']
+        shift = -1
+    else:
+        return entry.rank
+
+    if new_rank is None:
+        return entry.rank
+    now = timezone.now()
+    passed.update(rank=F('rank') + shift, updated_at=now)
+    LeaderboardEntry.objects.filter(pk=entry.pk).update(rank=new_rank, updated_at=now)
+    return new_rank
+
+
+def _ranks_follow_points(entry, first, last):
+    """
+    Whether ranks first..last and their neighbours, plus the entry
+    wherever it is now, are consecutive and ordered by points
+    """
+    rows = list(
+        LeaderboardEntry.objects.filter(leaderboard_id=entry.leaderboard_id)
+        .filter(Q(rank__gte=first - 1, rank__lte=last + 1) | Q(pk=entry.pk))
+        .order_by('rank', 'id').values_list('rank', 'points')
+    )
+    ranks = [rank for rank, _ in rows]
+    points = [points for _, points in rows]
+    return (
+        ranks == list(range(ranks[0], ranks[0] + len(ranks)))
+        and all(higher >= lower for higher, lower in zip(points, points[1:]))
+    )
+
+
+def renumber_leaderboard(leaderboard_id):
+    """
+    Rank entries by their points again, ties keeping their current order.
+    Repairs ranks without rereading activities; returns the entries changed.
+    """
+    now = timezone.now()
+    changed = []
+    entries = LeaderboardEntry.objects.filter(leaderboard_id=leaderboard_id).order_by('-points', 'rank', 'id')
+    for rank, entry in enumerate(entries.only('id', 'rank'), 1):
+        if entry.rank != rank:
+            entry.rank, entry.updated_at = rank, now
+            changed.append(entry)
+    LeaderboardEntry.objects.bulk_update(changed, ['rank', 'updated_at'])
+    return len(changed)
+
+
+def rebuild_leaderboard(leaderboard):
+    """
+    Recompute a leaderboard from scratch.
+    Only needed for seeding or repairing drift; writes use the deltas above.
+    """
+    member_ids = list(leaderboard.team.members.values_list('id', flat=True))
+    totals = _activity_totals(member_ids)
+    standings = sorted(totals.items(), key=lambda item: -item[1].points)
+    with transaction.atomic():
+        leaderboard.entries.all().delete()
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(
+                leaderboard=leaderboard,
+                user_id=user_id,
+                rank=rank,
+                points=total.points,
+                activities_count=total.activities_count,
+                total_duration_minutes=total.duration_minutes,
+                total_calories_burned=total.calories_burned,
+            )
+            for rank, (user_id, total) in enumerate(standings, 1)
+        ])
+        ranking.set_points('team', leaderboard.team_id, sum(total.points for total in totals.values()))
+        live.notify(leaderboard.pk, reset=True)
+    return leaderboard
+
@@ -0,0 +1,308 @@
+"""
+Real-time leaderboard push over Server-Sent Events.
+
+Leaderboard writes only bump a per-leaderboard version in the shared
+``responses`` cache (after commit). Each process runs at most one poller
+per watched leaderboard: every LEADERBOARD_PUSH_INTERVAL seconds it
+compares the version, and when it moved reads the recently updated
+entries once, diffs them against the standings it last sent, and fans
+the changes out to every subscriber as a single message. A burst of
+writes therefore costs connected clients one message per interval and
+the database one query per interval, however many dashboards are open.
+
+The stream is a plain ASGI endpoint (see octofit_tracker/asgi.py)
+because Django 4.1 iterates streaming responses synchronously.
+"""
+import asyncio
+import io
+import json
+import logging
+import re
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import exceptions
+
+from octofit_tracker.async_api import api_request, check_access, error_headers, error_status
+from octofit_tracker.cache import response_cache
+from .models import Leaderboard, LeaderboardEntry
+
+PUSH_INTERVAL = getattr(settings, 'LEADERBOARD_PUSH_INTERVAL', 1.0)
+
+HEARTBEAT_INTERVAL = getattr(settings, 'LEADERBOARD_PUSH_HEARTBEAT', 15.0)
+
+# Subscribers that fall this many messages behind are sent a fresh snapshot instead
+SUBSCRIBER_BACKLOG = 32
+
+# Re-read entries updated this long before the previous poll, to cover
+# clock skew between workers; unchanged rows are filtered by the diff
+CLOCK_SLACK = timedelta(seconds=2)
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = re.compile(r'^/api/live/teams/leaderboards/(?P<pk>\d+)/$')
+
+ENTRY_FIELDS = ('user_id', 'user__username', 'rank', 'points', 'activities_count')
+
+
+def _version_key(leaderboard_id):
+    return f'live:leaderboard:{leaderboard_id}'
+
+
+def _reset_key(leaderboard_id):
+    return f'live:leaderboard:{leaderboard_id}:reset'
+
+
+def notify(leaderboard_id, reset=False):
+    """
+    Announce that entries of a leaderboard changed once the current
+    transaction commits. reset=True makes subscribers reload the full
+    standings, for changes that remove or recreate entries.
+    """
+    def bump():
+        cache = response_cache()
+        key = _version_key(leaderboard_id)
+        cache.add(key, 0, timeout=None)
+        try:
+            version = cache.incr(key)
+        except ValueError:
+            version = 1
+            cache.set(key, version, timeout=None)
+        if reset:
+            cache.set(_reset_key(leaderboard_id), version, timeout=None)
+    transaction.on_commit(bump)
+
+
+def _entry(row):
+    return {
+        'user_id': row['user_id'],
+        'username': row['user__username'],
+        'rank': row['rank'],
+        'points': row['points'],
+        'activities_count': row['activities_count'],
+    }
+
+
+class _Channel:
+    """Standings of one leaderboard and the queues of its subscribers"""
+
+    def __init__(self, leaderboard_id):
+        self.leaderboard_id = leaderboard_id
+        self.subscribers = set()
+        self.standings = {}
+        self.version = None
+        self.polled_at = None
+        self.task = None
+        self.ready = asyncio.Event()
+        # What the first load raised, for the subscribers waiting on ready
+        self.error = None
+
+    def _state(self):
+        cache = response_cache()
+        values = cache.get_many([_version_key(self.leaderboard_id), _reset_key(self.leaderboard_id)])
+        return values.get(_version_key(self.leaderboard_id), 0), values.get(_reset_key(self.leaderboard_id), 0)
+
+    async def load(self):
+        """Read the full standings"""
+        self.polled_at = timezone.now()
+        self.version, _ = await sync_to_async(self._state)()
+        rows = LeaderboardEntry.objects.filter(leaderboard_id=self.leaderboard_id).values(*ENTRY_FIELDS)
+        self.standings = {row['user_id']: _entry(row) async for row in rows}
+
+    def snapshot(self):
+        entries = sorted(self.standings.values(), key=lambda entry: entry['rank'])
+        return 'snapshot', {'leaderboard': self.leaderboard_id, 'version': self.version, 'entries': entries}
+
+    async def poll(self):
+        """One message for everything that changed since the last poll, or None"""
+        version, reset_version = await sync_to_async(self._state)()
+        if version == self.version:
+            return None
+        if reset_version > (self.version or 0):
+            await self.load()
+            return self.snapshot()
+
+        since = self.polled_at - CLOCK_SLACK
+        self.polled_at = timezone.now()
+        self.version = version
+        rows = LeaderboardEntry.objects.filter(
+            leaderboard_id=self.leaderboard_id, updated_at__gte=since
+        ).values(*ENTRY_FIELDS)
+        changes = []
+        async for row in rows:
+            entry = _entry(row)
+            if self.standings.get(entry['user_id']) != entry:
+                self.standings[entry['user_id']] = entry
+                changes.append(entry)
+        if not changes:
+            return None
+        changes.sort(key=lambda entry: entry['rank'])
+        return 'update', {'leaderboard': self.leaderboard_id, 'version': version, 'changes': changes}
+
+    def publish(self, message):
+        for queue in list(self.subscribers):
+            if queue.full():
+                # A stalled client gets the current standings instead of the backlog
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot())
+            else:
+                queue.put_nowait(message)
+
+
+class LeaderboardHub:
+    """Per-process registry of watched leaderboards, one poller each"""
+
+    def __init__(self, interval=PUSH_INTERVAL):
+        self.interval = interval
+        self.channels = {}
+
+    def watching(self, leaderboard_id):
+        channel = self.channels.get(leaderboard_id)
+        return len(channel.subscribers) if channel else 0
+
+    async def subscribe(self, leaderboard_id):
+        """Queue receiving (event, data) messages, starting with a snapshot"""
+        channel = self.channels.get(leaderboard_id)
+        if channel is None:
+            channel = self.channels[leaderboard_id] = _Channel(leaderboard_id)
+            try:
+                await channel.load()
+                channel.task = asyncio.ensure_future(self._run(channel))
+            except BaseException as exc:
+                del self.channels[leaderboard_id]
+                channel.error = exc
+                raise
+            finally:
+                channel.ready.set()
+        await channel.ready.wait()
+        if isinstance(channel.error, asyncio.CancelledError):
+            # The subscriber that was loading went away; load again
+            return await self.subscribe(leaderboard_id)
+        if channel.error is not None:
+            raise channel.error
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        queue.put_nowait(channel.snapshot())
+        channel.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, leaderboard_id, queue):
+        channel = self.channels.get(leaderboard_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        if not channel.subscribers:
+            channel.task.cancel()
+            del self.channels[leaderboard_id]
+
+    async def _run(self, channel):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                message = await channel.poll()
+            except Exception:
+                # Keep streaming; the next successful poll catches up
+                logger.exception('Polling leaderboard %s failed', channel.leaderboard_id)
+                continue
+            if message is not None:
+                channel.publish(message)
+
+
+hub = LeaderboardHub()
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+def _check_access(request):
+    """
+    Run session/auth middleware, then the authentication, permission and
+    throttle checks of the async API. Returns None when the stream may be
+    opened, else (status code, body, headers) to reject it with.
+    """
+    SessionMiddleware(lambda request: None).process_request(request)
+    AuthenticationMiddleware(lambda request: None).process_request(request)
+    drf_request = api_request(request)
+    try:
+        check_access(drf_request)
+    except exceptions.APIException as exc:
+        return error_status(exc, drf_request), {'detail': exc.detail}, error_headers(exc)
+    return None
+
+
+async def _send_json(send, status_code, data, headers=None):
+    await send({
+        'type': 'http.response.start',
+        'status': status_code,
+        'headers': [(b'content-type', b'application/json')] + [
+            (name.lower().encode(), value.encode()) for name, value in (headers or {}).items()
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps(data).encode()})
+
+
+async def leaderboard_stream(scope, receive, send, leaderboard_id, hub=hub):
+    """ASGI endpoint streaming snapshot/update events for one leaderboard"""
+    if scope['method'] != 'GET':
+        await _send_json(send, 405, {'detail': f'Method "{scope["method"]}" not allowed.'})
+        return
+    request = ASGIRequest(scope, io.BytesIO())
+    rejected = await sync_to_async(_check_access)(request)
+    if rejected is not None:
+        await _send_json(send, *rejected)
+        return
+    if not await Leaderboard.objects.filter(pk=leaderboard_id).aexists():
+        await _send_json(send, 404, {'detail': 'Not found.'})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+    queue = await hub.subscribe(leaderboard_id)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        while True:
+            message = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {message, disconnected}, timeout=HEARTBEAT_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnected in done:
+                message.cancel()
+                break
+            if message in done:
+                body = format_event(*message.result())
+            else:
+                message.cancel()
+                body = b': keepalive\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        hub.unsubscribe(leaderboard_id, queue)
+        disconnected.cancel()
+    await send({'type': 'http.response.body'})
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def route(scope):
+    """Leaderboard id if an ASGI scope addresses the stream endpoint, else None"""
+    if scope['type'] != 'http':
+        return None
+    match = STREAM_PATH.match(scope['path'])
+    return int(match['pk']) if match else None
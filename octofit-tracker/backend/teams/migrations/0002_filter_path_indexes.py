@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('teams', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['leaderboard', 'points'], name='teams_leade_leaderb_5649a2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['rank', 'id'], name='teams_leade_rank_bbc5a6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teammembership',
+            index=models.Index(fields=['role', 'team'], name='teams_teamm_role_c6d54b_idx'),
+        ),
+    ]
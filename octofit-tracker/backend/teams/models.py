@@ -20,7 +20,15 @@ class Team(models.Model):
     
     @property
     def member_count(self):
+        """Number of members, taken from the queryset annotation when present"""
+        annotated = getattr(self, '_member_count', None)
+        if annotated is not None:
+            return annotated
         return self.members.count()
+    
+    @member_count.setter
+    def member_count(self, value):
+        self._member_count = value
 
 
 class TeamMembership(models.Model):
@@ -39,6 +47,14 @@ class TeamMembership(models.Model):
     class Meta:
         unique_together = ('team', 'user')
         ordering = ['-joined_at']
+        indexes = [
+            # Member pages of a team
+            models.Index(fields=['team', 'joined_at', 'id']),
+            # Teams of a user (my_teams, leaderboard updates on activity writes)
+            models.Index(fields=['user', 'team']),
+            # ?role= alone or with ?team=
+            models.Index(fields=['role', 'team']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.team.name} ({self.role})"
@@ -68,6 +84,52 @@ class LeaderboardEntry(models.Model):
     class Meta:
         unique_together = ('leaderboard', 'user')
         ordering = ['rank']
+        indexes = [
+            # Standings of a leaderboard, keyset-paginated on (rank, id)
+            models.Index(fields=['leaderboard', 'rank', 'id']),
+            # A leaderboard ordered by ?ordering=points
+            models.Index(fields=['leaderboard', 'points']),
+            # Unfiltered standings, keyset-paginated on (rank, id)
+            models.Index(fields=['rank', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - Rank {self.rank}"
+
+
+class RankingScore(models.Model):
+    """All-time points of a user or team in the global ranking, maintained by teams/ranking.py"""
+    SCOPE_CHOICES = [
+        ('user', 'User'),
+        ('team', 'Team'),
+    ]
+    
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES)
+    object_id = models.IntegerField()
+    points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('scope', 'object_id')
+        indexes = [
+            models.Index(fields=['scope', 'points', 'object_id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.scope} {self.object_id} - {self.points} points"
+
+
+class RankingNode(models.Model):
+    """
+    Node of a Fenwick tree counting the ranked users or teams per points
+    value. Only nodes that were ever touched are stored.
+    """
+    scope = models.CharField(max_length=10, choices=RankingScore.SCOPE_CHOICES)
+    node = models.BigIntegerField()
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('scope', 'node')
+    
+    def __str__(self):
+        return f"{self.scope} node {self.node} = {self.count}"
@@ -0,0 +1,224 @@
+"""
+Global cross-team ranking of users and teams by all-time points.
+
+Every ranked user or team has a RankingScore row, and a Fenwick tree over
+the points values (RankingNode rows) counts how many of them hold each
+value. Counting everyone ahead of a points value therefore reads at most
+one node per bit of the value, in a single query, instead of a
+COUNT(points > x) over all scores, and moving a score updates one
+root-ward path of nodes. Only touched nodes are stored, so the tree stays
+small however large the points domain.
+
+Top-K and neighbour lists are range scans over the (scope, points,
+object_id) index. Users and teams without a score have zero points and
+share the last rank.
+"""
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q, Sum
+
+from .models import LeaderboardEntry, RankingNode, RankingScore
+
+# Points above 2**31 - 1 are ranked as ties at the top
+DOMAIN_BITS = 31
+DOMAIN_SIZE = 1 << DOMAIN_BITS
+
+
+def _index(points):
+    """1-based tree index of a points value"""
+    return min(max(int(points), 0), DOMAIN_SIZE - 1) + 1
+
+
+def _update_path(index):
+    """Nodes covering an index, from the leaf up to the root"""
+    path = []
+    while index <= DOMAIN_SIZE:
+        path.append(index)
+        index += index & -index
+    return path
+
+
+def _prefix_path(index):
+    """Nodes whose counts sum to the number of scores at indexes <= index"""
+    path = []
+    while index > 0:
+        path.append(index)
+        index -= index & -index
+    return path
+
+
+def _move(scope, old_points, new_points):
+    """Move one score between points values; None means not ranked"""
+    old_path = set(_update_path(_index(old_points))) if old_points is not None else set()
+    new_path = set(_update_path(_index(new_points))) if new_points is not None else set()
+    # Nodes on both paths keep their count
+    removed, added = old_path - new_path, new_path - old_path
+    if removed:
+        RankingNode.objects.filter(scope=scope, node__in=removed).update(count=F('count') - 1)
+    if added:
+        _create_nodes(scope, added)
+        RankingNode.objects.filter(scope=scope, node__in=added).update(count=F('count') + 1)
+
+
+def _create_nodes(scope, nodes):
+    """Create the missing nodes at zero, so concurrent writers only ever increment"""
+    if connection.features.supports_ignore_conflicts:
+        RankingNode.objects.bulk_create(
+            [RankingNode(scope=scope, node=node) for node in nodes], ignore_conflicts=True
+        )
+        return
+    # djongo would send a plain insert and fail on the (scope, node) index
+    existing = set(RankingNode.objects.filter(scope=scope, node__in=nodes).values_list('node', flat=True))
+    missing = [RankingNode(scope=scope, node=node) for node in nodes if node not in existing]
+    if not missing:
+        return
+    try:
+        with transaction.atomic():
+            RankingNode.objects.bulk_create(missing)
+    except IntegrityError:
+        # A concurrent writer created some of them; create the rest one by one
+        for node in missing:
+            try:
+                with transaction.atomic():
+                    RankingNode.objects.create(scope=scope, node=node.node)
+            except IntegrityError:
+                pass
+
+
+def _change(scope, object_id, update):
+    with transaction.atomic():
+        score, created = RankingScore.objects.select_for_update().get_or_create(
+            scope=scope, object_id=object_id
+        )
+        old_points = None if created else score.points
+        new_points = update(score.points)
+        if new_points == old_points:
+            return
+        RankingScore.objects.filter(pk=score.pk).update(points=new_points)
+        _move(scope, old_points, new_points)
+
+
+def add_points(scope, object_id, points):
+    """Add points (possibly negative) to a user's or team's score"""
+    if points:
+        _change(scope, object_id, lambda current: current + points)
+
+
+def set_points(scope, object_id, points):
+    _change(scope, object_id, lambda current: points)
+
+
+def discard(scope, object_id):
+    """Remove a deleted user or team from the ranking"""
+    with transaction.atomic():
+        score = RankingScore.objects.select_for_update().filter(scope=scope, object_id=object_id).first()
+        if score is not None:
+            score.delete()
+            _move(scope, score.points, None)
+
+
+def count_ahead(scope, points_values):
+    """
+    (number of scores, {points: number of scores with more points}) for
+    several points values, in one query
+    """
+    indexes = {points: _index(points) for points in points_values}
+    nodes = {DOMAIN_SIZE}
+    for index in indexes.values():
+        nodes.update(_prefix_path(index))
+    counts = dict(
+        RankingNode.objects.filter(scope=scope, node__in=nodes).values_list('node', 'count')
+    )
+    ranked = counts.get(DOMAIN_SIZE, 0)
+    return ranked, {
+        # Scores are ranked at zero or above, so everyone is ahead of a negative value
+        points: ranked if points < 0 else ranked - sum(counts.get(node, 0) for node in _prefix_path(index))
+        for points, index in indexes.items()
+    }
+
+
+def _rows(scores):
+    return [{'object_id': object_id, 'points': points} for object_id, points in scores]
+
+
+def top(scope, limit):
+    """The limit highest scores, ranked; ties share a rank and are ordered by id"""
+    rows = _rows(
+        RankingScore.objects.filter(scope=scope)
+        .order_by('-points', 'object_id').values_list('object_id', 'points')[:limit]
+    )
+    # Everyone ahead of a row is earlier in the list, so no counts are needed
+    for position, row in enumerate(rows):
+        if position and row['points'] == rows[position - 1]['points']:
+            row['rank'] = rows[position - 1]['rank']
+        else:
+            row['rank'] = position + 1
+    return rows
+
+
+def around(scope, object_id, neighbours):
+    """
+    Rank of one user or team with up to `neighbours` scores directly above
+    and below it. Costs four queries whatever the number of scores.
+    """
+    points = (
+        RankingScore.objects.filter(scope=scope, object_id=object_id)
+        .values_list('points', flat=True).first()
+    ) or 0
+    scores = RankingScore.objects.filter(scope=scope).exclude(object_id=object_id)
+    above = _rows(reversed(
+        scores.filter(Q(points__gt=points) | Q(points=points, object_id__lt=object_id))
+        .order_by('points', '-object_id').values_list('object_id', 'points')[:neighbours]
+    ))
+    below = _rows(
+        scores.filter(Q(points__lt=points) | Q(points=points, object_id__gt=object_id))
+        .order_by('-points', 'object_id').values_list('object_id', 'points')[:neighbours]
+    )
+    me = {'object_id': object_id, 'points': points}
+    ranked, ahead = count_ahead(scope, {row['points'] for row in [*above, me, *below]})
+    for row in [*above, me, *below]:
+        row['rank'] = ahead[row['points']] + 1
+    return {**me, 'ranked': ranked, 'above': above, 'below': below}
+
+
+def replace(scope, points_by_id, batch_size=5000):
+    """Replace all scores of a scope and rebuild its tree in bulk"""
+    histogram = {}
+    for points in points_by_id.values():
+        index = _index(points)
+        histogram[index] = histogram.get(index, 0) + 1
+    counts = {}
+    for index, count in histogram.items():
+        for node in _update_path(index):
+            counts[node] = counts.get(node, 0) + count
+
+    with transaction.atomic():
+        RankingScore.objects.filter(scope=scope).delete()
+        RankingNode.objects.filter(scope=scope).delete()
+        RankingScore.objects.bulk_create([
+            RankingScore(scope=scope, object_id=object_id, points=points)
+            for object_id, points in points_by_id.items()
+        ], batch_size=batch_size)
+        RankingNode.objects.bulk_create([
+            RankingNode(scope=scope, node=node, count=count) for node, count in counts.items()
+        ], batch_size=batch_size)
+
+
+def rebuild(chunk_size=2000):
+    """
+    Recompute user scores from the activity history and team scores from
+    the leaderboard entries. Returns (users ranked, teams ranked).
+    """
+    from activities.models import Activity
+    from .leaderboard import activity_points
+
+    user_points = {}
+    rows = Activity.objects.values_list('user_id', 'duration_minutes', 'calories_burned')
+    for user_id, duration, calories in rows.iterator(chunk_size=chunk_size):
+        user_points[user_id] = user_points.get(user_id, 0) + activity_points(duration, calories)
+    team_points = dict(
+        LeaderboardEntry.objects.values('leaderboard__team_id').annotate(total=Sum('points'))
+        .order_by().values_list('leaderboard__team_id', 'total')
+    )
+    replace('user', user_points)
+    replace('team', team_points)
+    return len(user_points), len(team_points)
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from octofit_tracker.serializers import DynamicFieldsMixin
 from .models import Team, TeamMembership, Leaderboard, LeaderboardEntry
 
 
@@ -10,7 +11,7 @@ class UserSimpleSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'first_name', 'last_name', 'email']
 
 
-class TeamMembershipSerializer(serializers.ModelSerializer):
+class TeamMembershipSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for TeamMembership model"""
     user = UserSimpleSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
@@ -25,8 +26,11 @@ class TeamMembershipSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'joined_at']
 
 
-class TeamSerializer(serializers.ModelSerializer):
-    """Serializer for Team model"""
+class TeamSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Serializer for Team model. Members are only embedded with
+    ?expand=members; /teams/{id}/members/ pages through them.
+    """
     owner = UserSimpleSerializer(read_only=True)
     owner_id = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.all(),
@@ -34,7 +38,7 @@ class TeamSerializer(serializers.ModelSerializer):
         source='owner'
     )
     members = UserSimpleSerializer(many=True, read_only=True)
-    member_count = serializers.SerializerMethodField()
+    member_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Team
@@ -43,12 +47,21 @@ class TeamSerializer(serializers.ModelSerializer):
             'member_count', 'logo_url', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'members']
+        expandable_fields = ['members']
+
+
+class MyTeamSerializer(TeamSerializer):
+    """Team of the requesting user with its stats, passed by the view as context['team_stats']"""
+    stats = serializers.SerializerMethodField()
+    
+    class Meta(TeamSerializer.Meta):
+        fields = TeamSerializer.Meta.fields + ['stats']
     
-    def get_member_count(self, obj):
-        return obj.members.count()
+    def get_stats(self, team):
+        return self.context['team_stats'][team.pk]
 
 
-class LeaderboardEntrySerializer(serializers.ModelSerializer):
+class LeaderboardEntrySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for LeaderboardEntry model"""
     user = UserSimpleSerializer(read_only=True)
     
@@ -62,9 +75,9 @@ class LeaderboardEntrySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'updated_at']
 
 
-class LeaderboardSerializer(serializers.ModelSerializer):
+class LeaderboardSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Leaderboard model"""
-    entries = LeaderboardEntrySerializer(many=True, read_only=True, source='entries')
+    entries = LeaderboardEntrySerializer(many=True, read_only=True)
     team_name = serializers.CharField(source='team.name', read_only=True)
     
     class Meta:
@@ -0,0 +1,142 @@
+"""
+Stats of a user's teams.
+
+For each team: the members' activity totals for a window and the user's
+rank among them, for a whole page of teams in one aggregation query.
+All-time totals and ranks are read from the LeaderboardEntry rows that
+activity writes keep up to date, grouped per leaderboard. A window
+joins each member of the teams to their ActivityRollup buckets in the
+window and sums them per (team, member); ranks then follow
+windowed_standings (points, then username). On MongoDB both run as
+native aggregation pipelines.
+"""
+from datetime import datetime, time
+
+from django.db import connection
+from django.db.models import F, FilteredRelation, Max, Q, Sum
+
+from activities.models import ActivityRollup
+from .models import LeaderboardEntry, TeamMembership
+from .windows import ALL_TIME, window_range
+
+TOTALS = ('points', 'activities_count', 'total_duration_minutes', 'total_calories_burned')
+
+
+def _all_time_mongo(leaderboard_ids, user_id):
+    connection.ensure_connection()
+    collection = connection.connection[LeaderboardEntry._meta.db_table]
+    rows = collection.aggregate([
+        {'$match': {'leaderboard_id': {'$in': leaderboard_ids}}},
+        {'$group': {
+            '_id': '$leaderboard_id',
+            **{total: {'$sum': f'${total}'} for total in TOTALS},
+            'rank': {'$max': {'$cond': [{'$eq': ['$user_id', user_id]}, '$rank', None]}},
+        }},
+    ])
+    return {row['_id']: row for row in rows}
+
+
+def _all_time_orm(leaderboard_ids, user_id):
+    rows = LeaderboardEntry.objects.filter(leaderboard_id__in=leaderboard_ids).values('leaderboard_id').annotate(
+        **{total: Sum(total) for total in TOTALS},
+        rank=Max('rank', filter=Q(user_id=user_id)),
+    ).order_by()
+    return {row['leaderboard_id']: row for row in rows}
+
+
+def _member_totals_mongo(team_ids, period, start, end):
+    connection.ensure_connection()
+    collection = connection.connection[TeamMembership._meta.db_table]
+    # djongo stores dates as midnight datetimes
+    start, end = datetime.combine(start, time.min), datetime.combine(end, time.min)
+    rollup_fields = {
+        'points': 'total_points',
+        'activities_count': 'activities_count',
+        'total_duration_minutes': 'total_duration_minutes',
+        'total_calories_burned': 'total_calories_burned',
+    }
+    return collection.aggregate([
+        {'$match': {'team_id': {'$in': team_ids}}},
+        {'$lookup': {
+            'from': ActivityRollup._meta.db_table,
+            'let': {'user_id': '$user_id'},
+            'pipeline': [{'$match': {'$expr': {'$and': [
+                {'$eq': ['$user_id', '$$user_id']},
+                {'$eq': ['$period', period]},
+                {'$gte': ['$period_start', start]},
+                {'$lte': ['$period_start', end]},
+            ]}}}],
+            'as': 'buckets',
+        }},
+        {'$lookup': {'from': 'auth_user', 'localField': 'user_id', 'foreignField': 'id', 'as': 'user'}},
+        {'$project': {
+            '_id': 0,
+            'team_id': 1,
+            'user_id': 1,
+            'username': {'$arrayElemAt': ['$user.username', 0]},
+            **{total: {'$sum': f'$buckets.{field}'} for total, field in rollup_fields.items()},
+        }},
+    ])
+
+
+def _member_totals_orm(team_ids, period, start, end):
+    return TeamMembership.objects.filter(team_id__in=team_ids).annotate(
+        # Conditions in the join, so members without buckets in the window stay
+        window=FilteredRelation('user__activity_rollups', condition=Q(
+            user__activity_rollups__period=period,
+            user__activity_rollups__period_start__gte=start,
+            user__activity_rollups__period_start__lte=end,
+        )),
+    ).values('team_id', 'user_id', username=F('user__username')).annotate(
+        points=Sum('window__total_points'),
+        activities_count=Sum('window__activities_count'),
+        total_duration_minutes=Sum('window__total_duration_minutes'),
+        total_calories_burned=Sum('window__total_calories_burned'),
+    ).order_by()
+
+
+def _stats(window, start, end, row, rank):
+    return {
+        'window': window,
+        'start': start,
+        'end': end,
+        **{total: row.get(total) or 0 for total in TOTALS},
+        'rank': rank,
+    }
+
+
+def team_stats(teams, user_id, window=ALL_TIME, today=None):
+    """
+    {team id: stats} for teams the user belongs to. The all-time rank is
+    the user's leaderboard rank, None while the user has no entry there.
+    """
+    teams = list(teams)
+    if not teams:
+        return {}
+    if window == ALL_TIME:
+        leaderboards = {}
+        for team in teams:
+            # select_related('leaderboard') saves a query per team
+            leaderboard = getattr(team, 'leaderboard', None)
+            if leaderboard is not None:
+                leaderboards[team.pk] = leaderboard.pk
+        aggregate = _all_time_mongo if connection.vendor == 'djongo' else _all_time_orm
+        rows = aggregate(list(leaderboards.values()), user_id)
+        stats = {}
+        for team in teams:
+            row = rows.get(leaderboards.get(team.pk), {})
+            stats[team.pk] = _stats(window, None, None, row, row.get('rank'))
+        return stats
+
+    period, start, end = window_range(window, today)
+    aggregate = _member_totals_mongo if connection.vendor == 'djongo' else _member_totals_orm
+    members = {team.pk: [] for team in teams}
+    for row in aggregate(list(members), period, start, end):
+        members[row['team_id']].append(row)
+    stats = {}
+    for team_id, rows in members.items():
+        rows.sort(key=lambda row: (-(row['points'] or 0), row['username']))
+        rank = next((position for position, row in enumerate(rows, 1) if row['user_id'] == user_id), None)
+        totals = {total: sum(row[total] or 0 for row in rows) for total in TOTALS}
+        stats[team_id] = _stats(window, start, end, totals, rank)
+    return stats
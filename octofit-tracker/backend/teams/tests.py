@@ -1,6 +1,23 @@
+import asyncio
+import json
+import random
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connection, transaction
 from django.test import TestCase
 from django.contrib.auth.models import User
-from .models import Team, TeamMembership, Leaderboard
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework.throttling import BaseThrottle
+from rest_framework.views import APIView
+from activities import rollups
+from activities.models import Activity
+from . import leaderboard, ranking
+from .models import Team, TeamMembership, Leaderboard, LeaderboardEntry, RankingNode, RankingScore
+from .leaderboard import ActivityDelta, apply_activity_delta, rebuild_leaderboard, record_activity_created
+from .live import LeaderboardHub, leaderboard_stream
 
 
 class TeamTestCase(TestCase):
@@ -64,3 +81,710 @@ class LeaderboardTestCase(TestCase):
     def test_leaderboard_string_representation(self):
         """Test the string representation of a leaderboard"""
         self.assertIn('Test Team', str(self.leaderboard))
+
+
+class LeaderboardEngineTestCase(TestCase):
+    """Test cases for incremental leaderboard maintenance"""
+    
+    def setUp(self):
+        """Set up a team with three ranked members"""
+        self.users = [
+            User.objects.create_user(username=f'user{i}', password='testpass123')
+            for i in range(3)
+        ]
+        self.team = Team.objects.create(name='Test Team', owner=self.users[0])
+        for user in self.users:
+            TeamMembership.objects.create(team=self.team, user=user)
+        self.leaderboard = Leaderboard.objects.create(team=self.team)
+        for rank, (user, points) in enumerate(zip(self.users, [300, 200, 100]), 1):
+            LeaderboardEntry.objects.create(
+                leaderboard=self.leaderboard, user=user, rank=rank, points=points
+            )
+        self.client = APIClient()
+    
+    def standings(self):
+        return list(
+            self.leaderboard.entries.order_by('rank').values_list('user__username', 'points')
+        )
+    
+    def post_activity(self, user, duration, calories=0):
+        self.client.force_authenticate(user)
+        response = self.client.post('/api/activities/', {
+            'user': user.id,
+            'activity_type': 'running',
+            'title': 'Run',
+            'duration_minutes': duration,
+            'calories_burned': calories,
+            'activity_date': timezone.now().isoformat(),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+    
+    def test_create_moves_entry_up(self):
+        """Test that an activity post re-ranks only the passed entries"""
+        self.post_activity(self.users[2], duration=120, calories=500)
+        self.assertEqual(self.standings(), [
+            ('user0', 300), ('user2', 270), ('user1', 200)
+        ])
+        entry = self.leaderboard.entries.get(user=self.users[2])
+        self.assertEqual(entry.activities_count, 1)
+        self.assertEqual(entry.total_duration_minutes, 120)
+        self.assertEqual(entry.total_calories_burned, 500)
+    
+    def test_update_and_delete_apply_deltas(self):
+        """Test that updates and deletes move an entry back down"""
+        activity_id = self.post_activity(self.users[2], duration=250)
+        self.assertEqual(self.standings()[0], ('user2', 350))
+        
+        self.client.patch(f'/api/activities/{activity_id}/', {'duration_minutes': 150})
+        self.assertEqual(self.standings(), [
+            ('user0', 300), ('user2', 250), ('user1', 200)
+        ])
+        
+        self.client.delete(f'/api/activities/{activity_id}/')
+        self.assertEqual(self.standings(), [
+            ('user0', 300), ('user1', 200), ('user2', 100)
+        ])
+        self.assertEqual(self.leaderboard.entries.get(user=self.users[2]).activities_count, 0)
+    
+    def test_bulk_ingest_applies_one_delta(self):
+        """Test that a bulk upload updates the entry by the batch total"""
+        self.client.force_authenticate(self.users[2])
+        items = [
+            {'activity_type': 'running', 'title': 'Run', 'duration_minutes': 75,
+             'calories_burned': 0, 'activity_date': timezone.now().isoformat()}
+            for _ in range(2)
+        ]
+        self.client.post('/api/activities/bulk/', items, format='json')
+        self.assertEqual(self.standings(), [
+            ('user0', 300), ('user2', 250), ('user1', 200)
+        ])
+        self.assertEqual(self.leaderboard.entries.get(user=self.users[2]).activities_count, 2)
+    
+    def test_interleaved_deltas(self):
+        """Test that a delta committed between another's read and write leaves consistent ranks"""
+        read_entry = leaderboard._entry_for_update
+        
+        def interleaved(leaderboard_id, user_id):
+            entry = read_entry(leaderboard_id, user_id)
+            if not interleaved.done:
+                interleaved.done = True
+                # Moves user2 to the top after the outer delta read rank 3
+                apply_activity_delta(self.users[2].id, ActivityDelta(points=250))
+            return entry
+        interleaved.done = False
+        
+        with mock.patch.object(leaderboard, '_entry_for_update', interleaved):
+            apply_activity_delta(self.users[2].id, ActivityDelta(points=-100))
+        self.assertEqual(self.standings(), [
+            ('user0', 300), ('user2', 250), ('user1', 200)
+        ])
+        self.assertEqual(list(self.leaderboard.entries.order_by('rank').values_list('rank', flat=True)), [1, 2, 3])
+    
+    def test_member_added_and_removed(self):
+        """Test that joining ranks a member by their totals and leaving closes the gap"""
+        newcomer = User.objects.create_user(username='user3', password='testpass123')
+        Activity.objects.create(
+            user=newcomer, activity_type='running', title='Run',
+            duration_minutes=150, calories_burned=500, activity_date=timezone.now()
+        )
+        self.client.force_authenticate(self.users[0])
+        url = f'/api/teams/teams/{self.team.id}/'
+        self.client.post(f'{url}add_member/', {'user_id': newcomer.id})
+        self.assertEqual(self.standings(), [
+            ('user0', 300), ('user1', 200), ('user3', 200), ('user2', 100)
+        ])
+        self.assertEqual(self.leaderboard.entries.get(user=newcomer).activities_count, 1)
+        self.assertEqual(RankingScore.objects.get(scope='team', object_id=self.team.id).points, 200)
+        
+        self.client.post(f'{url}remove_member/', {'user_id': self.users[0].id})
+        self.assertEqual(list(self.leaderboard.entries.order_by('rank').values_list('user__username', 'rank')), [
+            ('user1', 1), ('user3', 2), ('user2', 3)
+        ])
+    
+    def test_membership_endpoint_updates_entries(self):
+        """Test that memberships created and deleted directly also maintain entries"""
+        newcomer = User.objects.create_user(username='user3', password='testpass123')
+        self.client.force_authenticate(self.users[0])
+        response = self.client.post('/api/teams/memberships/', {'team': self.team.id, 'user_id': newcomer.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.standings()[-1], ('user3', 0))
+        self.client.delete(f"/api/teams/memberships/{response.data['id']}/")
+        self.assertFalse(self.leaderboard.entries.filter(user=newcomer).exists())
+    
+    def test_rebuild_leaderboard(self):
+        """Test that a rebuild ranks members by points from their activities"""
+        Activity.objects.create(
+            user=self.users[1], activity_type='cycling', title='Ride',
+            duration_minutes=60, calories_burned=400, activity_date=timezone.now()
+        )
+        rebuild_leaderboard(self.leaderboard)
+        self.assertEqual(self.standings(), [
+            ('user1', 100), ('user0', 0), ('user2', 0)
+        ])
+
+
+class TeamQueryBudgetTestCase(TestCase):
+    """Test that team and leaderboard endpoints run a fixed number of queries"""
+    
+    def setUp(self):
+        """Set up test user, API client and an empty response cache"""
+        caches['responses'].clear()
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.created = 0
+    
+    def add_teams(self, count):
+        for _ in range(count):
+            self.created += 1
+            team = Team.objects.create(name=f'Team {self.created}', owner=self.user)
+            leaderboard = Leaderboard.objects.create(team=team)
+            for rank in range(1, 4):
+                member = User.objects.create_user(username=f'member{self.created}_{rank}')
+                TeamMembership.objects.create(team=team, user=member)
+                LeaderboardEntry.objects.create(leaderboard=leaderboard, user=member, rank=rank)
+            TeamMembership.objects.create(team=team, user=self.user)
+    
+    def assert_budget(self, url, budget):
+        for count in (2, 8):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.add_teams(count)
+            with self.assertNumQueries(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+    
+    def test_team_list_query_budget(self):
+        """Test that owners are joined, counts annotated and members not loaded"""
+        self.assert_budget('/api/teams/teams/', 2)
+    
+    def test_expanded_team_list_query_budget(self):
+        self.assert_budget('/api/teams/teams/?expand=members', 3)
+    
+    def test_team_members_query_budget(self):
+        self.add_teams(1)
+        team = Team.objects.first()
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/teams/teams/{team.id}/members/')
+    
+    def test_my_teams_query_budget(self):
+        """Test that a page of teams and their stats take one query each"""
+        self.assert_budget('/api/teams/teams/my_teams/', 2)
+    
+    def test_windowed_my_teams_query_budget(self):
+        self.assert_budget('/api/teams/teams/my_teams/?window=week', 2)
+    
+    def test_membership_list_query_budget(self):
+        self.assert_budget('/api/teams/memberships/', 2)
+    
+    def test_leaderboard_list_query_budget(self):
+        """Test that entries and their users are prefetched"""
+        self.assert_budget('/api/teams/leaderboards/', 3)
+    
+    def test_leaderboard_entries_query_budget(self):
+        self.add_teams(1)
+        leaderboard = Leaderboard.objects.first()
+        with self.assertNumQueries(2):
+            self.client.get(f'/api/teams/leaderboards/{leaderboard.id}/entries/')
+    
+    def test_leaderboard_entry_list_query_budget(self):
+        self.assert_budget('/api/teams/leaderboard-entries/', 1)
+
+
+class CompactTeamTestCase(TestCase):
+    """Test cases for compact teams, member pages and field selection"""
+    
+    def setUp(self):
+        """Set up a team with more members than fit on one page"""
+        caches['responses'].clear()
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+        self.team = Team.objects.create(name='Big Team', owner=self.owner, description='Lots of us')
+        TeamMembership.objects.create(team=self.team, user=self.owner, role='owner')
+        for i in range(14):
+            TeamMembership.objects.create(team=self.team, user=User.objects.create_user(username=f'member{i}'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+    
+    def test_list_is_compact(self):
+        """Test that teams carry the owner and member count but no members"""
+        [team] = self.client.get('/api/teams/teams/').json()['results']
+        self.assertNotIn('members', team)
+        self.assertEqual(team['member_count'], 15)
+        self.assertEqual(team['owner']['username'], 'owner')
+    
+    def test_expand_members(self):
+        response = self.client.get(f'/api/teams/teams/{self.team.id}/?expand=members')
+        self.assertEqual(len(response.json()['members']), 15)
+    
+    def test_fields_selects_output(self):
+        """Test that ?fields= trims the top level but not nested objects"""
+        [team] = self.client.get('/api/teams/teams/?fields=id,owner').json()['results']
+        self.assertEqual(set(team), {'id', 'owner'})
+        self.assertIn('email', team['owner'])
+    
+    def test_fields_ignored_on_write(self):
+        response = self.client.post('/api/teams/teams/?fields=id', {'name': 'New', 'owner_id': self.owner.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Team.objects.get(pk=response.json()['id']).name, 'New')
+    
+    def test_members_are_paginated(self):
+        """Test that member pages follow join order with roles"""
+        url = f'/api/teams/teams/{self.team.id}/members/'
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(first['results'][0]['role'], 'owner')
+        self.assertEqual(first['results'][0]['user']['username'], 'owner')
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['next'])
+        usernames = {row['user']['username'] for row in first['results'] + second['results']}
+        self.assertEqual(len(usernames), 15)
+    
+    def test_members_of_missing_team(self):
+        self.assertEqual(self.client.get('/api/teams/teams/999/members/').status_code, 404)
+
+
+class TeamResponseCacheTestCase(TestCase):
+    """Test cases for cached team responses"""
+    
+    def setUp(self):
+        """Set up a team and an empty response cache"""
+        caches['responses'].clear()
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+        self.member = User.objects.create_user(username='member', password='testpass123')
+        self.team = Team.objects.create(name='Test Team', owner=self.owner)
+        self.team.members.add(self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = f'/api/teams/teams/{self.team.id}/'
+    
+    def test_membership_change_invalidates_team(self):
+        """Test that adding a member refreshes the cached team"""
+        self.assertEqual(self.client.get(self.url).json()['member_count'], 1)
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'HIT')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'{self.url}add_member/', {'user_id': self.member.id})
+        
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['member_count'], 2)
+    
+    def test_m2m_change_invalidates_team(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.team.members.remove(self.owner)
+        self.assertEqual(self.client.get(self.url).json()['member_count'], 0)
+    
+    def test_read_inside_transaction_does_not_outlive_commit(self):
+        """Test that a response cached before the commit is invalidated by it"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.team.name = 'Renamed Team'
+                self.team.save()
+                self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url)['X-Cache'], 'MISS')
+    
+    def test_other_teams_stay_cached(self):
+        """Test that invalidation only touches the changed team's detail"""
+        other = Team.objects.create(name='Other Team', owner=self.owner)
+        other_url = f'/api/teams/teams/{other.id}/'
+        self.client.get(other_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            TeamMembership.objects.create(team=self.team, user=self.member)
+        self.assertEqual(self.client.get(other_url)['X-Cache'], 'HIT')
+
+
+class RejectingThrottle(BaseThrottle):
+    """Throttle that turns every request away for a minute"""
+    
+    def allow_request(self, request, view):
+        return False
+    
+    def wait(self):
+        return 60
+
+
+class AsyncLeaderboardEntriesTestCase(TestCase):
+    """Test cases for the async-native leaderboard entries route"""
+    
+    def setUp(self):
+        """Set up a leaderboard with ranked entries"""
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+        team = Team.objects.create(name='Async Team', owner=self.owner)
+        self.leaderboard = Leaderboard.objects.create(team=team)
+        for rank in range(1, 6):
+            user = User.objects.create_user(username=f'member{rank}')
+            LeaderboardEntry.objects.create(
+                leaderboard=self.leaderboard, user=user, rank=rank, points=100 - rank
+            )
+        self.client.force_login(self.owner)
+    
+    def test_matches_sync_entries(self):
+        """Test that both routes return the same entries in rank order"""
+        api_client = APIClient()
+        api_client.force_authenticate(self.owner)
+        path = f'leaderboards/{self.leaderboard.id}/entries/?page_size=3'
+        response = self.client.get(f'/api/async/teams/{path}')
+        expected = api_client.get(f'/api/teams/{path}')
+        self.assertEqual(response.json()['results'], expected.json()['results'])
+        self.assertEqual([entry['rank'] for entry in response.json()['results']], [1, 2, 3])
+    
+    def test_unknown_leaderboard(self):
+        """Test that a missing leaderboard is a 404"""
+        response = self.client.get('/api/async/teams/leaderboards/999/entries/')
+        self.assertEqual(response.status_code, 404)
+    
+    def test_throttled(self):
+        """Test that the default throttles apply as on the sync route"""
+        with mock.patch.object(APIView, 'throttle_classes', [RejectingThrottle]):
+            response = self.client.get(f'/api/async/teams/leaderboards/{self.leaderboard.id}/entries/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+
+
+class LeaderboardPushTestCase(TestCase):
+    """Test cases for the leaderboard Server-Sent Events push"""
+    
+    def setUp(self):
+        """Set up a team of three with a leaderboard"""
+        self.users = [User.objects.create_user(username=f'member{i}', password='testpass123') for i in range(3)]
+        team = Team.objects.create(name='Live Team', owner=self.users[0])
+        for user in self.users:
+            TeamMembership.objects.create(team=team, user=user)
+        self.leaderboard = rebuild_leaderboard(Leaderboard.objects.create(team=team))
+        caches['responses'].clear()
+    
+    def log_burst(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for user, minutes in ((self.users[2], 30), (self.users[2], 30), (self.users[1], 45)):
+                record_activity_created(Activity.objects.create(
+                    user=user, activity_type='running', title='Run',
+                    duration_minutes=minutes, activity_date=timezone.now()
+                ))
+    
+    def test_burst_is_coalesced(self):
+        """Test that subscribers get a snapshot, then one message per burst"""
+        hub = LeaderboardHub(interval=0.05)
+        
+        async def watch():
+            queue = await hub.subscribe(self.leaderboard.id)
+            snapshot = queue.get_nowait()
+            await sync_to_async(self.log_burst)()
+            update = await asyncio.wait_for(queue.get(), timeout=2)
+            await asyncio.sleep(0.2)
+            pending = queue.qsize()
+            hub.unsubscribe(self.leaderboard.id, queue)
+            return snapshot, update, pending
+        
+        snapshot, (event, data), pending = async_to_sync(watch)()
+        self.assertEqual(snapshot[0], 'snapshot')
+        self.assertEqual(len(snapshot[1]['entries']), 3)
+        self.assertEqual(event, 'update')
+        self.assertEqual(pending, 0)
+        self.assertEqual(
+            [(change['username'], change['rank'], change['points']) for change in data['changes']],
+            [('member2', 1, 60), ('member1', 2, 45), ('member0', 3, 0)]
+        )
+        self.assertEqual(hub.watching(self.leaderboard.id), 0)
+    
+    def test_failed_load_wakes_waiting_subscribers(self):
+        """Test that subscribers waiting on a load that fails get its error instead of hanging"""
+        hub = LeaderboardHub(interval=0.05)
+        
+        async def failing_load(channel):
+            await asyncio.sleep(0.05)
+            raise RuntimeError('database unavailable')
+        
+        async def subscribe_twice():
+            return await asyncio.wait_for(asyncio.gather(
+                hub.subscribe(self.leaderboard.id), hub.subscribe(self.leaderboard.id), return_exceptions=True,
+            ), timeout=2)
+        
+        with mock.patch('teams.live._Channel.load', failing_load):
+            results = async_to_sync(subscribe_twice)()
+        self.assertEqual([str(result) for result in results], ['database unavailable'] * 2)
+        self.assertEqual(hub.channels, {})
+        
+        async def subscribe_again():
+            queue = await hub.subscribe(self.leaderboard.id)
+            hub.unsubscribe(self.leaderboard.id, queue)
+            return queue.get_nowait()
+        
+        self.assertEqual(async_to_sync(subscribe_again)()[0], 'snapshot')
+    
+    def stream(self, headers, until_events=1):
+        """Run the ASGI endpoint until it sent until_events events, then disconnect"""
+        sent = []
+        
+        async def run():
+            disconnect = asyncio.Event()
+            
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+            
+            async def send(message):
+                sent.append(message)
+                if message.get('body', b'').startswith(b'event:') and \
+                        sum(m.get('body', b'').startswith(b'event:') for m in sent) >= until_events:
+                    disconnect.set()
+            
+            scope = {
+                'type': 'http', 'method': 'GET', 'path': f'/api/live/teams/leaderboards/{self.leaderboard.id}/',
+                'query_string': b'', 'headers': headers, 'root_path': '', 'server': ('testserver', 80),
+            }
+            await asyncio.wait_for(
+                leaderboard_stream(scope, receive, send, self.leaderboard.id, hub=LeaderboardHub(interval=0.05)),
+                timeout=5,
+            )
+        
+        async_to_sync(run)()
+        return sent
+    
+    def test_stream_sends_snapshot(self):
+        """Test that an authenticated client receives the standings as an SSE event"""
+        self.client.force_login(self.users[0])
+        cookie = f"sessionid={self.client.cookies['sessionid'].value}".encode()
+        sent = self.stream([(b'cookie', cookie)])
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        event, data = sent[1]['body'].decode().split('\n')[:2]
+        self.assertEqual(event, 'event: snapshot')
+        self.assertEqual(len(json.loads(data[len('data: '):])['entries']), 3)
+    
+    def test_stream_requires_authentication(self):
+        """Test that anonymous clients are rejected before streaming"""
+        sent = self.stream([])
+        self.assertIn(sent[0]['status'], (401, 403))
+    
+    def test_stream_is_throttled(self):
+        """Test that throttled clients are rejected before streaming"""
+        self.client.force_login(self.users[0])
+        cookie = f"sessionid={self.client.cookies['sessionid'].value}".encode()
+        with mock.patch.object(APIView, 'throttle_classes', [RejectingThrottle]):
+            sent = self.stream([(b'cookie', cookie)])
+        self.assertEqual(sent[0]['status'], 429)
+        self.assertIn((b'retry-after', b'60'), sent[0]['headers'])
+
+
+class WindowedLeaderboardTestCase(TestCase):
+    """Test cases for time-windowed leaderboard standings"""
+    
+    def setUp(self):
+        """Set up a team whose members were active in different periods"""
+        self.users = [User.objects.create_user(username=name) for name in ('alice', 'bob', 'carol')]
+        team = Team.objects.create(name='Window Team', owner=self.users[0])
+        for user in self.users:
+            TeamMembership.objects.create(team=team, user=user)
+        self.leaderboard = Leaderboard.objects.create(team=team)
+        now = timezone.now()
+        for user, days_ago, minutes in ((self.users[0], 0, 30), (self.users[1], 0, 20),
+                                        (self.users[1], 40, 200), (self.users[2], 3, 50)):
+            rollups.record_activity_created(Activity.objects.create(
+                user=user, activity_type='running', title='Run', duration_minutes=minutes,
+                calories_burned=95, activity_date=now - timedelta(days=days_ago)
+            ))
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+    
+    def standings(self, window):
+        response = self.client.get(f'/api/teams/leaderboards/{self.leaderboard.id}/entries/?window={window}')
+        self.assertEqual(response.status_code, 200)
+        return [(entry['user']['username'], entry['rank'], entry['points']) for entry in response.data['results']]
+    
+    def test_day_window(self):
+        """Test that only today's buckets count, with idle members at zero"""
+        self.assertEqual(self.standings('day'), [('alice', 1, 39), ('bob', 2, 29), ('carol', 3, 0)])
+    
+    def test_rolling_window(self):
+        """Test that a rolling window sums the day buckets it covers"""
+        self.assertEqual(self.standings('7d'), [('carol', 1, 59), ('alice', 2, 39), ('bob', 3, 29)])
+        self.assertEqual(self.standings('30d')[0][0], 'carol')
+    
+    def test_window_is_paginated(self):
+        """Test that windowed standings are paged like all-time ones, with the window alongside"""
+        url = f'/api/teams/leaderboards/{self.leaderboard.id}/entries/?window=7d&page_size=2'
+        first = self.client.get(url).data
+        self.assertEqual(first['window'], '7d')
+        self.assertEqual([entry['rank'] for entry in first['results']], [1, 2])
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).data
+        self.assertEqual([entry['user']['username'] for entry in second['results']], ['bob'])
+        self.assertIsNone(second['next'])
+        self.assertEqual(
+            [entry['rank'] for entry in self.client.get(second['previous']).data['results']], [1, 2]
+        )
+    
+    def test_windowed_query_budget(self):
+        """Test that a window reads buckets, not activities, in a fixed number of queries"""
+        with self.assertNumQueries(3):
+            self.client.get(f'/api/teams/leaderboards/{self.leaderboard.id}/entries/?window=month')
+    
+    def test_invalid_window(self):
+        """Test that unknown windows are rejected"""
+        response = self.client.get(f'/api/teams/leaderboards/{self.leaderboard.id}/entries/?window=year')
+        self.assertEqual(response.status_code, 400)
+
+
+class TeamStatsTestCase(TestCase):
+    """Test cases for the stats of a user's teams"""
+    
+    def setUp(self):
+        """Set up two teams sharing members who were active in different periods"""
+        self.users = [User.objects.create_user(username=name) for name in ('alice', 'bob', 'carol')]
+        self.everyone = Team.objects.create(name='Everyone', owner=self.users[0])
+        self.pair = Team.objects.create(name='Pair', owner=self.users[0])
+        for team, members in ((self.everyone, self.users), (self.pair, [self.users[0], self.users[2]])):
+            Leaderboard.objects.create(team=team)
+            for user in members:
+                TeamMembership.objects.create(team=team, user=user)
+        now = timezone.now()
+        for user, days_ago, minutes in ((self.users[0], 0, 30), (self.users[1], 0, 20),
+                                        (self.users[1], 40, 200), (self.users[2], 3, 50)):
+            activity = Activity.objects.create(
+                user=user, activity_type='running', title='Run', duration_minutes=minutes,
+                calories_burned=95, activity_date=now - timedelta(days=days_ago)
+            )
+            rollups.record_activity_created(activity)
+            record_activity_created(activity)
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+    
+    def stats(self, window=None):
+        response = self.client.get('/api/teams/teams/my_teams/', {'window': window} if window else {})
+        self.assertEqual(response.status_code, 200)
+        return {team['name']: team['stats'] for team in response.data['results']}
+    
+    def test_all_time_stats(self):
+        """Test that all-time totals and ranks come from the leaderboards"""
+        stats = self.stats()
+        self.assertEqual(stats['Everyone']['points'], 39 + 29 + 209 + 59)
+        self.assertEqual(stats['Everyone']['total_duration_minutes'], 300)
+        self.assertEqual(stats['Everyone']['rank'], 3)
+        self.assertEqual(stats['Pair']['total_calories_burned'], 190)
+        self.assertEqual(stats['Pair']['rank'], 2)
+    
+    def test_window_stats(self):
+        """Test that a window sums the members' buckets in it and ranks within it"""
+        stats = self.stats('day')
+        self.assertEqual(stats['Everyone']['points'], 39 + 29)
+        self.assertEqual(stats['Everyone']['activities_count'], 2)
+        self.assertEqual(stats['Everyone']['rank'], 1)
+        self.assertEqual(stats['Pair']['total_duration_minutes'], 30)
+        self.assertEqual(self.stats('7d')['Pair']['rank'], 2)
+    
+    def test_member_without_activity(self):
+        """Test that a member with no activity is ranked in windows but not all-time"""
+        dave = User.objects.create_user(username='dave')
+        TeamMembership.objects.create(team=self.everyone, user=dave)
+        self.client.force_authenticate(dave)
+        self.assertEqual(self.stats('week')['Everyone']['rank'], 4)
+        self.assertIsNone(self.stats()['Everyone']['rank'])
+    
+    def test_teams_are_paginated(self):
+        """Test that teams come newest first, one keyset page at a time"""
+        first = self.client.get('/api/teams/teams/my_teams/?page_size=1').json()
+        self.assertEqual([team['name'] for team in first['results']], ['Pair'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([team['name'] for team in second['results']], ['Everyone'])
+        self.assertEqual(second['results'][0]['member_count'], 3)
+        self.assertIsNone(second['next'])
+    
+    def test_invalid_window(self):
+        response = self.client.get('/api/teams/teams/my_teams/?window=year')
+        self.assertEqual(response.status_code, 400)
+
+
+class GlobalRankingTestCase(TestCase):
+    """Test cases for the global cross-team ranking"""
+    
+    def setUp(self):
+        """Set up two teams whose members log activities"""
+        self.users = [User.objects.create_user(username=f'ranked{i}') for i in range(5)]
+        self.teams = []
+        for name, members in (('Red', self.users[:3]), ('Blue', self.users[3:])):
+            team = Team.objects.create(name=name, owner=members[0])
+            for user in members:
+                TeamMembership.objects.create(team=team, user=user)
+            Leaderboard.objects.create(team=team)
+            self.teams.append(team)
+        # Points: ranked0=40, ranked1=20, ranked2=0, ranked3=40, ranked4=60
+        for user, minutes in ((0, 40), (1, 20), (3, 40), (4, 60)):
+            record_activity_created(Activity.objects.create(
+                user=self.users[user], activity_type='running', title='Run',
+                duration_minutes=minutes, calories_burned=0, activity_date=timezone.now()
+            ))
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+    
+    def test_move_without_ignore_conflicts(self):
+        """Test that existing nodes are reused when bulk inserts cannot skip conflicts"""
+        path = ranking._update_path(ranking._index(1000))
+        with mock.patch.object(type(connection.features), 'supports_ignore_conflicts', False):
+            for _ in range(2):
+                ranking._move('team', None, 1000)
+        counts = dict(RankingNode.objects.filter(scope='team', node__in=path).values_list('node', 'count'))
+        # The root is shared with the teams of setUp
+        self.assertEqual(counts[path[0]], 2)
+        self.assertEqual(counts[path[-1]], 2 + len(self.teams))
+    
+    def test_top_users(self):
+        """Test that the top users span teams and ties share a rank"""
+        response = self.client.get('/api/teams/rankings/users/?limit=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(row['user']['username'], row['rank'], row['points']) for row in response.data['results']],
+            [('ranked4', 1, 60), ('ranked0', 2, 40), ('ranked3', 2, 40)]
+        )
+    
+    def test_my_rank_with_neighbours(self):
+        """Test the current user's rank and the users directly around it"""
+        response = self.client.get('/api/teams/rankings/users/me/?neighbours=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['rank'], response.data['points'], response.data['ranked']), (2, 40, 4))
+        self.assertEqual([row['user']['username'] for row in response.data['above']], ['ranked4'])
+        self.assertEqual([(row['user']['username'], row['rank']) for row in response.data['below']], [('ranked3', 2)])
+    
+    def test_unranked_user(self):
+        """Test that a user without points shares the last rank"""
+        self.client.force_authenticate(self.users[2])
+        response = self.client.get('/api/teams/rankings/users/me/')
+        self.assertEqual((response.data['rank'], response.data['points']), (5, 0))
+    
+    def test_team_ranking(self):
+        """Test that team scores sum their members' points"""
+        response = self.client.get('/api/teams/rankings/teams/')
+        self.assertEqual(
+            [(row['team']['name'], row['rank'], row['points']) for row in response.data['results']],
+            [('Blue', 1, 100), ('Red', 2, 60)]
+        )
+        response = self.client.get(f'/api/teams/rankings/teams/{self.teams[0].id}/')
+        self.assertEqual((response.data['rank'], response.data['above'][0]['team']['name']), (2, 'Blue'))
+        self.assertEqual(self.client.get('/api/teams/rankings/teams/999999/').status_code, 404)
+    
+    def test_deleted_team_leaves_ranking(self):
+        """Test that deleting a team removes its score"""
+        self.teams[1].delete()
+        self.assertFalse(RankingScore.objects.filter(scope='team', object_id=self.teams[1].id).exists())
+        self.assertEqual(ranking.count_ahead('team', [0])[0], 1)
+    
+    def test_rank_query_budget(self):
+        """Test that a rank is read in a fixed number of queries, not by counting scores"""
+        for user_id in range(10000, 10200):
+            ranking.add_points('user', user_id, user_id % 97)
+        with self.assertNumQueries(5):
+            self.client.get('/api/teams/rankings/users/me/?neighbours=3')
+    
+    def test_counts_match_scores(self):
+        """Test that the tree agrees with the scores after random moves and a rebuild"""
+        rng = random.Random(4)
+        for _ in range(300):
+            ranking.add_points('user', rng.randint(1, 40), rng.randint(-30, 200))
+        points = list(RankingScore.objects.filter(scope='user').values_list('points', flat=True))
+        probes = [-5, 0, 1, 50, 150, 10 ** 6]
+        expected = {probe: sum(1 for value in points if max(value, 0) > probe) for probe in probes}
+        self.assertEqual(ranking.count_ahead('user', probes), (len(points), expected))
+        
+        ranking.rebuild()
+        self.assertEqual(ranking.count_ahead('user', [0])[0], 4)
@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     TeamViewSet, TeamMembershipViewSet,
-    LeaderboardViewSet, LeaderboardEntryViewSet
+    LeaderboardViewSet, LeaderboardEntryViewSet, RankingViewSet
 )
 
 router = DefaultRouter()
@@ -10,6 +10,7 @@ router.register(r'teams', TeamViewSet)
 router.register(r'memberships', TeamMembershipViewSet)
 router.register(r'leaderboards', LeaderboardViewSet)
 router.register(r'leaderboard-entries', LeaderboardEntryViewSet)
+router.register(r'rankings', RankingViewSet, basename='ranking')
 
 urlpatterns = [
     path('', include(router.urls)),
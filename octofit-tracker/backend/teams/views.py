@@ -1,27 +1,83 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, Prefetch
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from octofit_tracker.cache import CachedResponseMixin
+from search.filters import IndexedSearchFilter
+from octofit_tracker.pagination import KeysetPagination
+from octofit_tracker.serializers import expanded
 from .models import Team, TeamMembership, Leaderboard, LeaderboardEntry
 from .serializers import (
-    TeamSerializer, TeamMembershipSerializer,
+    TeamSerializer, MyTeamSerializer, TeamMembershipSerializer, UserSimpleSerializer,
     LeaderboardSerializer, LeaderboardEntrySerializer
 )
+from . import ranking
+from .leaderboard import record_member_added, record_member_removed
+from .stats import team_stats
+from .windows import ALL_TIME, WINDOWS, windowed_standings
 
 
-class TeamViewSet(viewsets.ModelViewSet):
+class LeaderboardEntryPagination(KeysetPagination):
+    """Standings from the top, keyed on (rank, id)"""
+    ordering = ('rank', 'id')
+
+
+class WindowedStandingsPagination(KeysetPagination):
+    """Windowed standings from the top, keyed on their unique rank"""
+    ordering = ('rank',)
+
+
+class TeamMemberPagination(KeysetPagination):
+    """Members in the order they joined, keyed on (joined_at, id)"""
+    ordering = ('joined_at', 'id')
+
+
+class MyTeamsPagination(KeysetPagination):
+    """A user's teams, newest first, keyed on (created_at, id)"""
+    ordering = ('-created_at', '-id')
+
+
+class TeamViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     """
     API endpoint for teams.
     Users can create, join, and manage teams.
+    Teams come with their member count; members are paged through
+    /teams/{id}/members/ or embedded with ?expand=members.
     """
-    queryset = Team.objects.all()
+    cache_namespace = 'teams'
+    queryset = Team.objects.select_related('owner').annotate(
+        member_count=Count('members', distinct=True)
+    )
     serializer_class = TeamSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [filters.OrderingFilter, IndexedSearchFilter]
+    search_index_kind = 'team'
     search_fields = ['name', 'description']
     ordering_fields = ['created_at', 'name']
     ordering = ['-created_at']
     
+    def get_queryset(self):
+        """Load members only when they are embedded"""
+        if self.action == 'members':
+            return Team.objects.all()
+        queryset = super().get_queryset()
+        if expanded(self.request, 'members'):
+            queryset = queryset.prefetch_related('members')
+        return queryset
+    
+    @action(detail=True, methods=['get'])
+    def members(self, request, pk=None):
+        """Get the members of a team with their roles, one keyset page at a time"""
+        team = self.get_object()
+        memberships = TeamMembership.objects.filter(team=team).select_related('user')
+        paginator = TeamMemberPagination()
+        page = paginator.paginate_queryset(memberships, request, view=self)
+        serializer = TeamMembershipSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['post'])
     def add_member(self, request, pk=None):
         """Add a member to the team"""
@@ -36,11 +92,14 @@ class TeamViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            membership, created = TeamMembership.objects.get_or_create(
-                team=team,
-                user_id=user_id,
-                defaults={'role': role}
-            )
+            with transaction.atomic():
+                membership, created = TeamMembership.objects.get_or_create(
+                    team=team,
+                    user_id=user_id,
+                    defaults={'role': role}
+                )
+                if created:
+                    record_member_added(team.pk, membership.user_id)
             if created:
                 return Response(
                     {'message': 'Member added successfully'},
@@ -67,7 +126,9 @@ class TeamViewSet(viewsets.ModelViewSet):
         
         try:
             membership = TeamMembership.objects.get(team=team, user_id=user_id)
-            membership.delete()
+            with transaction.atomic():
+                membership.delete()
+                record_member_removed(team.pk, membership.user_id)
             return Response({'message': 'Member removed successfully'})
         except TeamMembership.DoesNotExist:
             return Response(
@@ -77,10 +138,23 @@ class TeamViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def my_teams(self, request):
-        """Get teams of the current user"""
-        teams = Team.objects.filter(members=request.user)
-        serializer = self.get_serializer(teams, many=True)
-        return Response(serializer.data)
+        """
+        Get teams of the current user with their stats, one keyset page at a time:
+        the members' activity totals for the window and the user's rank.
+        Query params: window (day|week|month|7d|30d|all, default all)
+        """
+        window = request.query_params.get('window', ALL_TIME)
+        if window != ALL_TIME and window not in WINDOWS:
+            return Response(
+                {'error': 'window must be one of: ' + ', '.join([*WINDOWS, ALL_TIME])},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        teams = self.get_queryset().select_related('leaderboard').filter(members=request.user)
+        paginator = MyTeamsPagination()
+        page = paginator.paginate_queryset(teams, request, view=self)
+        context = {**self.get_serializer_context(), 'team_stats': team_stats(page, request.user.pk, window)}
+        serializer = MyTeamSerializer(page, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
     
     def perform_create(self, serializer):
         """Create team with current user as owner"""
@@ -92,11 +166,32 @@ class TeamMembershipViewSet(viewsets.ModelViewSet):
     API endpoint for team memberships.
     Manage user roles within teams.
     """
-    queryset = TeamMembership.objects.all()
+    queryset = TeamMembership.objects.select_related('user')
     serializer_class = TeamMembershipSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['team', 'user', 'role']
+    
+    def perform_create(self, serializer):
+        """Create membership and rank the new member on the team's leaderboard"""
+        with transaction.atomic():
+            membership = serializer.save()
+            record_member_added(membership.team_id, membership.user_id)
+    
+    def perform_update(self, serializer):
+        """Update membership, moving the leaderboard entry if the team or user changed"""
+        old_team_id, old_user_id = serializer.instance.team_id, serializer.instance.user_id
+        with transaction.atomic():
+            membership = serializer.save()
+            if (membership.team_id, membership.user_id) != (old_team_id, old_user_id):
+                record_member_removed(old_team_id, old_user_id)
+                record_member_added(membership.team_id, membership.user_id)
+    
+    def perform_destroy(self, instance):
+        """Delete membership and drop the member's leaderboard entry"""
+        with transaction.atomic():
+            instance.delete()
+            record_member_removed(instance.team_id, instance.user_id)
 
 
 class LeaderboardViewSet(viewsets.ReadOnlyModelViewSet):
@@ -104,17 +199,46 @@ class LeaderboardViewSet(viewsets.ReadOnlyModelViewSet):
     API endpoint for leaderboards.
     View team competition leaderboards.
     """
-    queryset = Leaderboard.objects.all()
+    queryset = Leaderboard.objects.select_related('team').prefetch_related(
+        Prefetch('entries', queryset=LeaderboardEntry.objects.select_related('user'))
+    )
     serializer_class = LeaderboardSerializer
     permission_classes = [permissions.IsAuthenticated]
     
+    def get_queryset(self):
+        """Skip prefetching all entries when only one page of them is served"""
+        if self.action == 'entries':
+            return Leaderboard.objects.all()
+        return super().get_queryset()
+    
     @action(detail=True, methods=['get'])
     def entries(self, request, pk=None):
-        """Get leaderboard entries for a team"""
+        """
+        Get leaderboard entries for a team, one keyset page at a time.
+        Query params: window (day|week|month|7d|30d|all, default all)
+        """
         leaderboard = self.get_object()
-        entries = leaderboard.entries.all()
-        serializer = LeaderboardEntrySerializer(entries, many=True)
-        return Response(serializer.data)
+        window = request.query_params.get('window', ALL_TIME)
+        if window != ALL_TIME:
+            if window not in WINDOWS:
+                return Response(
+                    {'error': 'window must be one of: ' + ', '.join([*WINDOWS, ALL_TIME])},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            start, end, standings = windowed_standings(leaderboard, window)
+            paginator = WindowedStandingsPagination()
+            page = paginator.paginate_rows(standings, request, view=self)
+            return Response({
+                'window': window,
+                'start': start,
+                'end': end,
+                **paginator.get_paginated_data(page),
+            })
+        entries = LeaderboardEntry.objects.filter(leaderboard=leaderboard).select_related('user')
+        paginator = LeaderboardEntryPagination()
+        page = paginator.paginate_queryset(entries, request, view=self)
+        serializer = LeaderboardEntrySerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class LeaderboardEntryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -122,10 +246,83 @@ class LeaderboardEntryViewSet(viewsets.ReadOnlyModelViewSet):
     API endpoint for leaderboard entries.
     View individual leaderboard standings.
     """
-    queryset = LeaderboardEntry.objects.all()
+    queryset = LeaderboardEntry.objects.select_related('user')
     serializer_class = LeaderboardEntrySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = LeaderboardEntryPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['leaderboard', 'user']
     ordering_fields = ['rank', 'points', 'activities_count']
     ordering = ['rank']
+
+
+def _bounded(request, name, default, maximum):
+    try:
+        value = int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+    return max(1, min(value, maximum))
+
+
+class RankingViewSet(viewsets.ViewSet):
+    """
+    API endpoint for the global ranking across all teams.
+    Top users and teams, and the rank of a user or team with its neighbours.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    default_limit = 10
+    max_limit = 100
+    default_neighbours = 5
+    max_neighbours = 50
+    
+    def _users(self, rows):
+        users = User.objects.in_bulk([row['object_id'] for row in rows])
+        return [
+            {'rank': row['rank'], 'points': row['points'],
+             'user': UserSimpleSerializer(users[row['object_id']]).data if row['object_id'] in users else None}
+            for row in rows
+        ]
+    
+    def _teams(self, rows):
+        names = dict(Team.objects.filter(pk__in=[row['object_id'] for row in rows]).values_list('id', 'name'))
+        return [
+            {'rank': row['rank'], 'points': row['points'],
+             'team': {'id': row['object_id'], 'name': names.get(row['object_id'])}}
+            for row in rows
+        ]
+    
+    def _around(self, scope, object_id, describe):
+        neighbours = _bounded(self.request, 'neighbours', self.default_neighbours, self.max_neighbours)
+        position = ranking.around(scope, object_id, neighbours)
+        above = position['above']
+        rows = describe([*above, position, *position['below']])
+        return Response({
+            'ranked': position['ranked'],
+            **rows[len(above)],
+            'above': rows[:len(above)],
+            'below': rows[len(above) + 1:],
+        })
+    
+    @action(detail=False, methods=['get'])
+    def users(self, request):
+        """Top users by all-time points. Query params: limit (default 10, max 100)"""
+        limit = _bounded(request, 'limit', self.default_limit, self.max_limit)
+        return Response({'results': self._users(ranking.top('user', limit))})
+    
+    @action(detail=False, methods=['get'], url_path='users/me')
+    def my_rank(self, request):
+        """Rank of the current user with the users around it. Query params: neighbours (default 5, max 50)"""
+        return self._around('user', request.user.pk, self._users)
+    
+    @action(detail=False, methods=['get'])
+    def teams(self, request):
+        """Top teams by all-time points. Query params: limit (default 10, max 100)"""
+        limit = _bounded(request, 'limit', self.default_limit, self.max_limit)
+        return Response({'results': self._teams(ranking.top('team', limit))})
+    
+    @action(detail=False, methods=['get'], url_path=r'teams/(?P<team_id>[0-9]+)')
+    def team_rank(self, request, team_id=None):
+        """Rank of a team with the teams around it. Query params: neighbours (default 5, max 50)"""
+        if not Team.objects.filter(pk=team_id).exists():
+            return Response({'error': 'Team not found'}, status=status.HTTP_404_NOT_FOUND)
+        return self._around('team', int(team_id), self._teams)
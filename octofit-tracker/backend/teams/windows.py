@@ -0,0 +1,79 @@
+"""
+Time-windowed leaderboards.
+
+Standings for a window are summed from the members' ActivityRollup
+buckets (day, ISO week or month), which activity writes already keep up
+to date. A window is just a range of bucket keys: when a period rolls
+over, the new range starts from empty buckets and the old ones simply
+fall outside it, so reading a window costs O(members x buckets in the
+window) no matter how many activities were logged.
+"""
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Sum
+from django.utils import timezone
+
+from activities.models import ActivityRollup
+from activities.rollups import bucket_start
+
+# window -> (rollup period, number of buckets); calendar windows cover the
+# current period, rolling windows the last N days including today
+WINDOWS = {
+    'day': ('day', 1),
+    'week': ('week', 1),
+    'month': ('month', 1),
+    '7d': ('day', 7),
+    '30d': ('day', 30),
+}
+
+ALL_TIME = 'all'
+
+
+def window_range(window, today=None):
+    """(period, first bucket start, last bucket start) of a window"""
+    period, buckets = WINDOWS[window]
+    today = today or timezone.localdate()
+    end = bucket_start(period, today)
+    return period, end - timedelta(days=buckets - 1), end
+
+
+def windowed_standings(leaderboard, window, today=None):
+    """
+    Ranked standings of a team for a window, one row per member. Members
+    without activity in the window are listed with zero points; ties are
+    ranked by username.
+    """
+    period, start, end = window_range(window, today)
+    members = list(
+        User.objects.filter(teams=leaderboard.team_id)
+        .values('id', 'username', 'first_name', 'last_name', 'email')
+    )
+    totals = {
+        row['user_id']: row
+        for row in ActivityRollup.objects.filter(
+            user_id__in=[member['id'] for member in members],
+            period=period, period_start__gte=start, period_start__lte=end,
+        ).values('user_id').annotate(
+            points=Sum('total_points'),
+            activities_count=Sum('activities_count'),
+            total_duration_minutes=Sum('total_duration_minutes'),
+            total_calories_burned=Sum('total_calories_burned'),
+        ).order_by()
+    }
+
+    standings = []
+    for member in members:
+        row = totals.get(member['id'], {})
+        standings.append({
+            'leaderboard': leaderboard.pk,
+            'user': member,
+            'points': row.get('points') or 0,
+            'activities_count': row.get('activities_count') or 0,
+            'total_duration_minutes': row.get('total_duration_minutes') or 0,
+            'total_calories_burned': row.get('total_calories_burned') or 0,
+        })
+    standings.sort(key=lambda entry: (-entry['points'], entry['user']['username']))
+    for rank, entry in enumerate(standings, 1):
+        entry['rank'] = rank
+    return start, end, standings
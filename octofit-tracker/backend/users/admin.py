@@ -4,10 +4,14 @@ from .models import UserProfile
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'age', 'fitness_level', 'total_workouts', 'created_at')
+    list_display = ('user', 'age', 'fitness_level', 'total_workouts', 'total_activities', 'last_activity_at', 'created_at')
     list_filter = ('fitness_level', 'created_at')
     search_fields = ('user__username', 'user__email')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = (
+        'total_workouts', 'total_activities', 'total_duration_minutes',
+        'total_calories_burned', 'total_distance_km', 'last_activity_at',
+        'created_at', 'updated_at'
+    )
     fieldsets = (
         ('User', {
             'fields': ('user',)
@@ -16,7 +20,11 @@ class UserProfileAdmin(admin.ModelAdmin):
             'fields': ('bio', 'gender', 'age', 'height_cm', 'weight_kg')
         }),
         ('Fitness Info', {
-            'fields': ('fitness_level', 'total_workouts', 'total_activities')
+            'fields': (
+                'fitness_level', 'total_workouts', 'total_activities',
+                'total_duration_minutes', 'total_calories_burned',
+                'total_distance_km', 'last_activity_at'
+            )
         }),
         ('Social', {
             'fields': ('profile_picture', 'bio_link')
@@ -0,0 +1,15 @@
+"""Async variant of the current user's profile endpoint (see octofit_tracker/async_api.py)"""
+from rest_framework import status
+from octofit_tracker.async_api import async_api_view, render
+from .models import UserProfile
+from .serializers import UserProfileSerializer
+
+
+@async_api_view
+async def my_profile(request):
+    """Current user's profile, including its maintained activity totals"""
+    try:
+        profile = await UserProfile.objects.select_related('user').aget(user=request.user)
+    except UserProfile.DoesNotExist:
+        return render({'error': 'User profile not found'}, status.HTTP_404_NOT_FOUND)
+    return UserProfileSerializer(profile).data
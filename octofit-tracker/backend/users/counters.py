@@ -0,0 +1,192 @@
+"""
+Denormalized activity counters on UserProfile.
+
+Activity writes adjust the owner's profile with F() expressions, so the
+totals are always read from a single row. reconcile() recomputes them
+from the activity history to repair drift (e.g. rows written outside
+the API).
+"""
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+
+from django.db.models import F, Max, Q
+
+from .models import UserProfile
+
+# Activity types that count as a workout session (strength and flexibility training)
+WORKOUT_ACTIVITY_TYPES = ('gym', 'yoga')
+
+COUNTER_FIELDS = (
+    'total_activities', 'total_workouts', 'total_duration_minutes',
+    'total_calories_burned', 'total_distance_km', 'last_activity_at',
+)
+
+
+@dataclass(frozen=True)
+class CounterDelta:
+    """Change an activity write makes to its owner's profile counters"""
+    total_activities: int = 0
+    total_workouts: int = 0
+    total_duration_minutes: int = 0
+    total_calories_burned: float = 0
+    total_distance_km: float = 0
+
+    @classmethod
+    def for_activity(cls, activity):
+        return cls(
+            total_activities=1,
+            total_workouts=1 if activity.activity_type in WORKOUT_ACTIVITY_TYPES else 0,
+            total_duration_minutes=activity.duration_minutes,
+            total_calories_burned=activity.calories_burned or 0,
+            total_distance_km=activity.distance_km or 0,
+        )
+
+    def __neg__(self):
+        return CounterDelta(*(-getattr(self, f.name) for f in fields(self)))
+
+    def __add__(self, other):
+        return CounterDelta(*(getattr(self, f.name) + getattr(other, f.name) for f in fields(self)))
+
+    def __sub__(self, other):
+        return self + (-other)
+
+    def __bool__(self):
+        return any(getattr(self, f.name) for f in fields(self))
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Counter-relevant state of an activity before an update"""
+    user_id: int
+    delta: CounterDelta
+    activity_date: datetime
+
+
+def apply(user_id, delta):
+    """Add a delta to a user's counters in a single UPDATE"""
+    if not delta:
+        return
+    UserProfile.objects.filter(user_id=user_id).update(**{
+        f.name: F(f.name) + getattr(delta, f.name) for f in fields(delta)
+    })
+
+
+def _advance_last_activity(user_id, activity_date):
+    # Conditional update, so concurrent writers can only move it forward
+    UserProfile.objects.filter(user_id=user_id).filter(
+        Q(last_activity_at__isnull=True) | Q(last_activity_at__lt=activity_date)
+    ).update(last_activity_at=activity_date)
+
+
+def _refresh_last_activity(user_id, removed_date, exclude_pk=None):
+    """Recompute last_activity_at if it pointed at a removed or moved activity"""
+    from activities.models import Activity
+
+    activities = Activity.objects.filter(user_id=user_id)
+    if exclude_pk is not None:
+        activities = activities.exclude(pk=exclude_pk)
+    latest = activities.aggregate(latest=Max('activity_date'))['latest']
+    UserProfile.objects.filter(user_id=user_id, last_activity_at=removed_date).update(last_activity_at=latest)
+
+
+def record_activity_created(activity):
+    apply(activity.user_id, CounterDelta.for_activity(activity))
+    _advance_last_activity(activity.user_id, activity.activity_date)
+
+
+def record_activities_created(activities):
+    """Apply a batch of new activities with one update per user"""
+    deltas = {}
+    latest = {}
+    for activity in activities:
+        deltas[activity.user_id] = deltas.get(activity.user_id, CounterDelta()) + CounterDelta.for_activity(activity)
+        latest[activity.user_id] = max(latest.get(activity.user_id, activity.activity_date), activity.activity_date)
+    for user_id, delta in deltas.items():
+        apply(user_id, delta)
+        _advance_last_activity(user_id, latest[user_id])
+
+
+def record_activity_deleted(activity):
+    """Call before the activity row is deleted"""
+    apply(activity.user_id, -CounterDelta.for_activity(activity))
+    _refresh_last_activity(activity.user_id, activity.activity_date, exclude_pk=activity.pk)
+
+
+def snapshot(activity):
+    return Snapshot(activity.user_id, CounterDelta.for_activity(activity), activity.activity_date)
+
+
+def record_activity_updated(old, activity):
+    """Apply the difference between a snapshot and the saved activity"""
+    new_delta = CounterDelta.for_activity(activity)
+    if old.user_id == activity.user_id:
+        apply(activity.user_id, new_delta - old.delta)
+    else:
+        apply(old.user_id, -old.delta)
+        apply(activity.user_id, new_delta)
+
+    if old.user_id != activity.user_id or activity.activity_date < old.activity_date:
+        _refresh_last_activity(old.user_id, old.activity_date)
+    _advance_last_activity(activity.user_id, activity.activity_date)
+
+
+def totals_for(user_ids, chunk_size=2000):
+    """Counters recomputed from the activity history, keyed by user id"""
+    from activities.models import Activity
+
+    totals = {user_id: dict(asdict(CounterDelta()), last_activity_at=None) for user_id in user_ids}
+    rows = Activity.objects.filter(user_id__in=user_ids).values_list(
+        'user_id', 'activity_type', 'duration_minutes', 'calories_burned', 'distance_km', 'activity_date'
+    )
+    for user_id, activity_type, duration, calories, distance, activity_date in rows.iterator(chunk_size=chunk_size):
+        user_totals = totals[user_id]
+        user_totals['total_activities'] += 1
+        user_totals['total_workouts'] += activity_type in WORKOUT_ACTIVITY_TYPES
+        user_totals['total_duration_minutes'] += duration
+        user_totals['total_calories_burned'] += calories or 0
+        user_totals['total_distance_km'] += distance or 0
+        if user_totals['last_activity_at'] is None or activity_date > user_totals['last_activity_at']:
+            user_totals['last_activity_at'] = activity_date
+    return totals
+
+
+def _drifted(profile, totals, tolerance=1e-6):
+    for name in COUNTER_FIELDS:
+        stored, actual = getattr(profile, name), totals[name]
+        if isinstance(actual, float) or isinstance(stored, float):
+            if abs((stored or 0) - actual) > tolerance:
+                return True
+        elif stored != actual:
+            return True
+    return False
+
+
+def reconcile(user_ids=None, batch_size=500, dry_run=False):
+    """
+    Recompute the counters of all profiles (or only user_ids) in batches of
+    batch_size profiles, fixing those that drifted. Returns (checked, fixed).
+    """
+    profiles = UserProfile.objects.order_by('user_id').only('id', 'user_id', *COUNTER_FIELDS)
+    if user_ids is not None:
+        profiles = profiles.filter(user_id__in=user_ids)
+
+    checked = fixed = 0
+    last_user_id = None
+    while True:
+        batch = profiles if last_user_id is None else profiles.filter(user_id__gt=last_user_id)
+        batch = list(batch[:batch_size])
+        if not batch:
+            break
+        last_user_id = batch[-1].user_id
+        totals = totals_for([profile.user_id for profile in batch])
+        drifted = []
+        for profile in batch:
+            if _drifted(profile, totals[profile.user_id]):
+                for name in COUNTER_FIELDS:
+                    setattr(profile, name, totals[profile.user_id][name])
+                drifted.append(profile)
+        if drifted and not dry_run:
+            UserProfile.objects.bulk_update(drifted, COUNTER_FIELDS)
+        checked += len(batch)
+        fixed += len(drifted)
+    return checked, fixed
@@ -0,0 +1,44 @@
+# Generated by Django 4.1.7 on 2026-10-18 20:54
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bio', models.TextField(blank=True, null=True)),
+                ('gender', models.CharField(blank=True, choices=[('M', 'Male'), ('F', 'Female'), ('O', 'Other')], max_length=1, null=True)),
+                ('age', models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(150)])),
+                ('height_cm', models.FloatField(blank=True, help_text='Height in centimeters', null=True)),
+                ('weight_kg', models.FloatField(blank=True, help_text='Weight in kilograms', null=True)),
+                ('fitness_level', models.CharField(choices=[('beginner', 'Beginner'), ('intermediate', 'Intermediate'), ('advanced', 'Advanced'), ('professional', 'Professional')], default='beginner', help_text='Current fitness level', max_length=20)),
+                ('total_workouts', models.IntegerField(default=0)),
+                ('total_activities', models.IntegerField(default=0)),
+                ('total_duration_minutes', models.IntegerField(default=0)),
+                ('total_calories_burned', models.FloatField(default=0)),
+                ('total_distance_km', models.FloatField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+                ('profile_picture', models.URLField(blank=True, null=True)),
+                ('bio_link', models.URLField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
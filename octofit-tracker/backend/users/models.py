@@ -30,8 +30,13 @@ class UserProfile(models.Model):
         default='beginner',
         help_text="Current fitness level"
     )
+    # Activity counters, maintained by users/counters.py on every activity write
     total_workouts = models.IntegerField(default=0)
     total_activities = models.IntegerField(default=0)
+    total_duration_minutes = models.IntegerField(default=0)
+    total_calories_burned = models.FloatField(default=0)
+    total_distance_km = models.FloatField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
     profile_picture = models.URLField(null=True, blank=True)
     bio_link = models.URLField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -1,9 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from octofit_tracker.serializers import DynamicFieldsMixin
 from .models import UserProfile
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for User model"""
     class Meta:
         model = User
@@ -11,7 +12,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for UserProfile model with nested user data"""
     user = UserSerializer(read_only=True)
     user_id = serializers.PrimaryKeyRelatedField(
@@ -25,7 +26,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'user', 'user_id', 'bio', 'gender', 'age', 
             'height_cm', 'weight_kg', 'fitness_level', 'total_workouts',
-            'total_activities', 'profile_picture', 'bio_link', 
+            'total_activities', 'total_duration_minutes', 'total_calories_burned',
+            'total_distance_km', 'last_activity_at', 'profile_picture', 'bio_link', 
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'total_workouts', 'total_activities', 'total_duration_minutes',
+            'total_calories_burned', 'total_distance_km', 'last_activity_at',
             'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
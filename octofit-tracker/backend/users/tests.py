@@ -1,5 +1,10 @@
+from datetime import timedelta
 from django.test import TestCase
 from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.test import APIClient
+from activities.models import Activity
+from . import counters
 from .models import UserProfile
 
 
@@ -35,3 +40,126 @@ class UserProfileTestCase(TestCase):
         """Test default values for a new profile"""
         self.assertEqual(self.profile.total_workouts, 0)
         self.assertEqual(self.profile.total_activities, 0)
+
+
+class UserProfileQueryBudgetTestCase(TestCase):
+    """Test that profile endpoints run a fixed number of queries"""
+    
+    def setUp(self):
+        """Set up test user, profile and API client"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_list_query_budget(self):
+        """Test that the profile list does not query per row"""
+        for start, count in ((0, 2), (2, 8)):
+            for i in range(start, start + count):
+                user = User.objects.create_user(username=f'user{i}')
+                UserProfile.objects.create(user=user)
+            with self.assertNumQueries(2):
+                self.client.get('/api/users/profiles/')
+    
+    def test_me_query_budget(self):
+        """Test that the current user's profile is a single query"""
+        with self.assertNumQueries(1):
+            self.client.get('/api/users/profiles/me/')
+
+
+class ProfileCounterTestCase(TestCase):
+    """Test cases for the denormalized profile activity counters"""
+    
+    def setUp(self):
+        """Set up test user, profile and API client"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.now = timezone.now()
+    
+    def log(self, **fields):
+        data = {
+            'user': self.user.id, 'activity_type': 'running', 'title': 'Run',
+            'duration_minutes': 30, 'calories_burned': 300, 'distance_km': 5,
+            'activity_date': self.now.isoformat(), **fields,
+        }
+        response = self.client.post('/api/activities/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+    
+    def assertCountersMatchHistory(self):
+        self.profile.refresh_from_db()
+        expected = counters.totals_for([self.user.id])[self.user.id]
+        for name in counters.COUNTER_FIELDS:
+            self.assertAlmostEqual(getattr(self.profile, name), expected[name], msg=name)
+    
+    def test_create_update_delete(self):
+        """Test that counters follow activity writes through the API"""
+        first = self.log()
+        self.log(activity_type='gym', distance_km=None, activity_date=(self.now - timedelta(days=2)).isoformat())
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.total_activities, 2)
+        self.assertEqual(self.profile.total_workouts, 1)
+        self.assertEqual(self.profile.total_duration_minutes, 60)
+        self.assertEqual(self.profile.last_activity_at, self.now)
+        
+        self.client.patch(f'/api/activities/{first}/', {
+            'duration_minutes': 45, 'activity_date': (self.now - timedelta(days=5)).isoformat()
+        }, format='json')
+        self.assertCountersMatchHistory()
+        self.assertEqual(self.profile.last_activity_at, self.now - timedelta(days=2))
+        
+        self.client.delete(f'/api/activities/{first}/')
+        self.assertCountersMatchHistory()
+        self.assertEqual(self.profile.total_activities, 1)
+    
+    def test_bulk_ingest(self):
+        """Test that a bulk upload updates counters once per user"""
+        items = [{'activity_type': 'yoga', 'title': f'Yoga {i}', 'duration_minutes': 20,
+                  'activity_date': (self.now - timedelta(hours=i)).isoformat()} for i in range(3)]
+        self.client.post('/api/activities/bulk/', items, format='json')
+        self.assertCountersMatchHistory()
+        self.assertEqual(self.profile.total_workouts, 3)
+    
+    def test_me_returns_totals(self):
+        """Test that the me endpoint returns the counters without aggregating"""
+        self.log()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/users/profiles/me/')
+        self.assertEqual(response.data['total_activities'], 1)
+        self.assertEqual(response.data['total_distance_km'], 5)
+    
+    def test_reconcile_fixes_drift(self):
+        """Test that reconcile repairs counters written outside the API"""
+        Activity.objects.create(user=self.user, activity_type='gym', title='Lift',
+                                duration_minutes=40, activity_date=self.now)
+        other = User.objects.create_user(username='other')
+        UserProfile.objects.create(user=other, total_activities=7)
+        self.assertEqual(counters.reconcile(batch_size=1, dry_run=True), (2, 2))
+        self.assertEqual(counters.reconcile(batch_size=1), (2, 2))
+        self.assertEqual(counters.reconcile(), (2, 0))
+        self.assertCountersMatchHistory()
+
+
+class AsyncProfileTestCase(TestCase):
+    """Test cases for the async-native current profile route"""
+    
+    def setUp(self):
+        """Set up test user and log in"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_login(self.user)
+    
+    def test_matches_sync_me(self):
+        """Test that both routes return the same profile"""
+        UserProfile.objects.create(user=self.user, total_activities=3)
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+        response = self.client.get('/api/async/users/profiles/me/')
+        self.assertEqual(response.json(), api_client.get('/api/users/profiles/me/').json())
+    
+    def test_missing_profile(self):
+        """Test that a user without a profile gets the same 404 as the sync route"""
+        response = self.client.get('/api/async/users/profiles/me/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {'error': 'User profile not found'})
@@ -2,6 +2,7 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from . import counters
 from .models import UserProfile
 from .serializers import UserProfileSerializer, UserSerializer
 
@@ -21,13 +22,13 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     API endpoint for user profiles.
     Allows users to view, create, and edit their profiles.
     """
-    queryset = UserProfile.objects.all()
+    queryset = UserProfile.objects.select_related('user')
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         """Return profiles, optionally filtered by user"""
-        queryset = UserProfile.objects.all()
+        queryset = super().get_queryset()
         username = self.request.query_params.get('username', None)
         if username is not None:
             queryset = queryset.filter(user__username=username)
@@ -35,9 +36,9 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def me(self, request):
-        """Get current user's profile"""
+        """Get current user's profile, including its maintained activity totals"""
         try:
-            profile = UserProfile.objects.get(user=request.user)
+            profile = self.queryset.get(user=request.user)
             serializer = self.get_serializer(profile)
             return Response(serializer.data)
         except UserProfile.DoesNotExist:
@@ -47,5 +48,6 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             )
     
     def perform_create(self, serializer):
-        """Create profile for the authenticated user"""
-        serializer.save(user=self.request.user)
+        """Create profile for the authenticated user, counting activities logged before it existed"""
+        profile = serializer.save(user=self.request.user)
+        counters.reconcile(user_ids=[profile.user_id])
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Workout, WorkoutPlan, WorkoutPlanDay
+from .models import Workout, WorkoutPlan, WorkoutPlanDay, WorkoutRecommendation
 
 
 class WorkoutPlanDayInline(admin.TabularInline):
@@ -29,3 +29,10 @@ class WorkoutPlanDayAdmin(admin.ModelAdmin):
     list_display = ('workout_plan', 'day_number', 'workout', 'is_rest_day')
     list_filter = ('is_rest_day',)
     search_fields = ('workout_plan__name', 'workout__title')
+
+
+@admin.register(WorkoutRecommendation)
+class WorkoutRecommendationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'computed_at')
+    search_fields = ('user__username',)
+    readonly_fields = ('computed_at',)
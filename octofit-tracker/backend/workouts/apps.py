@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class WorkoutsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'workouts'
+    
+    def ready(self):
+        from octofit_tracker.cache import invalidate_on_change
+        from .models import Workout
+        invalidate_on_change(Workout, 'workouts')
@@ -0,0 +1,18 @@
+from django_filters import rest_framework as filters
+from .models import WorkoutPlan
+
+
+class WorkoutPlanFilter(filters.FilterSet):
+    """
+    Filters of WorkoutPlanViewSet. ?is_active= is matched with IN rather
+    than as a bare boolean column, which SQLite cannot look up in the
+    (is_active, difficulty_level) index.
+    """
+    is_active = filters.BooleanFilter(method='filter_is_active')
+    
+    class Meta:
+        model = WorkoutPlan
+        fields = ['difficulty_level', 'is_active', 'user']
+    
+    def filter_is_active(self, queryset, name, value):
+        return queryset.filter(**{f'{name}__in': [value]})
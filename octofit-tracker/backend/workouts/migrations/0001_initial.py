@@ -0,0 +1,93 @@
+# Generated by Django 4.1.7 on 2026-10-18 20:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Workout',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField()),
+                ('category', models.CharField(choices=[('cardio', 'Cardio'), ('strength', 'Strength Training'), ('flexibility', 'Flexibility/Yoga'), ('hiit', 'HIIT'), ('sports', 'Sports'), ('mixed', 'Mixed Training')], max_length=20)),
+                ('difficulty', models.CharField(choices=[('beginner', 'Beginner'), ('intermediate', 'Intermediate'), ('advanced', 'Advanced')], default='beginner', max_length=20)),
+                ('estimated_duration_minutes', models.IntegerField()),
+                ('estimated_calories', models.FloatField(blank=True, null=True)),
+                ('instructions', models.TextField()),
+                ('equipment_needed', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkoutPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('duration_days', models.IntegerField()),
+                ('difficulty_level', models.CharField(choices=[('beginner', 'Beginner'), ('intermediate', 'Intermediate'), ('advanced', 'Advanced')], default='beginner', max_length=20)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='workout_plans', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkoutRecommendation',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='workout_recommendation', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('candidates', models.TextField(help_text='JSON list of scored workouts, best first')),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WorkoutPlanDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_number', models.IntegerField()),
+                ('is_rest_day', models.BooleanField(default=False)),
+                ('notes', models.TextField(blank=True)),
+                ('workout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='workouts.workout')),
+                ('workout_plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='workouts.workoutplan')),
+            ],
+            options={
+                'ordering': ['day_number'],
+            },
+        ),
+        migrations.AddField(
+            model_name='workoutplan',
+            name='workouts',
+            field=models.ManyToManyField(related_name='plans', through='workouts.WorkoutPlanDay', to='workouts.workout'),
+        ),
+        migrations.AddIndex(
+            model_name='workout',
+            index=models.Index(fields=['difficulty', 'category'], name='workouts_wo_difficu_393f0b_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='workoutplanday',
+            unique_together={('workout_plan', 'day_number')},
+        ),
+        migrations.AddIndex(
+            model_name='workoutplan',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user'], name='workoutplan_active_user'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 20:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workouts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workoutplan',
+            index=models.Index(fields=['user', 'created_at'], name='workouts_wo_user_id_a4981b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutplan',
+            index=models.Index(fields=['is_active', 'difficulty_level'], name='workouts_wo_is_acti_b93d47_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutplan',
+            index=models.Index(fields=['difficulty_level'], name='workouts_wo_difficu_419d07_idx'),
+        ),
+    ]
@@ -58,6 +58,15 @@ class WorkoutPlan(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Active plan of a user (recommendations); partial where supported
+            models.Index(fields=['user'], condition=models.Q(is_active=True), name='workoutplan_active_user'),
+            # A user's plans, newest first; the only plan list non-staff users get
+            models.Index(fields=['user', 'created_at']),
+            # Staff filters ?is_active= (with or without ?difficulty_level=) and ?difficulty_level=
+            models.Index(fields=['is_active', 'difficulty_level']),
+            models.Index(fields=['difficulty_level']),
+        ]
     
     def __str__(self):
         return f"{self.user.username}'s {self.name}"
@@ -77,3 +86,15 @@ class WorkoutPlanDay(models.Model):
     
     def __str__(self):
         return f"{self.workout_plan.name} - Day {self.day_number}"
+
+
+class WorkoutRecommendation(models.Model):
+    """Precomputed workout candidates of a user, refreshed in batch by workouts/recommendations.py"""
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='workout_recommendation'
+    )
+    candidates = models.TextField(help_text="JSON list of scored workouts, best first")
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.user.username}'s recommendations"
@@ -0,0 +1,189 @@
+"""
+Workout recommendations.
+
+Every workout is scored for a user on three features: how close its
+difficulty is to the user's level (the active plan's difficulty, else
+the profile's fitness level), how much of the user's last 30 days of
+activity falls into its category, and how close its length is to the
+user's typical session. Workouts already scheduled in the active plan
+are pushed down so suggestions add something new.
+
+refresh() scores users in batches as one users x workouts matrix and
+stores each user's top candidates, with the workout payload embedded,
+in a single WorkoutRecommendation row, so serving them is one primary
+key lookup.
+"""
+import json
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from activities.models import ActivityRollup
+from users.models import UserProfile
+from .models import Workout, WorkoutPlanDay, WorkoutRecommendation
+from .serializers import WorkoutSerializer
+
+RECOMMENDATIONS_PER_USER = getattr(settings, 'WORKOUT_RECOMMENDATIONS_PER_USER', 10)
+
+RECENT_DAYS = 30
+
+DIFFICULTIES = ('beginner', 'intermediate', 'advanced')
+
+# Fitness levels beyond the workout difficulty scale map to its top
+LEVELS = {'beginner': 0, 'intermediate': 1, 'advanced': 2, 'professional': 2}
+
+CATEGORIES = [category for category, _ in Workout.WORKOUT_CATEGORIES]
+
+# Workout category each logged activity type trains
+ACTIVITY_CATEGORIES = {
+    'running': 'cardio',
+    'cycling': 'cardio',
+    'swimming': 'cardio',
+    'walking': 'cardio',
+    'hiking': 'cardio',
+    'gym': 'strength',
+    'yoga': 'flexibility',
+    'sports': 'sports',
+    'other': 'mixed',
+}
+
+DEFAULT_SESSION_MINUTES = 30.0
+
+# Feature weights; the difficulty and category terms are in [0, 1]
+DIFFICULTY_WEIGHT = 0.5
+CATEGORY_WEIGHT = 0.4
+DURATION_WEIGHT = 0.1
+PLANNED_PENALTY = 0.5
+
+
+class _Catalog:
+    """Workout feature arrays and payloads, loaded once per refresh"""
+
+    def __init__(self):
+        workouts = list(Workout.objects.order_by('id'))
+        self.ids = np.array([workout.pk for workout in workouts], dtype=np.int64)
+        self.position = {workout.pk: i for i, workout in enumerate(workouts)}
+        self.difficulty = np.array([DIFFICULTIES.index(workout.difficulty) for workout in workouts], dtype=float)
+        self.category = np.zeros((len(workouts), len(CATEGORIES)))
+        for i, workout in enumerate(workouts):
+            self.category[i, CATEGORIES.index(workout.category)] = 1
+        self.duration = np.array([workout.estimated_duration_minutes for workout in workouts], dtype=float)
+        self.payloads = WorkoutSerializer(workouts, many=True).data
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _user_features(user_ids, catalog, today):
+    """Per-user feature arrays, aligned with user_ids"""
+    index = {user_id: i for i, user_id in enumerate(user_ids)}
+    count = len(user_ids)
+    level = np.zeros(count)
+    for user_id, fitness_level in UserProfile.objects.filter(user_id__in=user_ids).values_list(
+        'user_id', 'fitness_level'
+    ):
+        level[index[user_id]] = LEVELS.get(fitness_level, 0)
+
+    mix = np.zeros((count, len(CATEGORIES)))
+    minutes = np.zeros(count)
+    sessions = np.zeros(count)
+    recent = ActivityRollup.objects.filter(
+        user_id__in=user_ids, period='day', period_start__gt=today - timedelta(days=RECENT_DAYS)
+    ).values('user_id', 'activity_type').annotate(
+        activities=Sum('activities_count'), minutes=Sum('total_duration_minutes')
+    ).order_by()
+    for row in recent:
+        i = index[row['user_id']]
+        mix[i, CATEGORIES.index(ACTIVITY_CATEGORIES.get(row['activity_type'], 'mixed'))] += row['activities']
+        minutes[i] += row['minutes']
+        sessions[i] += row['activities']
+    totals = mix.sum(axis=1, keepdims=True)
+    mix = np.divide(mix, totals, out=np.zeros_like(mix), where=totals > 0)
+    typical = np.divide(minutes, sessions, out=np.full(count, DEFAULT_SESSION_MINUTES), where=sessions > 0)
+
+    planned = np.zeros((count, len(catalog)), dtype=bool)
+    days = WorkoutPlanDay.objects.filter(
+        workout_plan__user_id__in=user_ids, workout_plan__is_active=True, is_rest_day=False
+    ).values_list('workout_plan__user_id', 'workout_id', 'workout_plan__difficulty_level')
+    plan_levels = {}
+    for user_id, workout_id, difficulty_level in days:
+        if workout_id in catalog.position:
+            planned[index[user_id], catalog.position[workout_id]] = True
+        plan_levels.setdefault(user_id, []).append(LEVELS.get(difficulty_level, 0))
+    for user_id, levels in plan_levels.items():
+        # An active plan is a more recent choice than the profile level
+        level[index[user_id]] = np.mean(levels)
+    return level, mix, typical, planned
+
+
+def score(catalog, level, mix, typical, planned):
+    """users x workouts score matrix"""
+    difficulty = 1 - np.abs(catalog.difficulty[None, :] - level[:, None]) / (len(DIFFICULTIES) - 1)
+    category = mix @ catalog.category.T
+    duration = 1 - np.minimum(np.abs(catalog.duration[None, :] - typical[:, None]) / typical[:, None], 1)
+    return (
+        DIFFICULTY_WEIGHT * difficulty
+        + CATEGORY_WEIGHT * category
+        + DURATION_WEIGHT * duration
+        - PLANNED_PENALTY * planned
+    )
+
+
+def _top(scores, k):
+    """Column indexes of the k best scores per row, best first; ties go to the lower id"""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.intp)
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.lexsort((best, -np.take_along_axis(scores, best, axis=1)), axis=1)
+    return np.take_along_axis(best, order, axis=1)
+
+
+def refresh(user_ids=None, batch_size=1000, per_user=RECOMMENDATIONS_PER_USER):
+    """
+    Recompute and store the candidates of all users (or only user_ids),
+    batch_size users at a time. Returns the number of users refreshed.
+    """
+    catalog = _Catalog()
+    today = timezone.localdate()
+    users = User.objects.order_by('id').values_list('id', flat=True)
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+
+    refreshed = 0
+    last_id = 0
+    while True:
+        batch = list(users.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+        features = _user_features(batch, catalog, today)
+        scores = score(catalog, *features)
+        top = _top(scores, per_user)
+        rows = [
+            WorkoutRecommendation(user_id=user_id, candidates=json.dumps([
+                {'score': round(float(scores[i, j]), 4), 'workout': catalog.payloads[j]}
+                for j in top[i]
+            ]))
+            for i, user_id in enumerate(batch)
+        ]
+        with transaction.atomic():
+            WorkoutRecommendation.objects.filter(user_id__in=batch).delete()
+            WorkoutRecommendation.objects.bulk_create(rows)
+        refreshed += len(batch)
+    return refreshed
+
+
+def recommendations_for(user_id):
+    """(computed_at, candidates) of a user, computing them on first use"""
+    row = WorkoutRecommendation.objects.filter(user_id=user_id).values_list('candidates', 'computed_at').first()
+    if row is None:
+        refresh(user_ids=[user_id])
+        row = WorkoutRecommendation.objects.filter(user_id=user_id).values_list('candidates', 'computed_at').first()
+    candidates, computed_at = row
+    return computed_at, json.loads(candidates)
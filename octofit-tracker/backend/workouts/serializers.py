@@ -1,8 +1,9 @@
 from rest_framework import serializers
+from octofit_tracker.serializers import DynamicFieldsMixin
 from .models import Workout, WorkoutPlan, WorkoutPlanDay
 
 
-class WorkoutSerializer(serializers.ModelSerializer):
+class WorkoutSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for Workout model"""
     class Meta:
         model = Workout
@@ -14,7 +15,7 @@ class WorkoutSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
-class WorkoutPlanDaySerializer(serializers.ModelSerializer):
+class WorkoutPlanDaySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for WorkoutPlanDay model"""
     workout = WorkoutSerializer(read_only=True)
     workout_id = serializers.PrimaryKeyRelatedField(
@@ -32,7 +33,7 @@ class WorkoutPlanDaySerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class WorkoutPlanSerializer(serializers.ModelSerializer):
+class WorkoutPlanSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """Serializer for WorkoutPlan model"""
     days = WorkoutPlanDaySerializer(many=True, read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
@@ -1,6 +1,13 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
-from .models import Workout, WorkoutPlan, WorkoutPlanDay
+from django.core.cache import caches
+from rest_framework.test import APIClient
+from django.utils import timezone
+from activities import rollups
+from activities.models import Activity
+from users.models import UserProfile
+from . import recommendations
+from .models import Workout, WorkoutPlan, WorkoutPlanDay, WorkoutRecommendation
 
 
 class WorkoutTestCase(TestCase):
@@ -65,6 +72,15 @@ class WorkoutPlanTestCase(TestCase):
         self.assertIn('Weekly Plan', str(self.plan))
         self.assertIn('testuser', str(self.plan))
 
+    def test_is_active_filter(self):
+        """Test that plans can be filtered on whether they are active"""
+        WorkoutPlan.objects.create(user=self.user, name='Old Plan', duration_days=7, is_active=False)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for value, names in (('true', ['Weekly Plan']), ('false', ['Old Plan'])):
+            response = client.get('/api/workouts/plans/', {'is_active': value})
+            self.assertEqual([plan['name'] for plan in response.data['results']], names)
+
 
 class WorkoutPlanDayTestCase(TestCase):
     """Test cases for WorkoutPlanDay model"""
@@ -105,3 +121,159 @@ class WorkoutPlanDayTestCase(TestCase):
         """Test the string representation of a plan day"""
         self.assertIn('Weekly Plan', str(self.plan_day))
         self.assertIn('Day 1', str(self.plan_day))
+
+
+class WorkoutPlanQueryBudgetTestCase(TestCase):
+    """Test that workout plan endpoints run a fixed number of queries"""
+    
+    def setUp(self):
+        """Set up test user, workout and API client"""
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.workout = Workout.objects.create(
+            title='Test Workout',
+            description='A test workout',
+            category='cardio',
+            difficulty='beginner',
+            estimated_duration_minutes=30,
+            instructions='Test instructions'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def add_plans(self, count):
+        for i in range(count):
+            plan = WorkoutPlan.objects.create(user=self.user, name=f'Plan {i}', duration_days=7)
+            for day in range(1, 4):
+                WorkoutPlanDay.objects.create(workout_plan=plan, workout=self.workout, day_number=day)
+    
+    def test_plan_list_query_budget(self):
+        """Test that nested days and workouts are prefetched"""
+        for count in (2, 8):
+            self.add_plans(count)
+            # count, plans, workouts M2M, days with their workouts
+            with self.assertNumQueries(4):
+                self.client.get('/api/workouts/plans/')
+    
+    def test_plan_day_list_query_budget(self):
+        """Test that plan day workouts are joined"""
+        for count in (2, 8):
+            self.add_plans(count)
+            with self.assertNumQueries(2):
+                self.client.get('/api/workouts/plan-days/')
+
+
+class WorkoutResponseCacheTestCase(TestCase):
+    """Test cases for the cached workout catalogue"""
+    
+    def setUp(self):
+        """Set up test user, workout and an empty response cache"""
+        caches['responses'].clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.workout = Workout.objects.create(
+            title='Morning Run',
+            description='A refreshing morning run',
+            category='cardio',
+            estimated_duration_minutes=30,
+            instructions='Run'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def test_hit_skips_database(self):
+        """Test that a repeated list request is served without queries"""
+        first = self.client.get('/api/workouts/templates/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/workouts/templates/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+    
+    def test_query_params_are_part_of_the_key(self):
+        self.client.get('/api/workouts/templates/')
+        response = self.client.get('/api/workouts/templates/', {'category': 'strength'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'], [])
+    
+    def test_etag_returns_not_modified(self):
+        """Test that a matching If-None-Match gets a 304"""
+        etag = self.client.get(f'/api/workouts/templates/{self.workout.id}/')['ETag']
+        response = self.client.get(
+            f'/api/workouts/templates/{self.workout.id}/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+    
+    def test_save_invalidates_list_and_detail(self):
+        """Test that saving a workout drops its cached responses"""
+        detail_url = f'/api/workouts/templates/{self.workout.id}/'
+        etag = self.client.get(detail_url)['ETag']
+        self.client.get('/api/workouts/templates/')
+        
+        self.workout.title = 'Evening Run'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.workout.save()
+        
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Evening Run')
+        response = self.client.get('/api/workouts/templates/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+
+class WorkoutRecommendationTestCase(TestCase):
+    """Test cases for precomputed workout recommendations"""
+    
+    def setUp(self):
+        """Set up a catalog and a user who mostly does yoga"""
+        self.workouts = {}
+        for title, category, difficulty, minutes in (
+            ('Gentle Flow', 'flexibility', 'beginner', 30),
+            ('Power Yoga', 'flexibility', 'advanced', 45),
+            ('Easy Jog', 'cardio', 'beginner', 30),
+            ('Heavy Lifts', 'strength', 'advanced', 60),
+        ):
+            self.workouts[title] = Workout.objects.create(
+                title=title, description=title, category=category, difficulty=difficulty,
+                estimated_duration_minutes=minutes, instructions='Go'
+            )
+        self.user = User.objects.create_user(username='yogi')
+        UserProfile.objects.create(user=self.user, fitness_level='beginner')
+        for activity_type in ('yoga', 'yoga', 'yoga', 'running'):
+            rollups.record_activity_created(Activity.objects.create(
+                user=self.user, activity_type=activity_type, title='Session',
+                duration_minutes=30, activity_date=timezone.now()
+            ))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def titles(self):
+        response = self.client.get('/api/workouts/recommendations/')
+        self.assertEqual(response.status_code, 200)
+        return [candidate['workout']['title'] for candidate in response.data['results']]
+    
+    def test_matches_level_and_activity_mix(self):
+        """Test that workouts matching the user's level and habits rank first"""
+        self.assertEqual(self.titles(), ['Gentle Flow', 'Easy Jog', 'Power Yoga', 'Heavy Lifts'])
+    
+    def test_active_plan(self):
+        """Test that the active plan sets the level and planned workouts drop"""
+        plan = WorkoutPlan.objects.create(
+            user=self.user, name='Advanced', duration_days=7, difficulty_level='advanced'
+        )
+        WorkoutPlanDay.objects.create(workout_plan=plan, workout=self.workouts['Power Yoga'], day_number=1)
+        recommendations.refresh()
+        self.assertEqual(self.titles(), ['Heavy Lifts', 'Gentle Flow', 'Power Yoga', 'Easy Jog'])
+    
+    def test_single_lookup(self):
+        """Test that serving precomputed candidates is one primary key lookup"""
+        recommendations.refresh()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/workouts/recommendations/?limit=2')
+        self.assertEqual(len(response.data['results']), 2)
+    
+    def test_batch_refresh(self):
+        """Test that a batched refresh stores candidates for every user"""
+        for i in range(5):
+            User.objects.create_user(username=f'user{i}')
+        self.assertEqual(recommendations.refresh(batch_size=2, per_user=3), 6)
+        self.assertEqual(WorkoutRecommendation.objects.count(), 6)
+        self.assertEqual(recommendations.recommendations_for(self.user.id)[1][0]['workout']['title'], 'Gentle Flow')
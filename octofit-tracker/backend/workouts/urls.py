@@ -1,13 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    WorkoutViewSet, WorkoutPlanViewSet, WorkoutPlanDayViewSet
+    WorkoutViewSet, WorkoutPlanViewSet, WorkoutPlanDayViewSet, WorkoutRecommendationViewSet
 )
 
 router = DefaultRouter()
 router.register(r'templates', WorkoutViewSet, basename='workout')
 router.register(r'plans', WorkoutPlanViewSet, basename='workout-plan')
 router.register(r'plan-days', WorkoutPlanDayViewSet, basename='workout-plan-day')
+router.register(r'recommendations', WorkoutRecommendationViewSet, basename='workout-recommendation')
 
 urlpatterns = [
     path('', include(router.urls)),
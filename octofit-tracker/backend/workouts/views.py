@@ -1,19 +1,27 @@
+from django.db.models import Prefetch
 from rest_framework import viewsets, permissions, filters
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from octofit_tracker.cache import CachedResponseMixin
+from search.filters import IndexedSearchFilter
+from . import recommendations
+from .filters import WorkoutPlanFilter
 from .models import Workout, WorkoutPlan, WorkoutPlanDay
 from .serializers import WorkoutSerializer, WorkoutPlanSerializer, WorkoutPlanDaySerializer
 
 
-class WorkoutViewSet(viewsets.ReadOnlyModelViewSet):
+class WorkoutViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for workouts.
     View available workout templates.
     """
+    cache_namespace = 'workouts'
     queryset = Workout.objects.all()
     serializer_class = WorkoutSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, IndexedSearchFilter]
     filterset_fields = ['category', 'difficulty']
+    search_index_kind = 'workout'
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'estimated_duration_minutes', 'difficulty']
     ordering = ['-created_at']
@@ -24,17 +32,20 @@ class WorkoutPlanViewSet(viewsets.ModelViewSet):
     API endpoint for workout plans.
     Users can create and manage their personalized workout plans.
     """
-    queryset = WorkoutPlan.objects.all()
+    queryset = WorkoutPlan.objects.select_related('user').prefetch_related(
+        'workouts',
+        Prefetch('days', queryset=WorkoutPlanDay.objects.select_related('workout')),
+    )
     serializer_class = WorkoutPlanSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['difficulty_level', 'is_active', 'user']
+    filterset_class = WorkoutPlanFilter
     ordering_fields = ['created_at', 'duration_days']
     ordering = ['-created_at']
     
     def get_queryset(self):
         """Return plans, optionally filtered by user"""
-        queryset = WorkoutPlan.objects.all()
+        queryset = super().get_queryset()
         user_id = self.request.query_params.get('user_id', None)
         if user_id is not None:
             queryset = queryset.filter(user_id=user_id)
@@ -53,9 +64,29 @@ class WorkoutPlanDayViewSet(viewsets.ModelViewSet):
     API endpoint for workout plan days.
     Manage daily workout assignments.
     """
-    queryset = WorkoutPlanDay.objects.all()
+    queryset = WorkoutPlanDay.objects.select_related('workout')
     serializer_class = WorkoutPlanDaySerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['workout_plan', 'is_rest_day']
     ordering = ['day_number']
+
+
+class WorkoutRecommendationViewSet(viewsets.ViewSet):
+    """
+    API endpoint for workout recommendations.
+    Workouts suggested for the current user, served from the precomputed candidates.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def list(self, request):
+        """Get the current user's recommended workouts. Query params: limit"""
+        computed_at, candidates = recommendations.recommendations_for(request.user.id)
+        try:
+            limit = int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            limit = len(candidates)
+        return Response({
+            'computed_at': computed_at,
+            'results': candidates[:max(1, limit)],
+        })